@@ -0,0 +1,125 @@
+"""A script for generating the coverage.py config used by `py_pytest_test` coverage runs."""
+
+import argparse
+import configparser
+from pathlib import Path, PurePosixPath
+from typing import List, Optional
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--coverage-rc",
+        type=Path,
+        required=True,
+        help="The user provided coverage.py rc file.",
+    )
+    parser.add_argument(
+        "--sources",
+        type=Path,
+        required=True,
+        help="A file containing newline delimited execpaths of sources to collect coverage for.",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["line", "branch"],
+        help="Override the measurement mode of the user provided rc file.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="The location of the output file to write.",
+    )
+
+    return parser.parse_args()
+
+
+def include_pattern(source: str) -> str:
+    """Convert an execpath to a coverage.py include pattern.
+
+    Patterns are relative to the directory of the test's workspace within the
+    test's runfiles, which is the directory coverage.py resolves them against.
+
+    Args:
+        source: The execpath of a source file.
+
+    Returns:
+        The include pattern for the source.
+    """
+    path = PurePosixPath(source)
+    if path.parts[0] == "external":
+        return str(PurePosixPath("..", *path.parts[1:]))
+
+    return str(path)
+
+
+def splice_coverage_config(
+    cov_config: configparser.ConfigParser,
+    sources: List[str],
+    mode: Optional[str] = None,
+) -> None:
+    """Modify a coverage config to explicitly include or omit source files
+
+    Args:
+        cov_config: The parsed coveragerc file to update.
+        sources: Execpaths of source files to run coverage on.
+        mode: Either `line` or `branch` to override the measurement mode.
+    """
+    # Ensure the `run` section exists
+    if "run" not in cov_config.sections():
+        cov_config.add_section("run")
+
+    if mode:
+        cov_config.set("run", "branch", str(mode == "branch"))
+
+    # Force the data file to be the path chosen by the process wrapper at runtime.
+    cov_config.set("run", "data_file", "${COVERAGE_FILE}")
+
+    # Grab any existing coverage.py include or omit settings
+    includes = cov_config.get("run", "include", fallback="")
+    omits = cov_config.get("run", "omit", fallback="")
+
+    # In cases where a coverage manifest is provided but it's empty, we interpret
+    # that to be a test that has no dependencies from the same workspace and
+    # by extension, no dependencies used for coverage. All sources are then
+    # excluded from collecting coverage. Users who do not expect coverage to be
+    # collected from `deps` targets should annotate their `.coveragerc` file to
+    # collect the correct inputs from the `data` attribute.
+    if sources:
+        if includes:
+            existing_includes = includes.split(",")
+        else:
+            existing_includes = []
+        existing_includes.extend(sorted(include_pattern(src) for src in sources))
+        cov_config.set("run", "include", "\n".join(existing_includes))
+
+    elif not includes and not omits:
+        cov_config.set("run", "omit", "*")
+
+
+def main() -> None:
+    """The main entrypoint."""
+    args = parse_args()
+
+    sources = [
+        line.strip()
+        for line in args.sources.read_text(encoding="utf-8").splitlines()
+        if line.strip()
+    ]
+
+    # Interpolation is disabled so the `$` references understood by
+    # coverage.py are written back out as-is.
+    cov_config = configparser.ConfigParser(interpolation=None)
+    cov_config.read(str(args.coverage_rc))
+
+    splice_coverage_config(cov_config, sources, args.mode)
+
+    with args.output.open("w", encoding="utf-8") as fhd:
+        cov_config.write(fhd)
+
+
+if __name__ == "__main__":
+    main()
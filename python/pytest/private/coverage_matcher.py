@@ -0,0 +1,161 @@
+"""A coverage.py file matcher optimized for large sets of explicit sources.
+
+The coverage config generated for `py_pytest_test` includes every source file
+of a test explicitly. coverage.py compiles `[run] include` patterns into a single
+regular expression which is matched against every traced and reported file, the
+cost of which grows with the number of patterns. This module provides a drop in
+replacement for coverage.py's `GlobMatcher` which performs hash lookups for
+patterns without wildcards and only falls back to regular expressions for true
+globs.
+"""
+
+import os
+from typing import Callable, FrozenSet, Iterable, List, Optional, Tuple
+
+from coverage import env
+from coverage.files import GlobMatcher
+
+_GLOB_CHARS = frozenset("*?[]")
+
+
+def normalize_pattern(path: str) -> str:
+    """Normalize a path or pattern the way coverage.py compares them.
+
+    Slashes and backslashes are interchangeable and Windows paths are case
+    insensitive.
+    """
+    path = path.replace("\\", "/")
+    if env.WINDOWS:
+        return path.lower()
+    return path
+
+
+def _is_literal(path: str) -> bool:
+    return not _GLOB_CHARS.intersection(path)
+
+
+def partition_patterns(
+    patterns: Iterable[str],
+) -> Tuple[FrozenSet[str], FrozenSet[str], List[str]]:
+    """Split coverage.py file patterns by how they can be matched.
+
+    Args:
+        patterns: coverage.py file patterns.
+
+    Returns:
+        A tuple of normalized paths which must match a file exactly, normalized
+        directories which must contain a file (`dir/*`) and the remaining glob
+        patterns.
+    """
+    literals = set()
+    prefixes = set()
+    globs = []
+    for pattern in patterns:
+        normalized = normalize_pattern(pattern)
+
+        # Patterns without a slash match a file name in any directory.
+        if "/" not in normalized:
+            globs.append(pattern)
+            continue
+
+        if _is_literal(normalized):
+            literals.add(normalized)
+            continue
+
+        stem = normalized.rstrip("*")
+        if stem.endswith("/") and _is_literal(stem):
+            prefixes.add(stem[:-1])
+            continue
+
+        globs.append(pattern)
+
+    return frozenset(literals), frozenset(prefixes), globs
+
+
+class SourceMatcher:
+    """A drop in replacement for `GlobMatcher` which matches explicit paths in constant time.
+
+    Only true globs are matched by a `GlobMatcher`, and so compiled into a
+    regular expression.
+    """
+
+    def __init__(
+        self,
+        pats: Iterable[str],
+        name: str = "unknown",
+        caption: str = "",
+        debug: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        """Constructor
+
+        Args:
+            pats: coverage.py file patterns.
+            name: The name of the matcher.
+            caption: A caption used for debug output.
+            debug: A function for writing debug output.
+        """
+        self.pats = list(pats)
+        self.name = name
+
+        self.literals, self.prefixes, globs = partition_patterns(self.pats)
+        self.glob_matcher = GlobMatcher(globs, name) if globs else None
+
+        if debug:
+            debug(f"{caption} matching {self}")
+            for info in self.info():
+                debug(f"    {info}")
+
+    def __repr__(self) -> str:
+        return f"<SourceMatcher {self.name} {self.pats!r}>"
+
+    def info(self) -> List[str]:
+        """A list of strings for displaying when dumping state."""
+        return self.pats
+
+    def match(self, fpath: str) -> bool:
+        """Does `fpath` match one of our file name patterns?"""
+        normalized = normalize_pattern(fpath)
+        if normalized in self.literals:
+            return True
+
+        if self.prefixes:
+            index = normalized.find("/")
+            while index != -1:
+                if normalized[:index] in self.prefixes:
+                    return True
+                index = normalized.find("/", index + 1)
+
+        return self.glob_matcher is not None and self.glob_matcher.match(fpath)
+
+
+def install() -> None:
+    """Replace the file matchers used by coverage.py with `SourceMatcher`.
+
+    This must be called before coverage collection is started.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from coverage import inorout, report_core
+
+    for module in (inorout, report_core):
+        if getattr(module, "GlobMatcher", None) is GlobMatcher:
+            setattr(module, "GlobMatcher", SourceMatcher)
+
+
+def abs_file(filename: str) -> str:
+    """Return the absolute normalized form of `filename`."""
+    return os.path.abspath(filename)
+
+
+def patch_coverage() -> None:
+    """Patch os.path.realpath escapes and the file matcher in coverage.py.
+
+    This is also the initializer of the processes `coverage_parallel` spawns,
+    which import it by name.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from coverage import control, files
+
+    files.abs_file = abs_file  # type: ignore
+    control.abs_file = abs_file  # type: ignore
+    files.set_relative_directory()
+    install()
@@ -0,0 +1,213 @@
+"""Parallel combining and reporting of coverage.py data for pytest-xdist runs.
+
+Every pytest-xdist worker writes its own coverage data file which pytest-cov then
+combines, one file at a time, once all tests have finished. The lcov report is
+similarly generated one source file at a time. Both happen when all other cores
+allotted to the test are idle so the work is spread across processes here.
+"""
+
+import contextlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Sequence, TextIO, TypeVar, Union
+
+import coverage
+from coverage import CoverageData
+from coverage.exceptions import NoDataError
+
+T = TypeVar("T")
+
+MIN_FILES_PER_PROCESS = 32
+"""The minimum number of source files worth reporting on in a separate process."""
+
+MIN_DATA_FILES = 4
+"""The minimum number of data files worth combining in separate processes."""
+
+
+@contextlib.contextmanager
+def _pool(
+    max_workers: int, initializer: Optional[Callable[[], None]] = None
+) -> Iterator[ProcessPoolExecutor]:
+    # pytest-cov uses these variables to measure subprocesses which is
+    # unnecessary for the processes here.
+    environ = dict(os.environ)
+    for key in environ:
+        if key.startswith("COV_CORE_"):
+            del os.environ[key]
+
+    try:
+        # pytest-xdist runs threads within the controlling process and forking a
+        # multi-threaded process is unsafe, so processes are always spawned.
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer,
+        ) as pool:
+            yield pool
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+
+
+def chunk(items: Sequence[T], count: int) -> List[Sequence[T]]:
+    """Split items into at most `count` contiguous chunks of similar size."""
+    count = max(1, min(count, len(items)))
+    size, remainder = divmod(len(items), count)
+
+    chunks = []
+    start = 0
+    for index in range(count):
+        end = start + size + (1 if index < remainder else 0)
+        chunks.append(items[start:end])
+        start = end
+
+    return chunks
+
+
+def merge_data_files(data_files: Sequence[str], output: str) -> str:
+    """Merge coverage data files into a new file, deleting the originals.
+
+    Args:
+        data_files: The data files to merge.
+        output: The location of the new data file.
+
+    Returns:
+        The location of the new data file.
+    """
+    merged = CoverageData(basename=output)
+    for data_file in data_files:
+        data = CoverageData(basename=data_file)
+        data.read()
+        merged.update(data)
+    merged.write()
+
+    for data_file in data_files:
+        os.unlink(data_file)
+
+    return output
+
+
+def combine_data_files(
+    data_files: Sequence[Union[str, Path]], output: Path, max_workers: int
+) -> None:
+    """Combine coverage data files into one using a parallel tree reduction.
+
+    Files are merged in pairs, each round halving the number of files, until a
+    single file remains.
+
+    Args:
+        data_files: The data files to combine. These are deleted.
+        output: The location of the combined data file.
+        max_workers: The maximum number of processes to use.
+    """
+    files = [str(data_file) for data_file in data_files]
+    if len(files) < MIN_DATA_FILES or max_workers < 2:
+        merge_data_files(files, str(output))
+        return
+
+    with _pool(min(max_workers, len(files) // 2)) as pool:
+        round_index = 0
+        while len(files) > 2:
+            pairs = [files[idx : idx + 2] for idx in range(0, len(files), 2)]
+            futures = [
+                pool.submit(
+                    merge_data_files,
+                    pair,
+                    f"{output}.round{round_index}.{pair_index}",
+                )
+                for pair_index, pair in enumerate(pairs)
+                if len(pair) == 2
+            ]
+            files = [future.result() for future in futures] + (
+                pairs[-1] if len(pairs[-1]) == 1 else []
+            )
+            round_index += 1
+
+    merge_data_files(files, str(output))
+
+
+def _lcov_report_chunk(
+    data_file: str,
+    config_file: Union[str, bool],
+    morfs: Sequence[str],
+    output: str,
+) -> bool:
+    cov = coverage.Coverage(data_file=data_file, config_file=config_file)
+    cov.load()
+    try:
+        cov.lcov_report(morfs=list(morfs), outfile=output)
+    except NoDataError:
+        return False
+
+    return True
+
+
+def _lcov_report_chunks(
+    cov: coverage.Coverage,
+    chunks: Sequence[Sequence[str]],
+    tmp_dir: Path,
+    initializer: Optional[Callable[[], None]],
+) -> List[Path]:
+    """Write an lcov report of each chunk of source files in a separate process.
+
+    Returns:
+        The reports of the chunks which had data, in order.
+    """
+    outputs = [str(tmp_dir / f"{index}.lcov") for index in range(len(chunks))]
+    with _pool(len(chunks), initializer) as pool:
+        reported = list(
+            pool.map(
+                _lcov_report_chunk,
+                [cov.config.data_file] * len(chunks),
+                [cov.config.config_file or False] * len(chunks),
+                chunks,
+                outputs,
+            )
+        )
+
+    return [Path(output) for output, has_report in zip(outputs, reported) if has_report]
+
+
+def lcov_report(
+    cov: coverage.Coverage,
+    outfile: TextIO,
+    max_workers: int,
+    initializer: Optional[Callable[[], None]] = None,
+) -> None:
+    """Write an lcov report, splitting the work across processes by source file.
+
+    The report is identical to `coverage.Coverage.lcov_report`.
+
+    Args:
+        cov: A loaded coverage object to report on.
+        outfile: The stream to write the report to.
+        max_workers: The maximum number of processes to use.
+        initializer: A function to prepare coverage.py in each process, as it
+            was prepared in this one.
+    """
+    measured_files = cov.get_data().measured_files()
+
+    workers = min(max_workers, len(measured_files) // MIN_FILES_PER_PROCESS)
+    if workers < 2:
+        with contextlib.redirect_stdout(outfile):
+            cov.lcov_report(outfile="-")
+        return
+
+    # coverage.py writes files ordered by their relative path so the work is
+    # split accordingly for the concatenated report to be the same.
+    morfs = sorted(measured_files, key=coverage.files.relative_filename)
+
+    with tempfile.TemporaryDirectory(dir=Path(cov.config.data_file).parent) as tmp_dir:
+        reports = _lcov_report_chunks(
+            cov, chunk(morfs, workers), Path(tmp_dir), initializer
+        )
+        if not reports:
+            raise NoDataError("No data to report.")
+
+        for report in reports:
+            with report.open(encoding="utf-8") as fhd:
+                for line in fhd:
+                    outfile.write(line)
@@ -0,0 +1,756 @@
+"""A fork server for starting Python processes with modules already imported.
+
+`py_pytest_test` uses this to start pytest-xdist workers. Rather than each worker
+being a new interpreter which imports all of its dependencies, the server
+imports a set of modules once and forks a child for every worker. The children
+share the imported modules' memory copy-on-write.
+
+Workers are requested by a small client (`connect`) which execnet runs in place
+of the Python interpreter. The client sends its standard streams, arguments,
+environment and working directory to the server which forks a child to run the
+requested `-c` or `-m` program as the interpreter would. The client then waits
+for the child to exit, forwarding signals to it, and exits the same way.
+
+A persistent server (`run_persistent`) instead outlives the process which
+started it, so that later runs of the same test fork pytest itself from an
+interpreter which has already imported it. Such servers exit once idle, or once
+any module they imported has been modified.
+
+This is only supported on POSIX platforms.
+"""
+
+import argparse
+import contextlib
+import errno
+import hashlib
+import importlib
+import io
+import json
+import os
+import runpy
+import secrets
+import selectors
+import shlex
+import signal
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+from typing import Any, Dict, List, NoReturn, Optional, Sequence, TextIO, Tuple
+
+FORKSERVER_ENV = "PY_PYTEST_FORKSERVER"
+"""The environment variable containing the command for starting a process from the fork server."""
+
+READY = b"ready\n"
+"""The line written to stdout by the server once it's listening for connections."""
+
+PERSISTENT_IDLE_TIMEOUT = 30 * 60.0
+"""The number of idle seconds after which a persistent server exits."""
+
+_FORWARDED_SIGNALS = (signal.SIGHUP, signal.SIGINT, signal.SIGQUIT, signal.SIGTERM)
+
+# Connecting to a persistent server which exits as it's stale, then starting one.
+_PERSISTENT_ATTEMPTS = 3
+
+# `SOL_LOCAL` and `sizeof(struct xucred)` of `LOCAL_PEERCRED`, which Python doesn't expose.
+_SOL_LOCAL = 0
+_XUCRED_SIZE = 76
+
+Request = Dict[str, Any]
+
+
+def parse_args(args: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Run a fork server.")
+    serve_parser.add_argument(
+        "--address",
+        required=True,
+        help="The unix socket to listen on. A leading `@` denotes an abstract socket.",
+    )
+    serve_parser.add_argument(
+        "--preload",
+        dest="preload_modules",
+        action="append",
+        default=[],
+        help="A module to import before any processes are started.",
+    )
+    serve_parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        help=(
+            "Run persistently, until idle for this many seconds, rather than until "
+            "the parent process exits."
+        ),
+    )
+
+    connect_parser = subparsers.add_parser(
+        "connect", help="Start a Python process from a fork server."
+    )
+    connect_parser.add_argument(
+        "--address",
+        required=True,
+        help="The unix socket of the fork server.",
+    )
+    connect_parser.add_argument(
+        "python_args",
+        nargs=argparse.REMAINDER,
+        help="Arguments for the Python interpreter, e.g. `-u -c <code>`.",
+    )
+
+    return parser.parse_args(args)
+
+
+def socket_address(address: str) -> str:
+    """Convert an address argument to a unix socket address."""
+    if address.startswith("@"):
+        return "\0" + address[1:]
+    return address
+
+
+def _send_message(sock: socket.socket, message: Request) -> None:
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def _recv_request(sock: socket.socket) -> Tuple[Request, List[int]]:
+    data, fds, _, _ = socket.recv_fds(sock, 65536, 3)
+    while not data.endswith(b"\n"):
+        chunk = sock.recv(65536)
+        if not chunk:
+            for fd in fds:
+                os.close(fd)
+            raise EOFError("The fork server client disconnected")
+        data += chunk
+
+    return json.loads(data), fds
+
+
+def _reset_stdio(unbuffered: bool) -> None:
+    """Recreate the standard streams for the file descriptors sent by a client."""
+    encoding = sys.stdout.encoding
+    errors = sys.stdout.errors
+
+    # The streams replace those of the interpreter so they are never closed.
+    # pylint: disable-next=consider-using-with
+    stdin = io.open(0, "rb", closefd=False)
+    streams: Dict[str, TextIO] = {"stdin": io.TextIOWrapper(stdin, encoding=encoding)}
+    for name, fd in (("stdout", 1), ("stderr", 2)):
+        # pylint: disable-next=consider-using-with
+        binary = io.open(fd, "wb", buffering=0 if unbuffered else -1, closefd=False)
+        streams[name] = io.TextIOWrapper(
+            binary,
+            encoding=encoding,
+            errors="backslashreplace" if name == "stderr" else errors,
+            line_buffering=not unbuffered and os.isatty(fd),
+            write_through=unbuffered,
+        )
+
+    for name, stream in streams.items():
+        setattr(sys, name, stream)
+        setattr(sys, f"__{name}__", stream)
+
+
+def run_request(request: Request, fds: Sequence[int]) -> None:
+    """Run the program of a client request in the current (forked) process.
+
+    Args:
+        request: The arguments, environment and working directory of the client.
+        fds: The client's stdin, stdout and stderr file descriptors.
+    """
+    for stdio_fd, fd in enumerate(fds):
+        os.dup2(fd, stdio_fd)
+        os.close(fd)
+
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    tempfile.tempdir = None
+    # The interpreter only reads `PYTHONPYCACHEPREFIX` as it starts.
+    sys.pycache_prefix = request["env"].get("PYTHONPYCACHEPREFIX")
+
+    unbuffered = False
+    args = list(request["argv"])
+    while args and args[0] not in ("-c", "-m"):
+        flag = args.pop(0)
+        if flag == "-u":
+            unbuffered = True
+        elif flag == "-B":
+            sys.dont_write_bytecode = True
+        else:
+            print(f"Unsupported fork server argument: {flag}", file=sys.stderr)
+            sys.exit(2)
+
+    _reset_stdio(unbuffered)
+
+    if len(args) < 2:
+        print("The fork server requires `-c <code>` or `-m <module>`", file=sys.stderr)
+        sys.exit(2)
+
+    mode, target = args[0], args[1]
+    if mode == "-c":
+        sys.argv = ["-c"] + args[2:]
+        sys.path[0] = ""
+        main_module = types.ModuleType("__main__")
+        sys.modules["__main__"] = main_module
+        # pylint: disable-next=exec-used
+        exec(compile(target, "<string>", "exec"), main_module.__dict__)
+    else:
+        sys.argv = [target] + args[2:]
+        sys.path[0] = os.getcwd()
+        runpy.run_module(target, run_name="__main__", alter_sys=True)
+
+
+class Lifetime:
+    """Determines when a fork server should exit.
+
+    By default a server runs until its parent process exits. A persistent
+    server instead runs until it has been idle for `idle_timeout` seconds, or
+    until a module it imported has been modified.
+    """
+
+    def __init__(self, idle_timeout: Optional[float] = None) -> None:
+        """Constructor
+
+        Args:
+            idle_timeout: The number of idle seconds after which a persistent
+                server exits.
+        """
+        self.parent = os.getppid()
+        self.idle_timeout = idle_timeout
+        self.last_active = time.monotonic()
+        self.module_mtimes: Dict[str, Optional[int]] = {}
+
+    def record_modules(self) -> None:
+        """Record the modification times of all imported modules.
+
+        Persistent servers exit rather than fork a child once any of these
+        change, as the child would run stale code.
+        """
+        self.module_mtimes = {
+            path: _mtime(path)
+            for path in {
+                getattr(module, "__file__", None)
+                for module in list(sys.modules.values())
+            }
+            if path
+        }
+
+    def stale(self) -> bool:
+        """Whether or not any recorded module has been modified."""
+        return any(_mtime(path) != mtime for path, mtime in self.module_mtimes.items())
+
+    def expired(self, busy: bool) -> bool:
+        """Whether or not the server should exit.
+
+        Args:
+            busy: Whether or not the server has running children.
+        """
+        if self.idle_timeout is None:
+            return os.getppid() != self.parent
+        if busy:
+            self.last_active = time.monotonic()
+        return time.monotonic() - self.last_active >= self.idle_timeout
+
+
+class ForkServer:
+    """A server which forks a child for every client connection."""
+
+    def __init__(self, address: str, idle_timeout: Optional[float] = None) -> None:
+        """Constructor
+
+        Args:
+            address: The unix socket to listen on.
+            idle_timeout: The number of idle seconds after which a persistent
+                server exits.
+        """
+        self.address = address
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        # Sockets in the filesystem are only accessible to the current user.
+        umask = os.umask(0o077)
+        try:
+            _bind(self.listener, address)
+        finally:
+            os.umask(umask)
+        self.listener.listen()
+
+        # Children are reaped as `SIGCHLD` is delivered, which wakes the selector.
+        self.wakeup_read, wakeup_write = os.pipe()
+        os.set_blocking(self.wakeup_read, False)
+        os.set_blocking(wakeup_write, False)
+        signal.set_wakeup_fd(wakeup_write)
+        signal.signal(signal.SIGCHLD, lambda *_: None)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ)
+
+        self.children: Dict[int, socket.socket] = {}
+        self.lifetime = Lifetime(idle_timeout)
+
+    def serve(self) -> Tuple[Request, List[int]]:
+        """Accept connections until the server should exit.
+
+        Returns:
+            A client request and its file descriptors. This only ever returns
+            within a forked child.
+        """
+        while self._running():
+            for key, _ in self.selector.select(timeout=1.0):
+                if key.fileobj is self.listener:
+                    forked = self._accept()
+                    if forked:
+                        return forked
+                elif key.fileobj == self.wakeup_read:
+                    self._reap()
+                else:
+                    self._hangup(key.fileobj)  # type: ignore[arg-type]
+
+        self.close()
+        sys.exit(0)
+
+    def close(self) -> None:
+        """Stop listening for connections.
+
+        Connections which have not been accepted yet are reset.
+        """
+        if self.listener.fileno() == -1:
+            # The socket may already belong to a new server.
+            return
+        with contextlib.suppress(KeyError):
+            self.selector.unregister(self.listener)
+        self.listener.close()
+        if not self.address.startswith("@"):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.address)
+
+    def _running(self) -> bool:
+        if self.listener.fileno() == -1:
+            # A server with stale modules stops listening but still reports
+            # the exit of its running children to their clients.
+            return bool(self.children)
+        return not self.lifetime.expired(busy=bool(self.children))
+
+    def _accept(self) -> Optional[Tuple[Request, List[int]]]:
+        conn, _ = self.listener.accept()
+        if _peer_uid(conn) not in (None, os.getuid()):
+            conn.close()
+            return None
+
+        if self.lifetime.stale():
+            # This client, and any others waiting to be accepted, see their
+            # connection close without a response and start a new server.
+            self.close()
+            conn.close()
+            return None
+
+        try:
+            request, fds = _recv_request(conn)
+        except (EOFError, OSError, ValueError):
+            conn.close()
+            return None
+
+        pid = os.fork()
+        if pid == 0:
+            self._close_in_child()
+            conn.close()
+            return request, fds
+
+        for fd in fds:
+            os.close(fd)
+        self.children[pid] = conn
+        self.selector.register(conn, selectors.EVENT_READ)
+        _send_message(conn, {"pid": pid})
+        return None
+
+    def _close_in_child(self) -> None:
+        os.close(signal.set_wakeup_fd(-1))
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        self.selector.close()
+        self.listener.close()
+        os.close(self.wakeup_read)
+        for conn in self.children.values():
+            conn.close()
+
+    def _reap(self) -> None:
+        try:
+            while os.read(self.wakeup_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            conn = self.children.pop(pid, None)
+            if conn is None:
+                continue
+            with contextlib.suppress(OSError):
+                _send_message(conn, {"returncode": os.waitstatus_to_exitcode(status)})
+            with contextlib.suppress(KeyError):
+                self.selector.unregister(conn)
+            conn.close()
+
+    def _hangup(self, conn: socket.socket) -> None:
+        # Clients send nothing after their request so this is a disconnect, most
+        # likely because the client was killed. The child is killed with it.
+        self.selector.unregister(conn)
+        for pid, child_conn in self.children.items():
+            if child_conn is conn:
+                os.kill(pid, signal.SIGKILL)
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _bind(sock: socket.socket, address: str) -> None:
+    """Bind a unix socket, replacing any socket file left behind by a dead server."""
+    try:
+        sock.bind(socket_address(address))
+    except OSError as error:
+        if error.errno != errno.EADDRINUSE or address.startswith("@"):
+            raise
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(address)
+            except ConnectionRefusedError:
+                os.unlink(address)
+            else:
+                raise
+        sock.bind(address)
+
+
+def _peer_uid(sock: socket.socket) -> Optional[int]:
+    """The user of the process connected to a socket, where the platform reports it.
+
+    Abstract sockets have no permissions so the user is checked instead, by the
+    server of its clients and by clients of the server.
+    """
+    if hasattr(socket, "SO_PEERCRED"):
+        creds = sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        _, uid, _ = struct.unpack("3i", creds)
+        return int(uid)
+
+    local_peercred = getattr(socket, "LOCAL_PEERCRED", None)
+    if local_peercred is None:
+        return None
+    # `struct xucred` on macOS and BSDs, as used by `getpeereid`, starts with
+    # its version and the effective user.
+    creds = sock.getsockopt(_SOL_LOCAL, local_peercred, _XUCRED_SIZE)
+    _, uid = struct.unpack_from("2I", creds)
+    return int(uid)
+
+
+def serve(
+    address: str,
+    preload_modules: Sequence[str],
+    idle_timeout: Optional[float] = None,
+) -> None:
+    """Import modules and run a fork server.
+
+    Args:
+        address: The unix socket to listen on.
+        preload_modules: Modules to import before accepting connections.
+        idle_timeout: The number of idle seconds after which the server exits.
+            If unset the server exits with its parent process.
+    """
+    server = ForkServer(address, idle_timeout)
+
+    # Clients may connect as soon as the socket is bound. Their connections
+    # are queued while modules are imported.
+    sys.stdout.buffer.write(READY)
+    sys.stdout.flush()
+
+    for module in preload_modules:
+        # Any error is raised again, for the client to see, when the module is
+        # imported by the child.
+        with contextlib.suppress(Exception):
+            importlib.import_module(module)
+
+    if idle_timeout is not None:
+        server.lifetime.record_modules()
+
+    def terminate(_signum: int, _frame: Optional[types.FrameType]) -> None:
+        server.close()
+        sys.exit(0)
+
+    # Termination of the server does not affect running children.
+    signal.signal(signal.SIGTERM, terminate)
+
+    request, fds = server.serve()
+
+    # Only forked children reach this point.
+    run_request(request, fds)
+
+
+def _launch(
+    address: str,
+    preload_modules: Sequence[str],
+    cwd: Path,
+    env: Dict[str, str],
+    idle_timeout: Optional[float] = None,
+) -> None:
+    """Start a fork server process and wait for it to listen for connections."""
+    command = [sys.executable, "-m", __spec__.name, "serve", "--address", address]
+    command.extend(f"--preload={module}" for module in preload_modules)
+    if idle_timeout is not None:
+        command.append(f"--idle-timeout={idle_timeout}")
+
+    # pylint: disable-next=consider-using-with
+    server = subprocess.Popen(
+        command,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        # Persistent servers outlive the test which started them so they must
+        # not hold its output open, or be in its process group.
+        stderr=subprocess.DEVNULL if idle_timeout is not None else None,
+        start_new_session=idle_timeout is not None,
+    )
+    assert server.stdout is not None
+    if server.stdout.readline() != READY:
+        raise RuntimeError(
+            f"The fork server failed to start (exit code {server.wait()})"
+        )
+    server.stdout.close()
+
+
+def start(preload_modules: Sequence[str], cwd: Path, env: Dict[str, str]) -> str:
+    """Start a fork server for the current process.
+
+    The server exits once the current process does, or once it replaces itself
+    with `os.exec*`, and the process which started it exits.
+
+    Args:
+        preload_modules: Modules for the server to import.
+        cwd: The working directory of the server.
+        env: The environment of the server.
+
+    Returns:
+        A command which starts a Python interpreter from the server. Arguments
+        for the interpreter are to be appended to it.
+    """
+    token = f"pytest-forkserver-{os.getpid()}-{secrets.token_hex(8)}"
+    if sys.platform.startswith("linux"):
+        address = f"@{token}"
+    else:
+        # Unix socket paths are limited to ~100 characters which paths within
+        # `TEST_TMPDIR` can easily exceed.
+        address = str(Path(tempfile.mkdtemp(prefix=token, dir="/tmp")) / "socket")
+
+    _launch(address, preload_modules, cwd, env)
+
+    return shlex.join(
+        [
+            sys.executable,
+            "-S",
+            "-E",
+            os.path.abspath(__file__),
+            "connect",
+            "--address",
+            address,
+            "--",
+        ]
+    )
+
+
+def runtime_dir() -> Path:
+    """The directory of the sockets of the current user's persistent servers.
+
+    This is within `XDG_RUNTIME_DIR`, or `/tmp` if it's unset, and only accessible
+    to the current user so other users can neither connect to the servers nor
+    take their place.
+
+    Raises:
+        PermissionError: If the directory is accessible to other users.
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    path = Path(base) / f"pytest-forkserver-{os.getuid()}"
+    with contextlib.suppress(FileExistsError):
+        path.mkdir(mode=0o700)
+
+    path_stat = path.lstat()
+    if (
+        not stat.S_ISDIR(path_stat.st_mode)
+        or path_stat.st_uid != os.getuid()
+        or path_stat.st_mode & 0o077
+    ):
+        raise PermissionError(f"{path} is accessible to other users")
+    return path
+
+
+def persistent_address(preload_modules: Sequence[str], env: Dict[str, str]) -> str:
+    """The address of the persistent fork server for an interpreter and environment.
+
+    Servers are shared by every run with the same interpreter, import path and
+    preloaded modules, which for `py_pytest_test` is every run of a target.
+
+    Raises:
+        PermissionError: If the directory of the socket is accessible to other users.
+    """
+    key = json.dumps(
+        [
+            sys.executable,
+            sys.version,
+            env.get("PYTHONPATH", ""),
+            list(preload_modules),
+        ]
+    )
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+    return str(runtime_dir() / f"worker-{digest}.sock")
+
+
+def run_persistent(
+    preload_modules: Sequence[str],
+    python_args: Sequence[str],
+    cwd: Path,
+    env: Dict[str, str],
+    idle_timeout: float = PERSISTENT_IDLE_TIMEOUT,
+) -> None:
+    """Run a Python program from a persistent fork server, starting one if needed.
+
+    Args:
+        preload_modules: Modules for the server to import.
+        python_args: Arguments for the Python interpreter.
+        cwd: The working directory of the program.
+        env: The environment of the program.
+        idle_timeout: The number of idle seconds after which a new server exits.
+
+    Returns:
+        Only if no server could be used, in which case the program has not run.
+    """
+    try:
+        address = persistent_address(preload_modules, env)
+    except OSError:
+        return
+
+    for attempt in range(_PERSISTENT_ATTEMPTS):
+        try:
+            client = Client(address, python_args, cwd=cwd, env=env)
+        except PermissionError:
+            return
+        except OSError:
+            if attempt == _PERSISTENT_ATTEMPTS - 1:
+                return
+            # Another run may start a server first, in which case this one
+            # fails to bind and the next attempt connects to the other.
+            with contextlib.suppress(OSError, RuntimeError):
+                _launch(address, preload_modules, cwd, env, idle_timeout)
+            continue
+
+        client.wait()
+
+
+class Client:
+    """A Python process started from a fork server."""
+
+    def __init__(
+        self,
+        address: str,
+        python_args: Sequence[str],
+        cwd: Optional[Path] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Constructor
+
+        Args:
+            address: The unix socket of the fork server.
+            python_args: Arguments for the Python interpreter.
+            cwd: The working directory of the process. Defaults to the current one.
+            env: The environment of the process. Defaults to the current one.
+
+        Raises:
+            PermissionError: If the fork server belongs to another user.
+            OSError: If the fork server did not start the process.
+        """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_address(address))
+        if _peer_uid(self.sock) not in (None, os.getuid()):
+            self.sock.close()
+            raise PermissionError(f"The fork server {address} belongs to another user")
+
+        request = {
+            "argv": list(python_args),
+            "cwd": str(cwd or os.getcwd()),
+            "env": dict(os.environ if env is None else env),
+        }
+        socket.send_fds(
+            self.sock, [json.dumps(request).encode("utf-8") + b"\n"], [0, 1, 2]
+        )
+
+        self.responses = self.sock.makefile("rb")
+        response = self.responses.readline()
+        if not response:
+            raise ConnectionResetError("The fork server did not start a process")
+        self.pid: int = json.loads(response)["pid"]
+
+    def kill(self, signum: int) -> None:
+        """Send a signal to the process, unless it has already exited."""
+        with contextlib.suppress(ProcessLookupError):
+            os.kill(self.pid, signum)
+
+    def wait(self) -> NoReturn:
+        """Wait for the process to exit and exit the same way."""
+        # The child now owns the standard streams. They're closed here so the
+        # process starting this client sees them close when the child exits.
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        os.close(devnull)
+
+        def forward_signal(signum: int, _frame: Optional[types.FrameType]) -> None:
+            self.kill(signum)
+
+        for signum in _FORWARDED_SIGNALS:
+            signal.signal(signum, forward_signal)
+
+        response = self.responses.readline()
+        if not response:
+            os._exit(1)
+
+        returncode = json.loads(response)["returncode"]
+        if returncode < 0:
+            # `SIGKILL` and `SIGSTOP` can't be handled so their disposition is fixed.
+            with contextlib.suppress(OSError):
+                signal.signal(-returncode, signal.SIG_DFL)
+            os.kill(os.getpid(), -returncode)
+            returncode = 128 - returncode
+
+        os._exit(returncode)
+
+
+def main() -> None:
+    """The main entrypoint."""
+    args = parse_args()
+
+    if args.command == "serve":
+        serve(args.address, args.preload_modules, args.idle_timeout)
+    else:
+        python_args = args.python_args
+        if python_args and python_args[0] == "--":
+            python_args = python_args[1:]
+        Client(args.address, python_args).wait()
+
+
+if __name__ == "__main__":
+    main()
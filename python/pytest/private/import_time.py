@@ -0,0 +1,313 @@
+"""Import time profiling of the pytest processes of `py_pytest_test`.
+
+pytest, and any pytest-xdist workers, are run with `python -X importtime`. The
+interpreter writes the time spent importing each module to stderr which is
+separated from the rest of the output into a log for each process. The logs
+are summarized into a report of the slowest modules and packages across all
+processes followed by the import tree of each process, sorted by cumulative
+time.
+
+This module is also run as the interpreter of pytest-xdist workers, as a
+launcher which starts the worker in a child process. It must only use the
+standard library as the launcher is run without `site`.
+"""
+
+import argparse
+import dataclasses
+import os
+import shlex
+import signal
+import subprocess
+import sys
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Sequence, Tuple
+
+IMPORT_TIME_DIR_ENV = "PY_PYTEST_IMPORT_TIME_DIR"
+"""The environment variable containing the directory pytest processes write import time logs to."""
+
+IMPORT_TIME_OUTPUT = "pytest_import_time.txt"
+"""The name of the report written to `TEST_UNDECLARED_OUTPUTS_DIR`."""
+
+TOP_COUNT = 25
+"""The number of modules and packages flagged as the most expensive."""
+
+_PREFIX = b"import time:"
+
+_FORWARDED_SIGNALS = tuple(
+    getattr(signal, name)
+    for name in ("SIGHUP", "SIGINT", "SIGQUIT", "SIGTERM")
+    if hasattr(signal, name)
+)
+
+
+def parse_args(args: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--log-dir",
+        type=Path,
+        required=True,
+        help="The directory to write the import time log of the process to.",
+    )
+    parser.add_argument(
+        "args",
+        nargs=argparse.REMAINDER,
+        help="Arguments for the interpreter.",
+    )
+
+    parsed_args = parser.parse_args(args)
+    if parsed_args.args[:1] == ["--"]:
+        parsed_args.args = parsed_args.args[1:]
+    return parsed_args
+
+
+def split_stderr(stderr: IO[bytes], log: IO[bytes], output: IO[bytes]) -> None:
+    """Separate the import times written to a process's stderr from its other output.
+
+    Args:
+        stderr: The stderr of the process.
+        log: The stream to write import times to.
+        output: The stream to forward all other output to.
+    """
+    for line in iter(stderr.readline, b""):
+        if line.startswith(_PREFIX):
+            log.write(line)
+        else:
+            output.write(line)
+            output.flush()
+
+
+def run(
+    args: Sequence[str],
+    log_file: Path,
+    cwd: Optional[Path] = None,
+    env: Optional[Dict[str, str]] = None,
+) -> int:
+    """Run a Python interpreter with `-X importtime`.
+
+    Args:
+        args: Arguments for the interpreter.
+        log_file: The file to write the import times of the process to.
+        cwd: The working directory of the process.
+        env: The environment of the process.
+
+    Returns:
+        The exit code of the process.
+    """
+    with subprocess.Popen(
+        [sys.executable, "-X", "importtime"] + list(args),
+        cwd=cwd,
+        env=env,
+        stderr=subprocess.PIPE,
+    ) as process:
+        assert process.stderr is not None
+        # Interruptions, such as Bazel's test timeout, are passed to the child.
+        handlers = {
+            signum: signal.signal(signum, lambda signum, _: process.send_signal(signum))
+            for signum in _FORWARDED_SIGNALS
+        }
+        try:
+            with log_file.open("wb") as log:
+                split_stderr(process.stderr, log, sys.stderr.buffer)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    return process.returncode
+
+
+def launcher(log_dir: Path) -> str:
+    """A command to run in place of the interpreter of pytest-xdist workers.
+
+    Args:
+        log_dir: The directory to write the import time log of each worker to.
+
+    Returns:
+        A command to which arguments for the interpreter are appended.
+    """
+    return shlex.join(
+        [
+            sys.executable,
+            "-S",
+            "-E",
+            os.path.abspath(__file__),
+            f"--log-dir={log_dir}",
+            "--",
+        ]
+    )
+
+
+@dataclasses.dataclass
+class ImportNode:
+    """A module import and the imports it triggered.
+
+    Attributes:
+        name: The name of the module.
+        self_us: The time spent importing the module itself, in microseconds.
+        cumulative_us: The time including nested imports, in microseconds.
+        children: The imports triggered by the module.
+    """
+
+    name: str
+    self_us: int
+    cumulative_us: int
+    children: List["ImportNode"] = dataclasses.field(default_factory=list)
+
+    def walk(self) -> List["ImportNode"]:
+        """This node and all of its descendants."""
+        nodes = [self]
+        for child in self.children:
+            nodes.extend(child.walk())
+        return nodes
+
+
+def parse_log(lines: Sequence[str]) -> List[ImportNode]:
+    """Parse the output of `-X importtime` into import trees.
+
+    Imports are written once they complete, after the imports they triggered,
+    and each level of nesting is indented by two spaces.
+
+    Args:
+        lines: The lines of the log.
+
+    Returns:
+        The top level imports in the order they were made.
+    """
+    pending: Dict[int, List[ImportNode]] = {}
+    for line in lines:
+        if not line.startswith(_PREFIX.decode()):
+            continue
+        fields = line[len(_PREFIX) :].split("|", 2)
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+
+        module = fields[2].rstrip("\r\n")[1:]
+        name = module.lstrip(" ")
+        depth = (len(module) - len(name)) // 2
+        node = ImportNode(
+            name, int(fields[0]), int(fields[1]), pending.pop(depth + 1, [])
+        )
+        pending.setdefault(depth, []).append(node)
+
+    return pending[min(pending)] if pending else []
+
+
+def top_modules(
+    processes: Dict[str, List[ImportNode]], count: int = TOP_COUNT
+) -> List[Tuple[str, int, int]]:
+    """Find the modules which took the longest to import, across all processes.
+
+    Args:
+        processes: The import trees of each process.
+        count: The number of modules to return.
+
+    Returns:
+        The name, total self time and number of imports of each module.
+    """
+    totals: Dict[str, Tuple[int, int]] = {}
+    for roots in processes.values():
+        for root in roots:
+            for node in root.walk():
+                total, imports = totals.get(node.name, (0, 0))
+                totals[node.name] = (total + node.self_us, imports + 1)
+
+    ranked = sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))
+    return [(name, total, imports) for name, (total, imports) in ranked[:count]]
+
+
+def top_packages(
+    processes: Dict[str, List[ImportNode]], count: int = TOP_COUNT
+) -> List[Tuple[str, int]]:
+    """Find the top level packages which took the longest to import, across all processes.
+
+    This attributes the self time of every module to its top level package,
+    which generally corresponds to a dependency of the test.
+
+    Args:
+        processes: The import trees of each process.
+        count: The number of packages to return.
+
+    Returns:
+        The name and total self time of each package.
+    """
+    totals: Dict[str, int] = {}
+    for roots in processes.values():
+        for root in roots:
+            for node in root.walk():
+                package = node.name.split(".", 1)[0]
+                totals[package] = totals.get(package, 0) + node.self_us
+
+    ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+    return ranked[:count]
+
+
+def format_tree(roots: Sequence[ImportNode], depth: int = 0) -> List[str]:
+    """Format import trees with the most expensive imports first."""
+    lines = []
+    for node in sorted(roots, key=lambda node: (-node.cumulative_us, node.name)):
+        lines.append(
+            f"{node.cumulative_us:>12} {node.self_us:>10}  {'  ' * depth}{node.name}"
+        )
+        lines.extend(format_tree(node.children, depth + 1))
+    return lines
+
+
+def write_report(log_dir: Path, output: Path) -> None:
+    """Summarize the import time logs of all processes.
+
+    Args:
+        log_dir: The directory of import time logs, one per process.
+        output: The report to write.
+    """
+    processes = {
+        log.stem: parse_log(log.read_text(encoding="utf-8").splitlines())
+        for log in sorted(log_dir.glob("*.txt"))
+    }
+
+    lines = [
+        "Import times of pytest processes in microseconds, from `python -X importtime`.",
+        "",
+        f"Slowest modules by self time, summed across {len(processes)} process(es):",
+        "",
+        f"{'self':>12} {'imports':>10}  module",
+    ]
+    for name, total, imports in top_modules(processes):
+        lines.append(f"{total:>12} {imports:>10}  {name}")
+
+    lines.extend(
+        [
+            "",
+            "Slowest top level packages by the self time of their modules:",
+            "",
+            f"{'self':>12}  package",
+        ]
+    )
+    for name, total in top_packages(processes):
+        lines.append(f"{total:>12}  {name}")
+
+    for process, roots in processes.items():
+        total = sum(root.cumulative_us for root in roots)
+        modules = sum(len(root.walk()) for root in roots)
+        lines.extend(
+            [
+                "",
+                f"{process}: {modules} modules imported in {total}us",
+                "",
+                f"{'cumulative':>12} {'self':>10}  module",
+            ]
+        )
+        lines.extend(format_tree(roots))
+
+    output.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def main() -> None:
+    """Launch a pytest-xdist worker, logging its import times."""
+    args = parse_args()
+
+    log_file = args.log_dir / f"worker-{os.getpid()}.txt"
+    sys.exit(run(args.args, log_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""A script for generating the test inventory of a `py_pytest_test` at build time.
+
+pytest collects the sources of the test within a replica of its runfiles and
+the node IDs, markers and parametrizations of every collected test are written
+to a json file. Errors during collection, such as failing imports, fail the
+build instead of the test.
+
+The inventory is read by `pytest_bazel_plugin` to plan test shards and by the
+process wrapper to size pytest-xdist workers.
+
+This runs in Bazel's exec configuration but imports the dependencies of the
+test as built for the target configuration, so it requires both to share a
+platform and Python version.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import posixpath
+import sys
+import tempfile
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(fromfile_prefix_chars="@")
+
+    parser.add_argument(
+        "--runfiles",
+        type=Path,
+        required=True,
+        help="A file of tab separated execpaths and rlocationpaths of the runfiles of the test.",
+    )
+    parser.add_argument(
+        "--imports",
+        type=Path,
+        required=True,
+        help="A file containing newline delimited import paths relative to the runfiles root.",
+    )
+    parser.add_argument(
+        "--workspace-name",
+        required=True,
+        help="The name of the workspace of the test.",
+    )
+    parser.add_argument(
+        "--pytest-config",
+        type=PurePosixPath,
+        required=True,
+        help="The rlocationpath of the pytest config file.",
+    )
+    parser.add_argument(
+        "--src",
+        dest="sources",
+        type=PurePosixPath,
+        action="append",
+        default=[],
+        required=True,
+        help="The rlocationpath of a source file to collect.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="The location of the inventory to write.",
+    )
+
+    return parser.parse_args()
+
+
+def read_lines(path: Path) -> List[str]:
+    """Read the non-empty lines of a file."""
+    return [
+        line for line in path.read_text(encoding="utf-8").splitlines() if line.strip()
+    ]
+
+
+def link_runfiles(runfiles: List[Tuple[Path, PurePosixPath]], root: Path) -> None:
+    """Create a replica of a runfiles directory from symlinks.
+
+    Args:
+        runfiles: The execpath and rlocationpath of each file.
+        root: The directory in which to create the replica.
+    """
+    for execpath, rlocationpath in runfiles:
+        link = root / rlocationpath
+        if link.exists() or link.is_symlink():
+            continue
+        link.parent.mkdir(parents=True, exist_ok=True)
+        link.symlink_to(execpath.absolute())
+
+
+class InventoryRecorder:
+    """A pytest plugin which records collected tests and collection errors."""
+
+    def __init__(self) -> None:
+        """Constructor"""
+        self.tests: List[Dict[str, Any]] = []
+        self.errors: List[str] = []
+
+    @pytest.hookimpl
+    def pytest_collectreport(self, report: pytest.CollectReport) -> None:
+        """Record collection errors."""
+        if report.failed:
+            self.errors.append(f"{report.nodeid}\n{report.longreprtext}")
+
+    @pytest.hookimpl
+    def pytest_collection_finish(self, session: pytest.Session) -> None:
+        """Record the collected tests."""
+        for item in session.items:
+            callspec = getattr(item, "callspec", None)
+            self.tests.append(
+                {
+                    "nodeid": item.nodeid,
+                    "markers": sorted({marker.name for marker in item.iter_markers()}),
+                    "parametrize": callspec.id if callspec is not None else None,
+                }
+            )
+
+
+def collect(
+    sources: List[Path], pytest_config: Path, rootdir: Path
+) -> Tuple[int, InventoryRecorder, str]:
+    """Run pytest collection.
+
+    Args:
+        sources: The test sources to collect.
+        pytest_config: The pytest config file.
+        rootdir: The root directory of the test.
+
+    Returns:
+        The pytest exit code, the collected inventory and the output of pytest.
+    """
+    recorder = InventoryRecorder()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        exit_code = pytest.main(
+            [
+                "--collect-only",
+                "-q",
+                "-p",
+                "no:cacheprovider",
+                "--rootdir",
+                str(rootdir),
+                "-c",
+                str(pytest_config),
+            ]
+            + [str(src) for src in sources],
+            plugins=[recorder],
+        )
+
+    return int(exit_code), recorder, output.getvalue()
+
+
+def main() -> None:
+    """The main entrypoint."""
+    args = parse_args()
+
+    runfiles = []
+    for line in read_lines(args.runfiles):
+        execpath, _, rlocationpath = line.partition("\t")
+        runfiles.append((Path(execpath), PurePosixPath(rlocationpath)))
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory(prefix="pytest_inventory-") as tmp:
+        tmp_dir = Path(tmp)
+        runfiles_dir = tmp_dir / "runfiles"
+        link_runfiles(runfiles, runfiles_dir)
+
+        test_dir = runfiles_dir / args.workspace_name
+        test_dir.mkdir(parents=True, exist_ok=True)
+        for name in ("home", "tmp"):
+            (tmp_dir / name).mkdir()
+
+        # Mirror the environment tests are collected in by the process wrapper.
+        os.environ.update(
+            {
+                "HOME": str(tmp_dir / "home"),
+                "RUNFILES_DIR": str(runfiles_dir),
+                "TEST_TMPDIR": str(tmp_dir / "tmp"),
+                "TEST_WORKSPACE": args.workspace_name,
+                "TMPDIR": str(tmp_dir / "tmp"),
+            }
+        )
+        sys.path[:0] = [str(test_dir)] + [
+            str(runfiles_dir / path) for path in read_lines(args.imports)
+        ]
+        sys.dont_write_bytecode = True
+        os.chdir(test_dir)
+
+        exit_code, recorder, output = collect(
+            sources=[runfiles_dir / src for src in args.sources],
+            pytest_config=runfiles_dir / args.pytest_config,
+            rootdir=test_dir,
+        )
+        os.chdir(cwd)
+
+    # Exit code 5 indicates no tests were collected. Collection errors are
+    # included in the output of pytest.
+    if exit_code not in (0, 5) or recorder.errors:
+        print(output, file=sys.stderr)
+        sys.exit(exit_code or 1)
+
+    # Files are relative to the root directory, as are the node IDs of tests.
+    inventory = {
+        "files": [
+            posixpath.relpath(str(src), args.workspace_name) for src in args.sources
+        ],
+        "tests": recorder.tests,
+    }
+    args.output.write_text(json.dumps(inventory, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
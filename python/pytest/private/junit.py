@@ -0,0 +1,160 @@
+"""JUnit XML reports of `py_pytest_test` runs.
+
+pytest's `junitxml` plugin writes a single `testsuite` for a session. Sessions
+which run several test files are reported with a `testsuite` per file, and
+results are recreated in the same form for the partial reports of the timeout
+watchdog.
+"""
+
+import copy
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+from xml.etree import ElementTree
+
+import pytest
+
+from python.pytest.private import watchdog
+
+
+def junit_test_file(testcase: ElementTree.Element, modules: Dict[str, str]) -> str:
+    """Find the test file of a JUnit XML `testcase`.
+
+    pytest derives the `classname` of a test from its node ID by replacing the
+    path separators of the file with dots, dropping `.py` and appending any
+    classes, e.g. `pkg/foo_test.py::TestFoo::test_foo` has the `classname`
+    `pkg.foo_test.TestFoo`. Collection errors have only a `name`.
+
+    Args:
+        testcase: A `testcase` element.
+        modules: A mapping of dotted test file paths to test files.
+
+    Returns:
+        The test file, or an empty string if none matches.
+    """
+    address = ".".join(
+        part for part in (testcase.get("classname"), testcase.get("name")) if part
+    )
+    parts = address.split(".")
+    for end in range(len(parts), 0, -1):
+        test_file = modules.get(".".join(parts[:end]))
+        if test_file:
+            return test_file
+
+    return ""
+
+
+def split_junit_testsuites(xml_file: Path, test_files: Sequence[str]) -> None:
+    """Rewrite a pytest JUnit XML report with a `testsuite` for each test file.
+
+    Args:
+        xml_file: The JUnit XML report written by pytest.
+        test_files: The test files of the session, relative to its rootdir.
+    """
+    tree = ElementTree.parse(xml_file)
+    root = tree.getroot()
+    modules = {
+        test_file[: -len(".py")].replace("/", "."): test_file
+        for test_file in test_files
+    }
+
+    for suite in list(root.iter("testsuite")):
+        testcases: Dict[str, List[ElementTree.Element]] = {}
+        for testcase in suite.iter("testcase"):
+            testcases.setdefault(junit_test_file(testcase, modules), []).append(
+                testcase
+            )
+
+        index = list(root).index(suite)
+        root.remove(suite)
+        for offset, (test_file, cases) in enumerate(testcases.items()):
+            root.insert(
+                index + offset,
+                file_testsuite(suite, test_file or suite.get("name", "pytest"), cases),
+            )
+
+    tree.write(xml_file, encoding="utf-8", xml_declaration=True)
+
+
+def file_testsuite(
+    suite: ElementTree.Element, name: str, cases: Sequence[ElementTree.Element]
+) -> ElementTree.Element:
+    """Create a `testsuite` for some of the test cases of another.
+
+    Args:
+        suite: The `testsuite` the test cases belong to.
+        name: The name of the new `testsuite`.
+        cases: The `testcase` elements of the new `testsuite`.
+
+    Returns:
+        A `testsuite` with the attributes and properties of `suite`, and the
+        counts and time of `cases`.
+    """
+    file_suite = ElementTree.Element("testsuite", dict(suite.attrib))
+    file_suite.set("name", name)
+    for tag, attr in (
+        ("error", "errors"),
+        ("failure", "failures"),
+        ("skipped", "skipped"),
+    ):
+        file_suite.set(attr, str(sum(len(case.findall(tag)) for case in cases)))
+    file_suite.set("tests", str(len(cases)))
+    total_time = sum(float(case.get("time", 0.0)) for case in cases)
+    file_suite.set("time", f"{total_time:.3f}")
+
+    properties: Optional[ElementTree.Element] = suite.find("properties")
+    if properties is not None:
+        file_suite.append(copy.deepcopy(properties))
+    file_suite.extend(cases)
+    return file_suite
+
+
+def junit_testcase(
+    nodeid: str, reports: Sequence[pytest.TestReport]
+) -> ElementTree.Element:
+    """Create a JUnit XML `testcase` from the reports of a test as pytest's `junitxml` does.
+
+    Captured output and properties are not included.
+
+    Args:
+        nodeid: The node ID of the test.
+        reports: The reports of the phases of the test which have completed.
+
+    Returns:
+        A `testcase` element.
+    """
+    path, bracket, params = nodeid.partition("[")
+    names = path.split("::")
+    names[0] = names[0].replace("/", ".")
+    if names[0].endswith(".py"):
+        names[0] = names[0][: -len(".py")]
+    names[-1] += bracket + params
+
+    testcase = ElementTree.Element(
+        "testcase",
+        {
+            "classname": watchdog.xml_text(".".join(names[:-1])),
+            "name": watchdog.xml_text(names[-1]),
+            "time": f"{sum(report.duration for report in reports):.3f}",
+        },
+    )
+    for report in reports:
+        if report.failed:
+            crash = getattr(report.longrepr, "reprcrash", None)
+            message = crash.message if crash else f"failed on {report.when}"
+            element = ElementTree.SubElement(
+                testcase,
+                "failure" if report.when == "call" else "error",
+                {"message": watchdog.xml_text(message)},
+            )
+            element.text = watchdog.xml_text(report.longreprtext)
+        elif report.skipped:
+            message = getattr(report, "wasxfail", None) or "skipped"
+            if isinstance(report.longrepr, tuple):
+                message = str(report.longrepr[2])
+                if message.startswith("Skipped: "):
+                    message = message[len("Skipped: ") :]
+            ElementTree.SubElement(
+                testcase, "skipped", {"message": watchdog.xml_text(message)}
+            )
+
+    return testcase
@@ -0,0 +1,115 @@
+"""Memory measurement of the pytest processes of `py_pytest_test`.
+
+The peak resident set size (RSS) of a process is its high water mark. On Linux
+it can be reset (see `proc(5)`, `/proc/[pid]/clear_refs`) which allows the
+peak of each test to be measured. Elsewhere only the peak of the process as a
+whole is available, so the peak of a test is that of its process so far.
+"""
+
+import os
+import sys
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+MEMORY_PROFILE_ENV = "PY_PYTEST_MEMORY_PROFILE"
+"""The environment variable containing what to record of the memory use of tests."""
+
+MAX_MEMORY_ENV = "PY_PYTEST_MAX_MEMORY_MB"
+"""The environment variable containing the memory budget of a test in megabytes."""
+
+MEMORY_OUTPUT = "pytest_memory.json"
+"""The name of the memory report written to `TEST_UNDECLARED_OUTPUTS_DIR`."""
+
+MEMORY_PROFILES = ("rss", "tracemalloc")
+"""Supported memory profiles. `tracemalloc` records allocations in addition to RSS."""
+
+TOP_ALLOCATIONS = 10
+"""The number of source lines recorded for the allocations of each test."""
+
+_STATUS = "/proc/self/status"
+
+_CLEAR_REFS = "/proc/self/clear_refs"
+
+# Resets the peak RSS of the process.
+_RESET_PEAK_RSS = "5"
+
+
+def peak_rss() -> Optional[int]:
+    """The peak resident set size of the current process in bytes.
+
+    Returns:
+        The peak RSS, or None if it can't be determined.
+    """
+    try:
+        with open(_STATUS, encoding="utf-8") as fhd:
+            for line in fhd:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        # pylint: disable-next=import-outside-toplevel
+        import resource
+    except ImportError:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # `ru_maxrss` is in bytes on macOS and kilobytes elsewhere.
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def reset_peak_rss() -> bool:
+    """Reset the peak resident set size of the current process.
+
+    Returns:
+        Whether or not the peak was reset.
+    """
+    try:
+        with open(_CLEAR_REFS, "w", encoding="utf-8") as fhd:
+            fhd.write(_RESET_PEAK_RSS)
+    except OSError:
+        return False
+    return True
+
+
+def megabytes(size: float) -> float:
+    """Convert a size in bytes to megabytes (MiB)."""
+    return round(size / (1024 * 1024), 1)
+
+
+def top_allocations(
+    snapshot: tracemalloc.Snapshot, count: int = TOP_ALLOCATIONS
+) -> List[Dict[str, Any]]:
+    """Summarize the largest allocations of a tracemalloc snapshot by source line.
+
+    Args:
+        snapshot: A snapshot of traced allocations.
+        count: The number of source lines to return.
+
+    Returns:
+        The location, size in kilobytes and number of allocations of each line.
+    """
+    snapshot = snapshot.filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        )
+    )
+
+    allocations = []
+    for stat in snapshot.statistics("lineno")[:count]:
+        frame = stat.traceback[0]
+        filename = frame.filename
+        if filename.startswith(os.getcwd() + os.sep):
+            filename = os.path.relpath(filename)
+        allocations.append(
+            {
+                "location": f"{filename}:{frame.lineno}",
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+            }
+        )
+
+    return allocations
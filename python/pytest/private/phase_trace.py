@@ -0,0 +1,150 @@
+"""Phase timing of `py_pytest_test` runs recorded as a Chrome trace.
+
+The process wrapper and every pytest process (including pytest-xdist workers)
+record spans of their own phases and write them to a shared directory. The
+spans of all processes are merged into a single file of the [Trace Event
+Format][tef] which can be opened in `chrome://tracing` or the [Perfetto UI][pf].
+
+[tef]: https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+[pf]: https://ui.perfetto.dev
+"""
+
+import contextlib
+import dataclasses
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+TRACE_DIR_ENV = "PY_PYTEST_TRACE_DIR"
+"""The environment variable containing the directory processes write their spans to."""
+
+LAUNCH_TIME_ENV = "PY_PYTEST_TRACE_LAUNCH_TIME"
+"""The environment variable containing the time, in microseconds, pytest was launched at."""
+
+TRACE_OUTPUT = "pytest_trace.json"
+"""The name of the trace file written to `TEST_UNDECLARED_OUTPUTS_DIR`."""
+
+
+def now() -> int:
+    """The current time in microseconds.
+
+    Wall clock time is used as it's comparable between processes.
+    """
+    return time.time_ns() // 1000
+
+
+@dataclasses.dataclass
+class Span:
+    """A phase of a process.
+
+    Attributes:
+        name: The name of the span.
+        category: The category of the span.
+        start: The start of the span in microseconds, see `now`.
+        end: The end of the span in microseconds.
+        args: Optional details to display with the span.
+    """
+
+    name: str
+    category: str
+    start: int
+    end: int
+    args: Optional[Dict[str, Any]] = None
+
+
+class Tracer:
+    """Records the spans of a process as trace events."""
+
+    def __init__(self, name: str) -> None:
+        """Constructor
+
+        Args:
+            name: The name to display for the process.
+        """
+        self.name = name
+        self.events: List[Dict[str, Any]] = []
+
+    def add(self, span: Span) -> None:
+        """Record a span.
+
+        Args:
+            span: The span to record.
+        """
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": span.start,
+            "dur": max(0, span.end - span.start),
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+        }
+        if span.args:
+            event["args"] = span.args
+        self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, category: str, args: Optional[Dict[str, Any]] = None
+    ) -> Iterator[None]:
+        """Record a span for the duration of a `with` block."""
+        start = now()
+        try:
+            yield
+        finally:
+            self.add(Span(name, category, start, now(), args))
+
+    def write(self, trace_dir: Path) -> Path:
+        """Write the recorded spans of the process.
+
+        Writing again replaces the spans written before.
+
+        Args:
+            trace_dir: The directory shared by all processes of the test.
+
+        Returns:
+            The file written.
+        """
+        path = trace_dir / f"{os.getpid()}.{self.name}.json"
+        path.write_text(
+            json.dumps({"name": self.name, "pid": os.getpid(), "events": self.events}),
+            encoding="utf-8",
+        )
+        return path
+
+
+def merge(trace_dir: Path, output: Path) -> None:
+    """Merge the spans written by all processes into a single trace file.
+
+    A process replaced by pytest, or running it in-process, is named after
+    each of its tracers in the order they started.
+
+    Args:
+        trace_dir: The directory processes wrote their spans to.
+        output: The trace file to write.
+    """
+    events: List[Dict[str, Any]] = []
+    names: Dict[int, List[Tuple[int, str]]] = {}
+    for path in sorted(trace_dir.glob("*.json")):
+        content = json.loads(path.read_text(encoding="utf-8"))
+        start = min((event["ts"] for event in content["events"]), default=0)
+        names.setdefault(content["pid"], []).append((start, content["name"]))
+        events.extend(content["events"])
+
+    events.sort(key=lambda event: (event["ts"], -event["dur"]))
+    metadata = [
+        {
+            "name": "process_name",
+            "ph": "M",
+            "pid": pid,
+            "args": {"name": " > ".join(name for _, name in sorted(tracers))},
+        }
+        for pid, tracers in sorted(names.items())
+    ]
+    output.write_text(
+        json.dumps({"traceEvents": metadata + events, "displayTimeUnit": "ms"}) + "\n",
+        encoding="utf-8",
+    )
@@ -0,0 +1,81 @@
+"""Environment variables passed from `pytest_process_wrapper` to `pytest_bazel_plugin`.
+
+They're kept apart from the plugin so the process wrapper can set them without
+importing pytest. The optional features of the plugin are only imported when
+they're enabled.
+"""
+
+import argparse
+import os
+from typing import Dict
+
+TIMINGS_FILE_ENV = "PY_PYTEST_TIMINGS_FILE"
+"""The environment variable containing the path to a recorded timings file."""
+
+RECORD_TIMINGS_ENV = "PY_PYTEST_RECORD_TIMINGS"
+"""The environment variable set when test durations should be recorded without a timings file."""
+
+PLUGINS_FILE_ENV = "PY_PYTEST_PLUGINS_FILE"
+"""The environment variable containing the path to a list of plugins to load."""
+
+INVENTORY_FILE_ENV = "PY_PYTEST_INVENTORY_FILE"
+"""The environment variable containing the path to the test inventory collected at build time."""
+
+PARTITION_COLLECTION_ENV = "PY_PYTEST_PARTITION_COLLECTION"
+"""The environment variable set when each pytest-xdist worker should collect a partition of the inventory."""
+
+
+def environment(parsed_args: argparse.Namespace, start_time: float) -> Dict[str, str]:
+    """The environment variables enabling the optional features of `pytest_bazel_plugin`.
+
+    Args:
+        parsed_args: The arguments of the process wrapper.
+        start_time: The time, in seconds since the epoch, the process wrapper started.
+
+    Returns:
+        The environment variables to add to that of pytest.
+    """
+    env = {}
+
+    # Every pytest process is profiled by the plugin as the process wrapper may
+    # be replaced by pytest.
+    if parsed_args.profile and os.getenv("TEST_UNDECLARED_OUTPUTS_DIR"):
+        # pylint: disable-next=import-outside-toplevel
+        from python.pytest.private import profiler
+
+        env[profiler.PROFILE_ENV] = parsed_args.profile
+
+    # Memory is measured, and the budget enforced, by the plugin.
+    if parsed_args.memory_profile or parsed_args.max_memory_mb:
+        # pylint: disable-next=import-outside-toplevel
+        from python.pytest.private import memory
+
+        if parsed_args.memory_profile:
+            env[memory.MEMORY_PROFILE_ENV] = parsed_args.memory_profile
+        if parsed_args.max_memory_mb:
+            env[memory.MAX_MEMORY_ENV] = str(parsed_args.max_memory_mb)
+
+    # Every pytest process dumps its stacks, and the results so far are kept,
+    # shortly before Bazel kills the test for exceeding its timeout.
+    test_timeout = os.getenv("TEST_TIMEOUT")
+    if test_timeout and not parsed_args.watch:
+        # pylint: disable-next=import-outside-toplevel
+        from python.pytest.private import watchdog
+
+        env[watchdog.DEADLINE_ENV] = str(
+            watchdog.deadline(float(test_timeout), start_time)
+        )
+
+    # Shards are planned from the inventory by the plugin.
+    if parsed_args.inventory:
+        env[INVENTORY_FILE_ENV] = str(parsed_args.inventory)
+        if parsed_args.partition_collection:
+            env[PARTITION_COLLECTION_ENV] = "1"
+
+    # Shards and workers are balanced by recorded durations in the plugin.
+    if parsed_args.timings:
+        env[TIMINGS_FILE_ENV] = str(parsed_args.timings)
+    if parsed_args.record_timings:
+        env[RECORD_TIMINGS_ENV] = "1"
+
+    return env
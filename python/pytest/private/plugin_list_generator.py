@@ -0,0 +1,80 @@
+"""A script for generating the list of pytest plugins available to a `py_pytest_test`.
+
+pytest finds plugins through the `pytest11` entry points of every installed
+distribution, which requires reading the metadata of all of them on each run.
+The entry points of the distributions in the runfiles of a test are instead
+collected here, at build time, so the plugins can be loaded explicitly.
+"""
+
+import argparse
+import configparser
+from pathlib import Path
+from typing import Dict, Iterable
+
+PLUGIN_GROUP = "pytest11"
+"""The entry point group of pytest plugins."""
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--entry-points",
+        type=Path,
+        required=True,
+        help="A file containing newline delimited execpaths of `entry_points.txt` files.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="The location of the output file to write.",
+    )
+
+    return parser.parse_args()
+
+
+def read_plugins(entry_points: Iterable[Path]) -> Dict[str, str]:
+    """Collect the pytest plugins declared by distributions.
+
+    Args:
+        entry_points: The `entry_points.txt` files of distributions.
+
+    Returns:
+        A mapping of plugin names to entry point values (`module` or
+        `module:attribute`). As with `importlib.metadata`, the first
+        declaration of a name wins.
+    """
+    plugins: Dict[str, str] = {}
+    for path in entry_points:
+        parser = configparser.ConfigParser(delimiters=("=",), interpolation=None)
+        parser.optionxform = str  # type: ignore[assignment,method-assign]
+        parser.read_string(path.read_text(encoding="utf-8"), source=str(path))
+        if not parser.has_section(PLUGIN_GROUP):
+            continue
+        for name, value in parser.items(PLUGIN_GROUP):
+            plugins.setdefault(name.strip(), value.strip())
+
+    return plugins
+
+
+def main() -> None:
+    """The main entrypoint."""
+    args = parse_args()
+
+    entry_points = [
+        Path(line.strip())
+        for line in args.entry_points.read_text(encoding="utf-8").splitlines()
+        if line.strip()
+    ]
+
+    plugins = read_plugins(entry_points)
+
+    with args.output.open("w", encoding="utf-8") as fhd:
+        for name, value in plugins.items():
+            fhd.write(f"{name}={value}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""A script for precompiling the Python sources of a `py_pytest_test` to bytecode.
+
+Bytecode is written to a directory which mirrors the runfiles of the test, in
+the layout of a `PYTHONPYCACHEPREFIX`. Test sources and conftests are written
+with the assertions rewritten by pytest, as pytest would cache them, and all
+other sources are compiled as the interpreter would.
+
+Hash based pycs are written since the modification times of sources at test
+time are unrelated to those seen here.
+
+The precompiler runs in Bazel's exec configuration, whose interpreter may not be
+the one the test runs with. The cache tag and magic number of the interpreter
+are written alongside the bytecode (see `INTERPRETER_FILE`) so that the process
+wrapper only uses bytecode its own interpreter can load.
+"""
+
+import argparse
+import ast
+import importlib.util
+import json
+import marshal
+import sys
+import types
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterator, Tuple
+
+from _pytest.assertion.rewrite import PYTEST_TAG, rewrite_asserts
+
+CHECKED_HASH_FLAGS = 0b11
+"""The pyc flags of a hash based pyc which is checked against its source."""
+
+INTERPRETER_FILE = "interpreter.json"
+"""The name of the file in the output directory describing the interpreter which wrote the bytecode."""
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(fromfile_prefix_chars="@")
+
+    parser.add_argument(
+        "--sources",
+        type=Path,
+        required=True,
+        help="A file of tab separated execpaths and rlocationpaths of sources, one per line.",
+    )
+    parser.add_argument(
+        "--rewrite",
+        action="store_true",
+        help="Rewrite assertions in the sources as pytest does for tests and conftests.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="The directory in which to write bytecode.",
+    )
+
+    return parser.parse_args()
+
+
+def read_sources(sources_file: Path) -> Iterator[Tuple[Path, PurePosixPath]]:
+    """Read the sources to compile.
+
+    Args:
+        sources_file: A file of tab separated execpaths and rlocationpaths.
+
+    Yields:
+        The execpath and rlocationpath of each source.
+    """
+    for line in sources_file.read_text(encoding="utf-8").splitlines():
+        if not line:
+            continue
+        execpath, _, rlocationpath = line.partition("\t")
+        yield Path(execpath), PurePosixPath(rlocationpath)
+
+
+def compile_source(source: bytes, filename: str, rewrite: bool) -> types.CodeType:
+    """Compile a source file, optionally rewriting its assertions like pytest.
+
+    Args:
+        source: The content of the source file.
+        filename: The name of the file for the code object. This is replaced
+            with the location of the source when the bytecode is loaded.
+        rewrite: Whether to rewrite assertions.
+
+    Returns:
+        The compiled code.
+    """
+    if rewrite:
+        tree = ast.parse(source, filename=filename)
+        rewrite_asserts(tree, source, filename)
+        return compile(tree, filename, "exec", dont_inherit=True)
+
+    return compile(source, filename, "exec", dont_inherit=True)
+
+
+def pyc_data(code: types.CodeType, source: bytes) -> bytes:
+    """Serialize code to a checked hash based pyc (PEP 552)."""
+    return b"".join(
+        [
+            importlib.util.MAGIC_NUMBER,
+            CHECKED_HASH_FLAGS.to_bytes(4, "little"),
+            importlib.util.source_hash(source),
+            marshal.dumps(code),
+        ]
+    )
+
+
+def interpreter() -> Dict[str, str]:
+    """The cache tag and magic number of the current interpreter's bytecode."""
+    return {
+        "cache_tag": str(sys.implementation.cache_tag),
+        "magic_number": importlib.util.MAGIC_NUMBER.hex(),
+    }
+
+
+def pyc_name(rlocationpath: PurePosixPath, rewrite: bool) -> PurePosixPath:
+    """The location of a pyc relative to a pycache prefix mirroring runfiles."""
+    tag = PYTEST_TAG if rewrite else sys.implementation.cache_tag
+    return rlocationpath.with_name(f"{rlocationpath.stem}.{tag}.pyc")
+
+
+def main() -> None:
+    """The main entrypoint."""
+    args = parse_args()
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    (args.output / INTERPRETER_FILE).write_text(
+        json.dumps(interpreter(), sort_keys=True) + "\n", encoding="utf-8"
+    )
+    for execpath, rlocationpath in read_sources(args.sources):
+        source = execpath.read_bytes()
+        try:
+            code = compile_source(source, str(rlocationpath), args.rewrite)
+        except (SyntaxError, ValueError):
+            # The error is reported by the test when the source is imported.
+            continue
+
+        output = args.output / pyc_name(rlocationpath, args.rewrite)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(pyc_data(code, source))
+
+
+if __name__ == "__main__":
+    main()
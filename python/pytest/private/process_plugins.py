@@ -0,0 +1,617 @@
+"""pytest plugins for the optional features of `py_pytest_test`.
+
+`pytest_bazel_plugin` registers these in each pytest process, including
+pytest-xdist workers, as they're enabled by the process wrapper.
+"""
+
+import contextlib
+import dataclasses
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO
+from xml.etree import ElementTree
+
+import pytest
+
+from python.pytest.private import junit, memory, phase_trace, profiler, watchdog
+
+PEAK_RSS_WORKER_OUTPUT = "bazel_peak_rss"
+"""The pytest-xdist `workeroutput` key containing the peak RSS of a worker in bytes."""
+
+PARTITION_WORKER_INPUT = "bazel_partition"
+"""The pytest-xdist `workerinput` key containing the partition, `[count, index]`, of the inventory a worker collects."""
+
+PARTITION_XDIST_VERSION = 3
+"""The major version of pytest-xdist whose `EachScheduling` internals `PartitionCollection` relies on."""
+
+_ALLOCATIONS_KEY = pytest.StashKey[List[Dict[str, Any]]]()
+
+# The time this module was imported, along with `pytest_bazel_plugin`, in
+# microseconds, which is when pytest-xdist workers start recording their phases.
+_IMPORT_TIME = phase_trace.now()
+
+
+def is_xdist_worker(config: pytest.Config) -> bool:
+    """Determine whether or not the current process is a pytest-xdist worker."""
+    return hasattr(config, "workerinput")
+
+
+def process_name(config: pytest.Config) -> str:
+    """A name for the current pytest process, e.g. `pytest` or `pytest-gw0` for workers."""
+    if is_xdist_worker(config):
+        workerid = getattr(config, "workerinput")["workerid"]
+        return f"pytest-{workerid}"
+    return "pytest"
+
+
+class DurationRecorder:
+    """Records the duration of each test so timings files can be refreshed."""
+
+    def __init__(self, output: Path) -> None:
+        """Constructor
+
+        Args:
+            output: The location where durations should be written.
+        """
+        self.output = output
+        self.durations: Dict[str, float] = {}
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport) -> None:
+        """Accumulate the duration of each test phase (setup, call and teardown)."""
+        self.durations[report.nodeid] = (
+            self.durations.get(report.nodeid, 0.0) + report.duration
+        )
+
+    def pytest_sessionfinish(self) -> None:
+        """Write the recorded durations."""
+        if not self.durations:
+            return
+
+        self.output.write_text(
+            json.dumps(
+                {
+                    nodeid: round(duration, 6)
+                    for nodeid, duration in self.durations.items()
+                },
+                indent=2,
+                sort_keys=True,
+            )
+            + "\n",
+            encoding="utf-8",
+        )
+
+
+class PhaseTracer:
+    """Records the phases of a pytest process and each of its tests as trace spans."""
+
+    def __init__(
+        self, tracer: Any, trace_dir: Path, start: int, output: Optional[Path]
+    ) -> None:
+        """Constructor
+
+        Args:
+            tracer: The `phase_trace.Tracer` of the process.
+            trace_dir: The directory to write the spans of the process to.
+            start: The time, in microseconds, the process was launched at.
+            output: The trace file to merge the spans of all processes into, if
+                this is the controlling process.
+        """
+        self.tracer = tracer
+        self.trace_dir = trace_dir
+        self.start = start
+        self.output = output
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "pytest", **args: Any) -> Iterator[None]:
+        """Record a span around a hook."""
+        with self.tracer.span(name, category, args or None):
+            yield
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_sessionstart(self) -> None:
+        """Record the startup of pytest, including the interpreter, plugins and conftests."""
+        self.tracer.add(
+            phase_trace.Span("startup", "pytest", self.start, phase_trace.now())
+        )
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_collection(self) -> Iterator[None]:
+        """Record collection."""
+        with self.span("collection"):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtestloop(self) -> Iterator[None]:
+        """Record the test loop, which is the run of all workers in pytest-xdist controllers."""
+        with self.span("runtestloop"):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item: pytest.Item) -> Iterator[None]:
+        """Record each test."""
+        with self.span(item.nodeid, "test"):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_setup(self) -> Iterator[None]:
+        """Record the setup of each test."""
+        with self.span("setup", "test"):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self) -> Iterator[None]:
+        """Record the call of each test."""
+        with self.span("call", "test"):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_teardown(self) -> Iterator[None]:
+        """Record the teardown of each test."""
+        with self.span("teardown", "test"):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_sessionfinish(self) -> Iterator[None]:
+        """Record the end of the session, such as reporting and combining coverage."""
+        with self.span("sessionfinish"):
+            yield
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_unconfigure(self) -> None:
+        """Write the spans of the process.
+
+        The controlling process finishes after any pytest-xdist workers so it
+        merges the spans of all processes.
+        """
+        self.tracer.write(self.trace_dir)
+        if self.output:
+            phase_trace.merge(self.trace_dir, self.output)
+
+
+def create_phase_tracer(
+    config: pytest.Config, trace_dir: Path, output_dir: Path
+) -> PhaseTracer:
+    """Create the phase tracer of a pytest process.
+
+    Args:
+        config: The pytest config.
+        trace_dir: The directory shared by the processes of the test.
+        output_dir: The `TEST_UNDECLARED_OUTPUTS_DIR` of the test.
+
+    Returns:
+        A pytest plugin recording the phases of the process.
+    """
+    tracer = phase_trace.Tracer(process_name(config))
+    if is_xdist_worker(config):
+        return PhaseTracer(tracer, trace_dir, _IMPORT_TIME, None)
+
+    # pytest-xdist workers inherit the environment of the controller but are
+    # not launched by the process wrapper.
+    start = int(os.environ.pop(phase_trace.LAUNCH_TIME_ENV, _IMPORT_TIME))
+    return PhaseTracer(tracer, trace_dir, start, output_dir / phase_trace.TRACE_OUTPUT)
+
+
+@dataclasses.dataclass
+class ProfileWriter:
+    """Writes the profile of a pytest process once it's finished.
+
+    Attributes:
+        process_profiler: The profiler of the process.
+        output_dir: The directory to write the profile to.
+        name: The name of the process.
+    """
+
+    process_profiler: profiler.Profiler
+    output_dir: Path
+    name: str
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_unconfigure(self) -> None:
+        """Stop profiling and write the profile."""
+        self.process_profiler.disable()
+        self.process_profiler.write(self.output_dir, self.name)
+
+
+class MemoryRecorder:
+    """Records the peak memory use of each test and process and enforces the budget of the test.
+
+    Tests run concurrently in pytest-xdist workers so the peak of the test as
+    a whole is taken to be the sum of the peaks of its processes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        trace_allocations: bool,
+        max_memory_mb: Optional[int],
+        output: Optional[Path],
+    ) -> None:
+        """Constructor
+
+        Args:
+            name: The name of the process.
+            trace_allocations: Whether to record the top allocations of each test.
+            max_memory_mb: The memory budget of the test in megabytes.
+            output: The location to write the memory report to, if this is
+                the controlling process.
+        """
+        self.name = name
+        self.trace_allocations = trace_allocations
+        self.max_memory_mb = max_memory_mb
+        self.output = output
+        self.process_peak = memory.peak_rss() or 0
+        self.peaks: Dict[str, int] = {}
+        self.tests: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def peak(self) -> int:
+        """The peak RSS of the test in bytes."""
+        return sum(self.peaks.values())
+
+    @property
+    def exceeded(self) -> bool:
+        """Whether the peak RSS of the test exceeded its budget."""
+        if not self.max_memory_mb:
+            return False
+        return self.peak > self.max_memory_mb * 1024 * 1024
+
+    def update_process_peak(self) -> None:
+        """Account for the current peak RSS in the peak of the process."""
+        self.process_peak = max(self.process_peak, memory.peak_rss() or 0)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self) -> Iterator[None]:
+        """Start measuring the memory of a test."""
+        self.update_process_peak()
+        memory.reset_peak_rss()
+        if self.trace_allocations:
+            tracemalloc.clear_traces()
+        yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(
+        self, item: pytest.Item, call: pytest.CallInfo[None]
+    ) -> Iterator[None]:
+        """Attach the memory use of a test to its teardown report.
+
+        Reports are sent from pytest-xdist workers to the controlling process
+        with any attributes which can be serialized as json.
+        """
+        outcome: Any = yield
+        if call.when == "call" and self.trace_allocations:
+            item.stash[_ALLOCATIONS_KEY] = memory.top_allocations(
+                tracemalloc.take_snapshot()
+            )
+        if call.when != "teardown":
+            return
+
+        peak = memory.peak_rss()
+        if peak is None:
+            return
+        self.process_peak = max(self.process_peak, peak)
+
+        usage: Dict[str, Any] = {"peak_rss_mb": memory.megabytes(peak)}
+        if _ALLOCATIONS_KEY in item.stash:
+            usage["top_allocations"] = item.stash[_ALLOCATIONS_KEY]
+        outcome.get_result().bazel_memory = usage
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport) -> None:
+        """Collect the memory use of each test."""
+        usage = getattr(report, "bazel_memory", None)
+        if usage is not None and report.when == "teardown":
+            self.tests[report.nodeid] = usage
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node: Any) -> None:
+        """Collect the peak RSS of each pytest-xdist worker."""
+        peak = getattr(node, "workeroutput", {}).get(PEAK_RSS_WORKER_OUTPUT)
+        if peak is not None:
+            self.peaks[f"pytest-{node.workerinput['workerid']}"] = int(peak)
+
+    def pytest_sessionfinish(self, session: pytest.Session) -> None:
+        """Report the peak RSS of the process and check the budget of the test."""
+        self.update_process_peak()
+        if is_xdist_worker(session.config):
+            getattr(session.config, "workeroutput")[
+                PEAK_RSS_WORKER_OUTPUT
+            ] = self.process_peak
+            return
+
+        self.peaks[self.name] = self.process_peak
+        if self.exceeded:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+        if self.output:
+            self.output.write_text(
+                json.dumps(
+                    {
+                        "max_memory_mb": self.max_memory_mb,
+                        "peak_rss_mb": memory.megabytes(self.peak),
+                        "processes": {
+                            name: memory.megabytes(process_peak)
+                            for name, process_peak in sorted(self.peaks.items())
+                        },
+                        "tests": self.tests,
+                    },
+                    indent=2,
+                )
+                + "\n",
+                encoding="utf-8",
+            )
+
+    def pytest_terminal_summary(self, terminalreporter: Any) -> None:
+        """Summarize the memory use of the test."""
+        message = f"peak RSS {memory.megabytes(self.peak)} MB across {len(self.peaks)} process(es)"
+        if self.max_memory_mb:
+            message += f" of max_memory_mb = {self.max_memory_mb}"
+
+        terminalreporter.write_sep("-", "memory")
+        if self.exceeded:
+            terminalreporter.write_line(f"FAILED: {message}", red=True, bold=True)
+        else:
+            terminalreporter.write_line(message)
+
+
+class TimeoutWatchdog:
+    """Dumps stacks, and records the results so far, shortly before Bazel's test timeout.
+
+    Every pytest process dumps the stacks of its threads at the deadline. The
+    controlling process also writes the results of each test to a partial
+    JUnit XML report as they are reported and, at the deadline, adds an error
+    for each test which is still running.
+    """
+
+    def __init__(
+        self, deadline: float, stream: TextIO, xml_file: Optional[Path] = None
+    ) -> None:
+        """Constructor
+
+        Args:
+            deadline: The deadline in seconds since the epoch.
+            stream: The stream to write stacks to.
+            xml_file: The location of the JUnit XML report of the session, if
+                this is the controlling process.
+        """
+        self.deadline = deadline
+        self.stream = stream
+        self.report = watchdog.PartialJunitXml(xml_file) if xml_file else None
+        self.running: Dict[str, List[pytest.TestReport]] = {}
+        self.lock = threading.Lock()
+        self.timer: Optional[threading.Timer] = None
+        self.rearm = False
+
+    def pytest_sessionstart(self, session: pytest.Session) -> None:
+        """Arm the watchdog."""
+        # pytest's `faulthandler_timeout` replaces the watchdog for each test.
+        self.rearm = float(session.config.getini("faulthandler_timeout") or 0) > 0
+        watchdog.arm(self.deadline, self.stream)
+
+        if self.report:
+            self.timer = threading.Timer(
+                max(self.deadline - time.time(), 0.0), self.expire
+            )
+            self.timer.daemon = True
+            self.timer.start()
+
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_runtest_protocol(self) -> Iterator[None]:
+        """Re-arm the watchdog after each test if pytest's `faulthandler_timeout` is used."""
+        yield
+        if self.rearm:
+            watchdog.arm(self.deadline, self.stream)
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_exception_interact(self) -> None:
+        """Re-arm the watchdog, which pytest cancels when a test fails."""
+        watchdog.arm(self.deadline, self.stream)
+
+    def pytest_runtest_logstart(self, nodeid: str) -> None:
+        """Track the tests which are running."""
+        if self.report:
+            with self.lock:
+                self.running[nodeid] = []
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport) -> None:
+        """Collect the reports of each phase of running tests."""
+        if self.report:
+            with self.lock:
+                self.running.setdefault(report.nodeid, []).append(report)
+
+    def pytest_runtest_logfinish(self, nodeid: str) -> None:
+        """Write the result of each completed test to the partial report."""
+        if self.report:
+            with self.lock:
+                reports = self.running.pop(nodeid, [])
+                if not self.report.closed:
+                    self.report.add(junit.junit_testcase(nodeid, reports))
+
+    def expire(self) -> None:
+        """Record the tests which are still running at the deadline."""
+        assert self.report is not None
+        with self.lock:
+            if self.report.closed:
+                return
+            for nodeid, reports in self.running.items():
+                testcase = junit.junit_testcase(nodeid, reports)
+                ElementTree.SubElement(
+                    testcase,
+                    "error",
+                    {"message": "still running shortly before TEST_TIMEOUT"},
+                ).text = "See the test log for the stacks of all threads."
+                self.report.add(testcase)
+            self.report.close()
+
+            self.stream.write(
+                "\nTests still running shortly before TEST_TIMEOUT:\n"
+                + "".join(f"  {nodeid}\n" for nodeid in self.running)
+            )
+            self.stream.flush()
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_sessionfinish(self) -> None:
+        """Disarm the watchdog before pytest writes its own report."""
+        watchdog.disarm()
+        if self.timer:
+            self.timer.cancel()
+        if self.report:
+            with self.lock:
+                self.report.close()
+
+    def pytest_unconfigure(self) -> None:
+        """Close the stream of the watchdog."""
+        self.stream.close()
+
+
+def create_timeout_watchdog(config: pytest.Config, deadline: float) -> TimeoutWatchdog:
+    """Create the timeout watchdog of a pytest process.
+
+    Args:
+        config: The pytest config.
+        deadline: The deadline in seconds since the epoch.
+
+    Returns:
+        A pytest plugin dumping the stacks of the process at the deadline.
+    """
+    # Stacks are written to a copy of stderr as pytest captures the original
+    # while tests run. Capturing is suspended while pytest is configured.
+    stream = os.fdopen(os.dup(2), "w", encoding="utf-8")
+
+    # Only the controlling process writes a JUnit XML report.
+    xml_file = getattr(config.option, "xmlpath", None)
+    if not xml_file or is_xdist_worker(config):
+        return TimeoutWatchdog(deadline, stream)
+    return TimeoutWatchdog(deadline, stream, Path(xml_file))
+
+
+@dataclasses.dataclass
+class CoverageCombiner:
+    """Combines the coverage data of pytest-xdist workers in parallel.
+
+    Attributes:
+        data_file: The coverage data file (`COVERAGE_FILE`) of the run.
+        max_workers: The maximum number of processes to use.
+    """
+
+    data_file: Path
+    max_workers: int
+
+    # pytest-cov combines data files after the test loop completes so this
+    # runs first to leave it a single file to combine.
+    @pytest.hookimpl(hookwrapper=True, trylast=True)
+    def pytest_runtestloop(self) -> Iterator[None]:
+        """Combine the data files of all workers once the tests have run."""
+        yield
+
+        data_files = sorted(
+            path
+            for path in self.data_file.parent.glob(f"{self.data_file.name}.*")
+            if path.is_file()
+        )
+        if len(data_files) < 2:
+            return
+
+        # pylint: disable-next=import-outside-toplevel
+        from python.pytest.private import coverage_parallel
+
+        coverage_parallel.combine_data_files(
+            data_files,
+            self.data_file.with_name(f"{self.data_file.name}.xdist"),
+            self.max_workers,
+        )
+
+
+class PartitionCollection:
+    """Has each pytest-xdist worker collect, and run, its own partition of the inventory.
+
+    Partitions are assigned in the order pytest-xdist configures its workers.
+    A worker which replaces one that crashed is configured once the crashed
+    worker is down, so it's assigned the same partition. Workers which finish
+    their partition keep it, so it's never assigned again.
+
+    The pending tests of a crashed worker are handed to its replacement by
+    reordering the private `_removed2pending` of pytest-xdist's `EachScheduling`,
+    so this is only used with the major version of pytest-xdist it was verified
+    against. See `supported`.
+    """
+
+    def __init__(self) -> None:
+        """Constructor"""
+        self.partitions: Dict[str, int] = {}
+        self.session: Optional[pytest.Session] = None
+
+    @staticmethod
+    def supported() -> bool:
+        """Determine whether the installed pytest-xdist is `PARTITION_XDIST_VERSION`."""
+        # pylint: disable-next=import-outside-toplevel
+        import xdist  # type: ignore[import-untyped]
+
+        return int(xdist.__version__.split(".")[0]) == PARTITION_XDIST_VERSION
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_configure_node(self, node: Any) -> None:
+        """Assign the lowest free partition to a worker."""
+        assigned = set(self.partitions.values())
+        index = next(index for index in itertools.count() if index not in assigned)
+        self.partitions[node.workerinput["workerid"]] = index
+        node.workerinput[PARTITION_WORKER_INPUT] = [
+            node.workerinput["workercount"],
+            index,
+        ]
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node: Any, error: Optional[Any]) -> None:
+        """Free the partition of a worker which crashed."""
+        if error is not None:
+            self.partitions.pop(node.workerinput["workerid"], None)
+
+    def pytest_sessionstart(self, session: pytest.Session) -> None:
+        """Keep the session to count the tests of all partitions."""
+        self.session = session
+
+    @pytest.hookimpl(tryfirst=True, optionalhook=True)
+    def pytest_xdist_make_scheduler(self, config: pytest.Config, log: Any) -> Any:
+        """Run the tests collected by each worker on that worker.
+
+        Workers collect different partitions of the inventory, so tests can't
+        be load balanced between them as pytest-xdist does for identical
+        collections. Partitions are balanced by recorded timings instead.
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from xdist.scheduler import EachScheduling  # type: ignore[import-untyped]
+
+        session = self.session
+
+        # Tests are never moved between workers, as with `EachScheduling`.
+        # pylint: disable-next=abstract-method
+        class PartitionScheduling(EachScheduling):  # type: ignore[misc]
+            """Each scheduling which matches replacement workers by partition."""
+
+            _removed2pending: Dict[Any, List[int]]
+
+            def add_node_collection(self, node: Any, collection: Sequence[str]) -> None:
+                """Add the collection of a worker, counting the tests of all partitions.
+
+                `EachScheduling` replaces the first crashed worker with the
+                same gateway spec, which all workers share, so the crashed
+                worker of the same partition is moved first.
+                """
+                partition = node.workerinput[PARTITION_WORKER_INPUT]
+                removed = self._removed2pending
+                self._removed2pending = {
+                    deadnode: pending
+                    for deadnode, pending in removed.items()
+                    if deadnode.workerinput[PARTITION_WORKER_INPUT] == partition
+                }
+                self._removed2pending.update(removed)
+                super().add_node_collection(node, collection)
+                if session is not None:
+                    session.testscollected = sum(
+                        len(tests) for tests in self.node2collection.values()
+                    )
+
+        return PartitionScheduling(config, log)
@@ -0,0 +1,154 @@
+"""Profilers for the pytest processes of `py_pytest_test`.
+
+Each pytest process, including pytest-xdist workers, profiles itself from when
+`pytest_bazel_plugin` is imported until pytest is unconfigured. Deterministic
+profiles of `cProfile` are written as `pstats` files. The sampling profiler
+periodically records the stack of every thread and writes them as collapsed
+stacks, the input format of flame graph tools such as `flamegraph.pl` or
+[speedscope](https://www.speedscope.app).
+"""
+
+import collections
+import cProfile
+import os
+import sys
+import threading
+import types
+from pathlib import Path
+from typing import Counter, List, Optional
+
+PROFILE_ENV = "PY_PYTEST_PROFILE"
+"""The environment variable containing the profiler to run pytest processes with."""
+
+PROFILE_OUTPUT = "pytest_profile"
+"""The name of the directory of profiles written to `TEST_UNDECLARED_OUTPUTS_DIR`."""
+
+PROFILERS = ("cprofile", "sampling")
+"""The supported profilers."""
+
+SAMPLING_INTERVAL = 0.005
+"""The interval, in seconds, between the samples of the sampling profiler."""
+
+
+def frame_name(code: types.CodeType, root: str) -> str:
+    """The name of a frame within a collapsed stack.
+
+    Args:
+        code: The code object of the frame.
+        root: A directory which files are displayed relative to.
+
+    Returns:
+        The function and location of the frame.
+    """
+    filename = code.co_filename
+    if filename.startswith(root):
+        filename = filename[len(root) :].lstrip(os.sep)
+
+    # Frames are separated by `;`.
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """A statistical profiler recording the stacks of all threads from a background thread.
+
+    Sampling adds little overhead to the profiled code, which keeps the relative
+    cost of short functions accurate, at the expense of missing some calls.
+    """
+
+    def __init__(self, interval: float = SAMPLING_INTERVAL) -> None:
+        """Constructor
+
+        Args:
+            interval: The interval, in seconds, between samples.
+        """
+        self.interval = interval
+        self.root = os.getcwd()
+        self.stacks: Counter[str] = collections.Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def enable(self) -> None:
+        """Start sampling."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="pytest-sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def disable(self) -> None:
+        """Stop sampling."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Sample until stopped."""
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        """Record the current stack of every other thread."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        current = threading.get_ident()
+        # pylint: disable-next=protected-access
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == current:
+                continue
+
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(frame_name(frame.f_code, self.root))
+                frame = frame.f_back  # type: ignore[assignment]
+            stack.append(names.get(thread_id, str(thread_id)))
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def dump_stats(self, path: Path) -> None:
+        """Write the recorded samples as collapsed stacks."""
+        with path.open("w", encoding="utf-8") as fhd:
+            for stack, count in self.stacks.most_common():
+                fhd.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """A profiler of a pytest process."""
+
+    def __init__(self, kind: str) -> None:
+        """Constructor
+
+        Args:
+            kind: One of `PROFILERS`.
+        """
+        if kind not in PROFILERS:
+            raise ValueError(f"Unknown profiler `{kind}`, expected one of {PROFILERS}")
+
+        self.kind = kind
+        self.profile = cProfile.Profile() if kind == "cprofile" else SamplingProfiler()
+
+    @property
+    def suffix(self) -> str:
+        """The file extension of profiles."""
+        return ".pstats" if self.kind == "cprofile" else ".collapsed"
+
+    def enable(self) -> None:
+        """Start profiling."""
+        self.profile.enable()
+
+    def disable(self) -> None:
+        """Stop profiling."""
+        self.profile.disable()
+
+    def write(self, output_dir: Path, name: str) -> Path:
+        """Write the profile of the process.
+
+        Args:
+            output_dir: The directory to write the profile to.
+            name: The name of the process.
+
+        Returns:
+            The profile written.
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        path = output_dir / f"{name}{self.suffix}"
+        self.profile.dump_stats(path)
+        return path
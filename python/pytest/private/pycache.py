@@ -0,0 +1,108 @@
+"""Precompiled bytecode for the runfiles of `py_pytest_test`.
+
+Bytecode precompiled by `precompiler` at build time is linked into a pycache
+prefix (`PYTHONPYCACHEPREFIX`) of the test, where the interpreter and pytest
+look it up by the paths of the sources in the runfiles.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+INTERPRETER_FILE = "interpreter.json"
+"""The file describing the interpreter which precompiled a directory of bytecode (see `precompiler`)."""
+
+
+def link_trees(trees: Sequence[Path], dest: Path) -> None:
+    """Merge directory trees into one using symlinks.
+
+    Entries unique to one tree are linked directly so that only directories
+    shared by several trees are created.
+
+    Args:
+        trees: The directories to merge. Files in earlier trees take precedence.
+        dest: The directory to create.
+    """
+    dest.mkdir(parents=True, exist_ok=True)
+
+    entries: Dict[str, List[Path]] = {}
+    for tree in trees:
+        for entry in tree.iterdir():
+            entries.setdefault(entry.name, []).append(entry)
+
+    for name, paths in entries.items():
+        dirs = [path for path in paths if path.is_dir()]
+        if len(dirs) > 1:
+            link_trees(dirs, dest / name)
+        else:
+            (dest / name).symlink_to(dirs[0] if dirs else paths[0])
+
+
+def precompiled_interpreter(tree: Path) -> Optional[Dict[str, str]]:
+    """The interpreter which precompiled a directory of bytecode, as written by `precompiler`."""
+    try:
+        content = json.loads((tree / INTERPRETER_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return content if isinstance(content, dict) else None
+
+
+def link_pycache(
+    trees: Sequence[Path], runfiles_dir: Path, pycache_prefix: Path
+) -> bool:
+    """Populate a pycache prefix with bytecode precompiled for the test's runfiles.
+
+    The interpreter, and pytest, look up the bytecode of a source within a
+    pycache prefix at the absolute path of the source's directory. Bytecode is
+    only used if it was precompiled by an interpreter with the same cache tag
+    and magic number as the current one.
+
+    Args:
+        trees: Directories of bytecode mirroring the runfiles.
+        runfiles_dir: The runfiles directory of the test.
+        pycache_prefix: The pycache prefix (`PYTHONPYCACHEPREFIX`) to populate.
+
+    Returns:
+        Whether or not the pycache prefix was populated.
+    """
+    expected = {
+        "cache_tag": str(sys.implementation.cache_tag),
+        "magic_number": importlib.util.MAGIC_NUMBER.hex(),
+    }
+    for tree in trees:
+        actual = precompiled_interpreter(tree)
+        if actual != expected:
+            print(
+                f"Ignoring bytecode precompiled for {actual} as the test runs with "
+                f"{expected}: {tree}",
+                file=sys.stderr,
+            )
+            return False
+
+    runfiles_dir = Path(os.path.abspath(runfiles_dir))
+    link_trees(trees, pycache_prefix / runfiles_dir.relative_to(runfiles_dir.anchor))
+    return True
+
+
+def environment(trees: Sequence[Path], pycache_prefix: Path) -> Dict[str, str]:
+    """Provide precompiled bytecode to the test.
+
+    Bytecode is looked up by the path of sources so it can only be provided
+    for a runfiles directory.
+
+    Args:
+        trees: Directories of bytecode mirroring the runfiles.
+        pycache_prefix: The pycache prefix to populate.
+
+    Returns:
+        The environment variables of pytest using the bytecode, if any.
+    """
+    runfiles_dir = os.getenv("RUNFILES_DIR")
+    if not runfiles_dir or not os.path.isdir(runfiles_dir):
+        return {}
+    if not link_pycache(trees, Path(runfiles_dir), pycache_prefix):
+        return {}
+    return {"PYTHONPYCACHEPREFIX": str(pycache_prefix)}
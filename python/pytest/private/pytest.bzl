@@ -66,13 +66,309 @@ def _rlocationpath(file, workspace_name):
 
     return "{}/{}".format(workspace_name, file.short_path)
 
+def _coverage_source_map(file):
+    # Generated files are not expected to be sources tests collect coverage for.
+    if not file.is_source or file.extension != "py":
+        return None
+
+    return file.path
+
+def _generate_coverage_config(ctx, instrumented_files_info):
+    """Generate the coverage.py config and source list for a test.
+
+    Args:
+        ctx (ctx): The rule's context object.
+        instrumented_files_info (InstrumentedFilesInfo): The instrumented files of the test.
+
+    Returns:
+        Tuple[File, File]: The generated coverage config and the list of sources it includes.
+    """
+    sources_args = ctx.actions.args()
+    sources_args.set_param_file_format("multiline")
+    sources_args.add_all(
+        instrumented_files_info.instrumented_files,
+        map_each = _coverage_source_map,
+    )
+
+    coverage_sources = ctx.actions.declare_file("{}.coverage_sources.txt".format(ctx.label.name))
+    ctx.actions.write(
+        output = coverage_sources,
+        content = sources_args,
+    )
+
+    coverage_config = ctx.actions.declare_file("{}.coveragerc".format(ctx.label.name))
+
+    args = ctx.actions.args()
+    args.add("--coverage-rc", ctx.file.coverage_rc)
+    args.add("--sources", coverage_sources)
+    args.add("--output", coverage_config)
+
+    coverage_mode = ctx.attr.coverage_mode or ctx.attr._coverage_mode[BuildSettingInfo].value
+    if coverage_mode:
+        args.add("--mode", coverage_mode)
+
+    ctx.actions.run(
+        mnemonic = "PytestCoverageConfig",
+        progress_message = "PytestCoverageConfig %{label}",
+        executable = ctx.executable._coverage_config_generator,
+        arguments = [args],
+        inputs = [ctx.file.coverage_rc, coverage_sources],
+        outputs = [coverage_config],
+    )
+
+    return coverage_config, coverage_sources
+
+def _is_entry_points(file):
+    return file.basename == "entry_points.txt" and file.dirname.endswith(".dist-info")
+
+def _entry_points_map(file):
+    if not _is_entry_points(file):
+        return None
+    return file.path
+
+def _generate_plugin_list(ctx):
+    """Generate the list of pytest plugins declared by the dependencies of a test.
+
+    Args:
+        ctx (ctx): The rule's context object.
+
+    Returns:
+        File: The generated plugin list.
+    """
+    dep_runfiles = depset(transitive = [
+        dep[DefaultInfo].default_runfiles.files
+        for dep in [ctx.attr._runner] + ctx.attr.deps
+    ])
+
+    entry_points_args = ctx.actions.args()
+    entry_points_args.set_param_file_format("multiline")
+    entry_points_args.add_all(dep_runfiles, map_each = _entry_points_map)
+
+    entry_points = ctx.actions.declare_file("{}.pytest_entry_points.txt".format(ctx.label.name))
+    ctx.actions.write(
+        output = entry_points,
+        content = entry_points_args,
+    )
+
+    plugin_list = ctx.actions.declare_file("{}.pytest_plugins.txt".format(ctx.label.name))
+
+    args = ctx.actions.args()
+    args.add("--entry-points", entry_points)
+    args.add("--output", plugin_list)
+
+    ctx.actions.run(
+        mnemonic = "PytestPluginList",
+        progress_message = "PytestPluginList %{label}",
+        executable = ctx.executable._plugin_list_generator,
+        arguments = [args],
+        inputs = depset([entry_points], transitive = [dep_runfiles]),
+        outputs = [plugin_list],
+    )
+
+    return plugin_list
+
+def _collect_inventory(ctx):
+    """Collect the tests of a target at build time.
+
+    Args:
+        ctx (ctx): The rule's context object.
+
+    Returns:
+        File: The test inventory.
+    """
+    workspace_name = ctx.workspace_name
+
+    def _runfiles_map(file):
+        return "{}\t{}".format(file.path, _rlocationpath(file, workspace_name))
+
+    def _src_map(file):
+        if not _is_pytest_test(file):
+            return None
+        return _rlocationpath(file, workspace_name)
+
+    deps = [ctx.attr._runner] + ctx.attr.deps
+    runfiles = depset(
+        ctx.files.srcs + ctx.files.data + [ctx.file.config],
+        transitive = [
+            target[DefaultInfo].default_runfiles.files
+            for target in deps + ctx.attr.data
+        ],
+    )
+    imports = depset(transitive = [
+        dep[PyInfo].imports
+        for dep in deps
+        if PyInfo in dep
+    ])
+
+    runfiles_args = ctx.actions.args()
+    runfiles_args.set_param_file_format("multiline")
+    runfiles_args.add_all(runfiles, map_each = _runfiles_map, allow_closure = True)
+
+    runfiles_file = ctx.actions.declare_file("{}.pytest_inventory_runfiles.txt".format(ctx.label.name))
+    ctx.actions.write(
+        output = runfiles_file,
+        content = runfiles_args,
+    )
+
+    imports_args = ctx.actions.args()
+    imports_args.set_param_file_format("multiline")
+    imports_args.add_all(imports)
+
+    imports_file = ctx.actions.declare_file("{}.pytest_inventory_imports.txt".format(ctx.label.name))
+    ctx.actions.write(
+        output = imports_file,
+        content = imports_args,
+    )
+
+    inventory = ctx.actions.declare_file("{}.pytest_inventory.json".format(ctx.label.name))
+
+    args = ctx.actions.args()
+    args.add("--runfiles", runfiles_file)
+    args.add("--imports", imports_file)
+    args.add("--workspace-name", workspace_name)
+    args.add("--pytest-config", _rlocationpath(ctx.file.config, workspace_name))
+    args.add_all(
+        ctx.files.srcs,
+        map_each = _src_map,
+        format_each = "--src=%s",
+        allow_closure = True,
+    )
+    args.add("--output", inventory)
+
+    ctx.actions.run(
+        mnemonic = "PytestCollect",
+        progress_message = "PytestCollect %{label}",
+        executable = ctx.executable._inventory_generator,
+        arguments = [args],
+        inputs = depset([runfiles_file, imports_file], transitive = [runfiles]),
+        outputs = [inventory],
+    )
+
+    return inventory
+
+def _precompile(ctx):
+    """Precompile the Python sources of a test to bytecode.
+
+    Dependencies are compiled separately from test sources and conftests, which
+    have their assertions rewritten, so that changes to tests do not require
+    dependencies to be compiled again.
+
+    Args:
+        ctx (ctx): The rule's context object.
+
+    Returns:
+        List[File]: Directories of bytecode mirroring the runfiles of the test.
+    """
+    workspace_name = ctx.workspace_name
+
+    def _source_map(file):
+        if file.extension != "py" or file.basename == "conftest.py":
+            return None
+        return "{}\t{}".format(file.path, _rlocationpath(file, workspace_name))
+
+    def _rewrite_map(file):
+        if file.extension != "py":
+            return None
+        return "{}\t{}".format(file.path, _rlocationpath(file, workspace_name))
+
+    def _conftest_map(file):
+        if file.basename != "conftest.py":
+            return None
+        return _rewrite_map(file)
+
+    dep_sources = depset(transitive = [
+        dep[PyInfo].transitive_sources
+        for dep in [ctx.attr._runner] + ctx.attr.deps
+        if PyInfo in dep
+    ])
+
+    deps_args = ctx.actions.args()
+    deps_args.set_param_file_format("multiline")
+    deps_args.add_all(dep_sources, map_each = _source_map, allow_closure = True)
+
+    srcs_args = ctx.actions.args()
+    srcs_args.set_param_file_format("multiline")
+    srcs_args.add_all(ctx.files.srcs, map_each = _rewrite_map, allow_closure = True)
+    srcs_args.add_all(dep_sources, map_each = _conftest_map, allow_closure = True)
+    srcs_args.add_all(ctx.files.data, map_each = _conftest_map, allow_closure = True)
+
+    srcs_inputs = depset(ctx.files.srcs + ctx.files.data, transitive = [dep_sources])
+
+    outputs = []
+    for kind, sources_args, inputs in [
+        ("deps", deps_args, dep_sources),
+        ("srcs", srcs_args, srcs_inputs),
+    ]:
+        sources = ctx.actions.declare_file("{}.{}_pycache.txt".format(ctx.label.name, kind))
+        ctx.actions.write(
+            output = sources,
+            content = sources_args,
+        )
+
+        output = ctx.actions.declare_directory("{}.{}_pycache".format(ctx.label.name, kind))
+
+        args = ctx.actions.args()
+        args.add("--sources", sources)
+        args.add(output, format = "--output=%s")
+        if kind == "srcs":
+            args.add("--rewrite")
+
+        ctx.actions.run(
+            mnemonic = "PytestPrecompile",
+            progress_message = "PytestPrecompile %{label} (" + kind + ")",
+            executable = ctx.executable._precompiler,
+            arguments = [args],
+            inputs = depset([sources], transitive = [inputs]),
+            outputs = [output],
+        )
+        outputs.append(output)
+
+    return outputs
+
 def _py_pytest_test_impl(ctx):
+    instrumented_files_info = coverage_common.instrumented_files_info(
+        ctx,
+        source_attributes = ["srcs"],
+        dependency_attributes = ["deps", "data"],
+        extensions = ["py"],
+    )
+
     # Gather args for the runner
     runner_args = ctx.actions.args()
     runner_args.set_param_file_format("multiline")
-    runner_args.add("--cov-config={}".format(_rlocationpath(ctx.file.coverage_rc, ctx.workspace_name)))
+
+    coverage_files = []
+    if ctx.configuration.coverage_enabled:
+        coverage_config, coverage_sources = _generate_coverage_config(ctx, instrumented_files_info)
+        coverage_files.extend([coverage_config, coverage_sources])
+        runner_args.add("--cov-config={}".format(_rlocationpath(coverage_config, ctx.workspace_name)))
+        runner_args.add("--coverage-sources={}".format(_rlocationpath(coverage_sources, ctx.workspace_name)))
+
+        coverage_core = ctx.attr.coverage_core or ctx.attr._coverage_core[BuildSettingInfo].value
+        if coverage_core:
+            runner_args.add("--coverage-core={}".format(coverage_core))
+
     runner_args.add("--pytest-config={}".format(_rlocationpath(ctx.file.config, ctx.workspace_name)))
 
+    generated_files = []
+    if ctx.attr._collect_inventory[BuildSettingInfo].value:
+        inventory = _collect_inventory(ctx)
+        generated_files.append(inventory)
+        runner_args.add("--inventory={}".format(_rlocationpath(inventory, ctx.workspace_name)))
+        if ctx.attr._partition_collection[BuildSettingInfo].value:
+            runner_args.add("--partition-collection")
+
+    if ctx.attr._explicit_plugins[BuildSettingInfo].value:
+        plugin_list = _generate_plugin_list(ctx)
+        generated_files.append(plugin_list)
+        runner_args.add("--plugins={}".format(_rlocationpath(plugin_list, ctx.workspace_name)))
+
+    pycache = []
+    if ctx.attr._precompile[BuildSettingInfo].value:
+        pycache = _precompile(ctx)
+        for directory in pycache:
+            runner_args.add("--pycache={}".format(_rlocationpath(directory, ctx.workspace_name)))
+
     workspace_name = ctx.workspace_name
 
     def _src_map(file):
@@ -89,13 +385,47 @@ def _py_pytest_test_impl(ctx):
         allow_closure = True,
     )
 
+    if ctx.file.timings:
+        runner_args.add("--timings={}".format(_rlocationpath(ctx.file.timings, ctx.workspace_name)))
+
+    if ctx.attr._record_timings[BuildSettingInfo].value:
+        runner_args.add("--record-timings")
+
+    if ctx.attr._in_process[BuildSettingInfo].value:
+        runner_args.add("--in-process")
+
+    if ctx.attr._phase_trace[BuildSettingInfo].value:
+        runner_args.add("--phase-trace")
+
+    if ctx.attr._import_time[BuildSettingInfo].value:
+        runner_args.add("--import-time")
+
+    profile = ctx.attr._profile[BuildSettingInfo].value
+    if profile:
+        runner_args.add("--profile={}".format(profile))
+
+    memory_profile = ctx.attr._memory_profile[BuildSettingInfo].value
+    if memory_profile:
+        runner_args.add("--memory-profile={}".format(memory_profile))
+
     exec_requirements = {}
 
+    # Reserve the memory budget of the test from the local resources of Bazel.
+    if ctx.attr.max_memory_mb > 0:
+        max_memory_mb = ctx.attr.max_memory_mb
+        runner_args.add("--max-memory-mb={}".format(max_memory_mb))
+        exec_requirements["resources:memory:{}".format(max_memory_mb)] = str(max_memory_mb)
+
+    if ctx.attr._persistent_worker[BuildSettingInfo].value:
+        runner_args.add("--persistent-worker")
+        exec_requirements["local"] = "1"
+
     # Optionally enable multi-threading
     if ctx.attr.numprocesses > 0:
         numprocesses = ctx.attr.numprocesses
         runner_args.add("--numprocesses={}".format(numprocesses))
         exec_requirements["resources:cpu:{}".format(numprocesses)] = str(numprocesses)
+        runner_args.add_all(ctx.attr.preload_modules, format_each = "--preload-module=%s")
 
     # Separate runner args from other inputs
     runner_args.add("--")
@@ -135,8 +465,7 @@ def _py_pytest_test_impl(ctx):
     direct_runfiles = ctx.runfiles(files = [
         args_file,
         ctx.file.config,
-        ctx.file.coverage_rc,
-    ] + ctx.files.srcs + ctx.files.data).merge_all([
+    ] + coverage_files + generated_files + pycache + ctx.files.srcs + ctx.files.data + ctx.files.timings).merge_all([
         dep_info.runfiles,
     ] + [
         target[DefaultInfo].default_runfiles
@@ -168,12 +497,7 @@ def _py_pytest_test_impl(ctx):
             env_inherit = ctx.attr.env_inherit,
             targets = ctx.attr.data,
         ),
-        coverage_common.instrumented_files_info(
-            ctx,
-            source_attributes = ["srcs"],
-            dependency_attributes = ["deps", "data"],
-            extensions = ["py"],
-        ),
+        instrumented_files_info,
     ]
 
 _COVERAGE_ATTR = {
@@ -206,6 +530,151 @@ build --@rules_pytest//python/pytest:extra_args=--color=yes,-vv
 
 The example above will add `--colors=yes` and `-vv` arguments to the end of the pytest invocation.
 
+By default pytest is run in a new interpreter started by the test's process wrapper. For targets
+where interpreter startup dominates the runtime, pytest can instead be run within the process
+wrapper itself:
+
+```text
+build --@rules_pytest//python/pytest:in_process
+```
+
+Repeated local runs, such as in an edit-test loop, can skip starting and importing pytest by forking
+it from a persistent server which has already done so. The server is shared by every run of a
+target, started by the first and exits after 30 idle minutes, or once any module it imported has
+been modified. Tests are run locally and without sandboxing to reach it, and coverage runs are
+unaffected. Its socket is in a directory within `$XDG_RUNTIME_DIR`, or `/tmp`, which only the
+current user can access. This is only supported on POSIX platforms.
+
+```text
+test --@rules_pytest//python/pytest:persistent_worker
+```
+
+For quick iteration, `bazel run` of a target with `--watch` runs its tests and then keeps the
+interpreter alive. Whenever a first-party source changes, only the test files which import it,
+directly or transitively, are run again. Adding files or changing dependencies requires the target
+to be run again.
+
+```text
+bazel run //my:test -- --watch
+```
+
+Tests spend part of every run compiling sources and rewriting the assertions of test modules.
+This can instead be done once, at build time, with the resulting bytecode cached by Bazel and
+shared by every run until the sources change. Bytecode is compiled by the interpreter of the exec
+configuration and is ignored, with a warning, by tests which run with an interpreter of a different
+version:
+
+```text
+test --@rules_pytest//python/pytest:precompile
+```
+
+pytest loads plugins by scanning the metadata of every installed distribution for entry points,
+which takes longer the more dependencies a test has. The plugins of a test can instead be found
+when it's built and loaded explicitly, with `PYTEST_DISABLE_PLUGIN_AUTOLOAD` set:
+
+```text
+test --@rules_pytest//python/pytest:explicit_plugins
+```
+
+The tests of a target can also be collected when it's built, writing an inventory of their node
+IDs, markers and parametrizations. Errors during collection, such as failing imports, then fail the
+build rather than a scheduled test. The inventory, cached by Bazel until the sources change, is used
+to plan the tests of each shard so that each only collects the files containing its own tests. No
+more pytest-xdist workers are started than there are tests. Collection must not depend on the test
+environment. The inventory only plans which files are collected: there's no cache of collection
+keyed by the digests of the test files, so each pytest process still collects its own files on
+every run.
+
+This is opt-in as tests are collected by a build action, using the interpreter of Bazel's exec
+configuration to import the target's dependencies as built for the target configuration. It's only
+supported where both configurations share a platform and Python version, so not for cross-compiled
+targets nor where the Python toolchain of the target differs from that of the exec platform.
+
+```text
+test --@rules_pytest//python/pytest:collect_inventory
+```
+
+The tests of a shard can also be partitioned between its pytest-xdist workers, balanced by any
+recorded `timings`, with each worker only collecting and running the files of its own partition.
+This trades pytest-xdist's dynamic balancing of tests between workers for less collection. A
+crashed worker's remaining tests are run by its replacement through pytest-xdist's internal
+scheduler state, so this requires pytest-xdist 3.x and is skipped, with a warning, for other
+versions:
+
+```text
+test --@rules_pytest//python/pytest:partition_collection
+```
+
+Tests with `timings` write refreshed durations to `pytest_timings.json` in their undeclared
+outputs on every run. The durations of tests without `timings` can be recorded too, e.g. to seed
+them:
+
+```text
+test --@rules_pytest//python/pytest:record_timings
+```
+
+The overhead of collecting coverage can be reduced by selecting the coverage.py core and
+measurement mode. For example, on Python 3.12 or newer:
+
+```text
+coverage --@rules_pytest//python/pytest:coverage_core=sysmon
+coverage --@rules_pytest//python/pytest:coverage_mode=line
+```
+
+To find where a slow test spends its time, the process wrapper and every pytest process, including
+pytest-xdist workers, can record the timing of their phases: locating runfiles, parsing arguments,
+preparing coverage, pytest startup, collection, each test's setup, call and teardown, and writing
+the coverage report. These are written to `pytest_trace.json` in the undeclared outputs of the test,
+a Chrome trace which can be opened in `chrome://tracing` or [Perfetto](https://ui.perfetto.dev).
+
+```text
+test --@rules_pytest//python/pytest:phase_trace
+```
+
+Each pytest process of a test, including every pytest-xdist worker, can also be profiled, from the
+loading of plugins until pytest exits. Profiles are written to `pytest_profile` in the undeclared
+outputs of the test, which works under remote execution too. `cprofile` writes a
+`pytest.pstats` file, or `pytest-gw0.pstats` and so on for workers, which can be read with
+`python -m pstats` or [snakeviz](https://jiffyclub.github.io/snakeviz/). `sampling` periodically
+records the stack of every thread instead, with less overhead, and writes collapsed stacks
+(`.collapsed` files) for flame graph tools such as [speedscope](https://www.speedscope.app).
+
+```text
+test --@rules_pytest//python/pytest:profile=cprofile
+```
+
+Startup is often dominated by imports. pytest, and each pytest-xdist worker, can be run with
+`python -X importtime` to write `pytest_import_time.txt` to the undeclared outputs of the test. The
+report lists the modules, and top level packages, which took the longest to import across all
+processes, highlighting dependencies to trim or import lazily, followed by the import tree of each
+process sorted by cumulative time. pytest is always run in a subprocess in this mode and
+`preload_modules` are not used.
+
+```text
+test --@rules_pytest//python/pytest:import_time
+```
+
+The peak memory use of each test can be recorded to `pytest_memory.json` in the undeclared outputs
+of the test, along with the peak of each pytest process. On Linux the peak resident set size (RSS)
+is reset before each test so it is that of the test alone; elsewhere it is the peak of its process
+so far. `tracemalloc` additionally records the source lines which allocated the most memory during
+each test, at the cost of slower allocations.
+
+```text
+test --@rules_pytest//python/pytest:memory_profile=tracemalloc
+```
+
+Tests can also be given a memory budget with `max_memory_mb`. The test fails when the sum of the
+peak RSS of its pytest processes exceeds the budget, and the budget is reserved from Bazel's local
+resources (`--local_resources=memory=...`) so that tests running concurrently fit in the memory of
+the host.
+
+Shortly before a test would exceed its `timeout`, every pytest process of the test, including
+pytest-xdist workers, writes the stacks of all of its threads to the test log using `faulthandler`.
+The results of each test are also written to the JUnit XML report (`test.xml`) as they complete,
+and tests which are still running are reported as errors, so that the results gathered so far and
+the tests which hung are known even though Bazel kills the test.
+
 Tips:
 
 - It's common for tests to have some utility code that does not live in a test source file.
@@ -244,6 +713,25 @@ py_pytest_test(
             allow_single_file = True,
             default = Label("//python/pytest:config"),
         ),
+        "coverage_core": attr.string(
+            doc = (
+                "The [coverage.py core](https://coverage.readthedocs.io/en/latest/config.html#run-core) " +
+                "used to measure coverage. `sysmon` has the lowest overhead but requires Python 3.12 or " +
+                "newer and, depending on the version of coverage.py, may fall back to `ctrace` for branch " +
+                "coverage. Overrides `--@rules_pytest//python/pytest:coverage_core` when set."
+            ),
+            values = ["", "ctrace", "pytrace", "sysmon"],
+            default = "",
+        ),
+        "coverage_mode": attr.string(
+            doc = (
+                "Whether to measure `line` or `branch` coverage. Overrides " +
+                "`--@rules_pytest//python/pytest:coverage_mode` when set. If neither is set, the " +
+                "`branch` setting of `coverage_rc` is used."
+            ),
+            values = ["", "branch", "line"],
+            default = "",
+        ),
         "coverage_rc": attr.label(
             doc = "The pytest-cov configuration file to use.",
             allow_single_file = True,
@@ -264,6 +752,15 @@ py_pytest_test(
         "env_inherit": attr.string_list(
             doc = "Specifies additional environment variables to inherit from the external environment when the test is executed by `bazel test`.",
         ),
+        "max_memory_mb": attr.int(
+            doc = (
+                "The peak resident set size, in megabytes, of all pytest processes of the test " +
+                "above which it fails. The budget is also reserved from Bazel's local resources " +
+                "so concurrent tests don't exceed the memory of the host. A value of 0 or less " +
+                "disables the budget."
+            ),
+            default = 0,
+        ),
         "numprocesses": attr.int(
             doc = (
                 "If set the [pytest-xdist](https://pypi.org/project/pytest-xdist/) " +
@@ -272,17 +769,119 @@ py_pytest_test(
             ),
             default = 0,
         ),
+        "preload_modules": attr.string_list(
+            doc = (
+                "Modules imported once by a fork server from which pytest-xdist workers are " +
+                "forked, instead of each worker importing them. Only applies when " +
+                "`numprocesses` is set and on POSIX platforms. Modules whose coverage is " +
+                "measured should not be preloaded as their import is not recorded."
+            ),
+        ),
         "srcs": attr.label_list(
             doc = "An explicit list of source files to test.",
             allow_files = [".py"],
         ),
+        "timings": attr.label(
+            doc = (
+                "A json file mapping test node IDs to durations in seconds. When provided, tests are " +
+                "assigned to shards (`shard_count`) and pytest-xdist workers (`numprocesses`) " +
+                "longest-first to balance their total runtime. With a `collect_inventory` inventory, shards " +
+                "and partitioned workers are instead contiguous runs of the inventory balanced by these " +
+                "durations, trading an even balance for each collecting fewer test files. Refreshed " +
+                "timings are written to `pytest_timings.json` in the test's undeclared outputs on every " +
+                "run of a test with `timings`, or of every test with the `record_timings` flag."
+            ),
+            allow_single_file = [".json"],
+        ),
+        "_collect_inventory": attr.label(
+            doc = (
+                "Whether to collect the tests of the target at build time. The inventory plans " +
+                "which files are collected, collection itself isn't cached by file digests."
+            ),
+            default = Label("//python/pytest:collect_inventory"),
+        ),
+        "_coverage_config_generator": attr.label(
+            doc = "A tool for generating the coverage.py config of a test.",
+            cfg = "exec",
+            executable = True,
+            default = Label("//python/pytest/private:coverage_config_generator"),
+        ),
+        "_coverage_core": attr.label(
+            doc = "The default coverage.py core.",
+            default = Label("//python/pytest:coverage_core"),
+        ),
+        "_coverage_mode": attr.label(
+            doc = "The default coverage measurement mode.",
+            default = Label("//python/pytest:coverage_mode"),
+        ),
         "_extra_args": attr.label(
             doc = "Additional global args to pass to pytest.",
             default = Label("//python/pytest:extra_args"),
         ),
+        "_explicit_plugins": attr.label(
+            doc = "Whether to load the pytest plugins found at build time instead of scanning for them.",
+            default = Label("//python/pytest:explicit_plugins"),
+        ),
+        "_inventory_generator": attr.label(
+            doc = "A tool for collecting the tests of a target at build time.",
+            cfg = "exec",
+            executable = True,
+            default = Label("//python/pytest/private:inventory_generator"),
+        ),
+        "_import_time": attr.label(
+            doc = "Whether to report the import times of pytest processes.",
+            default = Label("//python/pytest:import_time"),
+        ),
+        "_in_process": attr.label(
+            doc = "Whether or not to run pytest within the process wrapper.",
+            default = Label("//python/pytest:in_process"),
+        ),
         "_incompatible_cfg_target_toolchain": attr.label(
             default = Label("//python/pytest/settings:incompatible_cfg_target_toolchain"),
         ),
+        "_memory_profile": attr.label(
+            doc = "What to record of the memory use of each test.",
+            default = Label("//python/pytest:memory_profile"),
+        ),
+        "_partition_collection": attr.label(
+            doc = (
+                "Whether each pytest-xdist worker collects its own partition of the inventory. " +
+                "Workers still collect the files of their partition on every run."
+            ),
+            default = Label("//python/pytest:partition_collection"),
+        ),
+        "_phase_trace": attr.label(
+            doc = "Whether to record the timing of each phase of tests as a Chrome trace.",
+            default = Label("//python/pytest:phase_trace"),
+        ),
+        "_plugin_list_generator": attr.label(
+            doc = "A tool for listing the pytest plugins of a test.",
+            cfg = "exec",
+            executable = True,
+            default = Label("//python/pytest/private:plugin_list_generator"),
+        ),
+        "_persistent_worker": attr.label(
+            doc = "Whether to fork pytest from a persistent server.",
+            default = Label("//python/pytest:persistent_worker"),
+        ),
+        "_precompile": attr.label(
+            doc = "Whether to precompile Python sources to bytecode.",
+            default = Label("//python/pytest:precompile"),
+        ),
+        "_precompiler": attr.label(
+            doc = "A tool for precompiling Python sources to bytecode.",
+            cfg = "exec",
+            executable = True,
+            default = Label("//python/pytest/private:precompiler"),
+        ),
+        "_profile": attr.label(
+            doc = "The profiler to run pytest processes with.",
+            default = Label("//python/pytest:profile"),
+        ),
+        "_record_timings": attr.label(
+            doc = "Whether to record the durations of tests which have no `timings`.",
+            default = Label("//python/pytest:record_timings"),
+        ),
         "_runner": attr.label(
             doc = "The process wrapper for running pytest.",
             cfg = "exec",
@@ -364,6 +963,7 @@ def py_pytest_test_suite(
         tests,
         args = [],
         data = [],
+        group_size = 0,
         **kwargs):
     """Generates a [test_suite][ts] which groups various test targets for a set of python sources.
 
@@ -426,9 +1026,26 @@ def py_pytest_test_suite(
     //:tests/test_mod_c
     ```
 
+    For suites of many fast test files, the fixed cost of each target (building its venv, starting the process
+    wrapper and importing pytest) can outweigh the tests themselves. Setting `group_size` instead creates targets
+    which each run up to that many test files, in order of their paths, e.g. with `group_size = 2`:
+    ```text
+    //:my_lib_test_suite
+    //:my_lib_test_suite_group_0
+    //:my_lib_test_suite_group_1
+    ```
+
+    The JUnit XML of a target with several test files has a `testsuite` for each file so results are still
+    reported per file.
+
     Additional Notes:
     - No file passed to `tests` should be passed found in the `srcs` or `data` attributes or tests will not be able
         to be individually cached.
+    - A change to any test file in a group reruns the whole group, and adding or removing test files may move
+        others between groups.
+    - `srcs`, `deps` and `data` are gathered by a single `<name>_test_lib` library which every test depends on,
+        so the runfiles of all tests share everything but the test sources. `data` is also passed to each test,
+        where its conftests are precompiled and its locations expanded.
 
     [pt]: https://docs.bazel.build/versions/master/be/python.html#py_test
     [ts]: https://docs.bazel.build/versions/master/be/general.html#test_suite
@@ -440,6 +1057,8 @@ def py_pytest_test_suite(
         args (list, optional): Arguments for the underlying `py_pytest_test` targets.
         data (list, optional): A list of additional data for the test. This field would also include python
             files containing test helper functionality.
+        group_size (int, optional): The number of test files to run in each target. A value of 0 or less
+            creates a target for each test file.
         **kwargs: Keyword arguments passed to the underlying `py_test` rule.
     """
 
@@ -453,32 +1072,48 @@ def py_pytest_test_suite(
     tags = kwargs.get("tags", [])
     deps = kwargs.pop("deps", [])
     srcs = kwargs.pop("srcs", [])
-    if srcs:
-        test_lib_name = name + "_test_lib"
-        py_library(
-            name = test_lib_name,
-            srcs = srcs,
-            deps = deps,
-            data = data,
-            testonly = True,
-            tags = depset(tags + ["manual"]).to_list(),
-            **common_kwargs
-        )
-        deps = [test_lib_name] + deps
 
+    # The dependencies and data of every test are gathered by a single library
+    # so that the runfiles of each test share the same depsets. The common part
+    # of the tests' runfiles is then only hashed once, e.g. when building input
+    # trees for remote execution with `--experimental_remote_merkle_tree_cache`.
+    test_lib_name = name + "_test_lib"
+    py_library(
+        name = test_lib_name,
+        srcs = srcs,
+        deps = deps,
+        data = data,
+        testonly = True,
+        tags = depset(tags + ["manual"]).to_list(),
+        **common_kwargs
+    )
+
+    test_srcs = {}
     for src in tests:
         src_name = src.name if type(src) == "Label" else src
         if not src_name.endswith(".py"):
             fail("srcs should have `.py` extensions")
 
         # The test name should not end with `.py`
-        test_name = src_name[:-3]
+        test_srcs[src_name[:-3]] = src
+
+    groups = {}
+    if group_size > 0:
+        test_names = sorted(test_srcs.keys())
+        for index in range(0, len(test_names), group_size):
+            group_name = "{}_group_{}".format(name, index // group_size)
+            groups[group_name] = [test_srcs[test_name] for test_name in test_names[index:index + group_size]]
+    else:
+        for test_name, src in test_srcs.items():
+            groups[test_name] = [src]
+
+    for test_name, group_srcs in groups.items():
         py_pytest_test(
             name = test_name,
             args = args,
-            srcs = [src],
+            srcs = group_srcs,
             data = data,
-            deps = deps,
+            deps = [test_lib_name],
             **kwargs
         )
 
@@ -0,0 +1,390 @@
+"""A pytest plugin implementing the Bazel test protocol for `py_pytest_test`.
+
+This plugin is loaded into every pytest process (including pytest-xdist workers)
+spawned by `pytest_process_wrapper`.
+"""
+
+import importlib
+import importlib.util
+import marshal
+import os
+import sys
+import tracemalloc
+import types
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import _imp
+import pytest
+from _pytest.assertion import rewrite as assertion_rewrite
+
+from python.pytest.private import (
+    forkserver,
+    import_time,
+    junit,
+    memory,
+    phase_trace,
+    plugin_env,
+    process_plugins,
+    profiler,
+    sharding,
+    watchdog,
+)
+
+TIMINGS_OUTPUT = "pytest_timings.json"
+"""The name of the refreshed timings file written to `TEST_UNDECLARED_OUTPUTS_DIR`."""
+
+_TIMINGS_KEY = pytest.StashKey[Dict[str, float]]()
+
+_SHARD_PLANS_KEY = pytest.StashKey[List[sharding.ShardPlan]]()
+
+# pytest-cov starts collecting coverage while loading the initial conftests which
+# happens after plugins passed with `-p` are imported, so the coverage.py file
+# matcher is replaced at import time.
+if os.getenv("COVERAGE") == "1":
+    # pylint: disable-next=import-outside-toplevel
+    from python.pytest.private import coverage_matcher
+
+    coverage_matcher.install()
+
+
+def read_pyc(
+    source: Path, pyc: Path, trace: Callable[[str], None] = lambda _: None
+) -> Optional[types.CodeType]:
+    """Read a pyc of assertion rewritten code, including those written at build time.
+
+    pytest only supports pycs validated by the modification time of their source
+    but those precompiled by `py_pytest_test` are validated by the hash of their
+    source (PEP 552), as modification times differ between build and test.
+
+    Args:
+        source: The source file.
+        pyc: The pyc which may contain rewritten code for the source.
+        trace: A function for logging.
+
+    Returns:
+        The rewritten code, if the pyc is valid.
+    """
+    try:
+        with open(pyc, "rb") as fhd:
+            header = fhd.read(16)
+            if (
+                len(header) != 16
+                or header[:4] != importlib.util.MAGIC_NUMBER
+                or not int.from_bytes(header[4:8], "little") & 0b1
+            ):
+                return _PYTEST_READ_PYC(source, pyc, trace)
+
+            if header[8:16] != importlib.util.source_hash(source.read_bytes()):
+                trace(f"read_pyc({source}): out of date")
+                return None
+            code = marshal.load(fhd)
+    except (OSError, EOFError, ValueError, TypeError) as err:
+        trace(f"read_pyc({source}): {err}")
+        return None
+
+    if not isinstance(code, types.CodeType):
+        return None
+
+    # The code was compiled elsewhere so, as the interpreter does for any pyc,
+    # its file name is replaced by the location of the source.
+    _fix_co_filename(code, str(source))
+    return code
+
+
+def _fix_co_filename(code: types.CodeType, path: str) -> None:
+    """Set the file name of code, and of the code objects it contains."""
+    # pylint: disable-next=protected-access
+    _imp._fix_co_filename(code, path)  # type: ignore[attr-defined]
+
+
+# Profiling starts as soon as possible to include the startup of pytest, such as
+# the loading of plugins and conftests.
+_PROFILER: Optional[profiler.Profiler] = None
+if os.getenv(profiler.PROFILE_ENV):
+    _PROFILER = profiler.Profiler(os.environ[profiler.PROFILE_ENV])
+    _PROFILER.enable()
+
+
+# Precompiled bytecode is provided through a pycache prefix. The reader must be
+# replaced before any test module or conftest is imported.
+_PYTEST_READ_PYC = assertion_rewrite._read_pyc  # pylint: disable=protected-access
+if sys.pycache_prefix:
+    assertion_rewrite._read_pyc = read_pyc  # pylint: disable=protected-access
+
+
+def load_plugins(pluginmanager: pytest.PytestPluginManager, plugins_file: Path) -> None:
+    """Register the plugins listed in a file generated by `plugin_list_generator`.
+
+    This replaces pytest's own loading of `pytest11` entry points, which is
+    disabled by `PYTEST_DISABLE_PLUGIN_AUTOLOAD`, and registers each plugin
+    under its entry point name so `-p no:<name>` still applies.
+
+    Args:
+        pluginmanager: The pytest plugin manager.
+        plugins_file: A file of `name=module[:attribute]` lines.
+    """
+    for line in plugins_file.read_text(encoding="utf-8").splitlines():
+        name, _, value = line.partition("=")
+        if (
+            not value
+            or pluginmanager.get_plugin(name)
+            or pluginmanager.is_blocked(name)
+        ):
+            continue
+
+        module_name, _, attribute = value.partition(":")
+        pluginmanager.rewrite_hook.mark_rewrite(module_name)
+        plugin = importlib.import_module(module_name)
+        for part in filter(None, attribute.split(".")):
+            plugin = getattr(plugin, part)
+        pluginmanager.register(plugin, name)
+
+
+@pytest.hookimpl
+def pytest_addhooks(pluginmanager: pytest.PytestPluginManager) -> None:
+    """Load the plugins of the test, if listed at build time.
+
+    This is called when this plugin is registered by `-p`, which is just before
+    pytest would otherwise load plugins from entry points.
+    """
+    plugins_file = os.getenv(plugin_env.PLUGINS_FILE_ENV)
+    if plugins_file:
+        load_plugins(pluginmanager, Path(plugins_file))
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    """Treat runs which select no tests as successful.
+
+    Bazel shards, or filtering arguments, may legitimately select no tests.
+    This is handled here rather than by the process wrapper since it may hand
+    its process over to pytest.
+    """
+    if session.exitstatus == pytest.ExitCode.NO_TESTS_COLLECTED:
+        session.exitstatus = pytest.ExitCode.OK
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_unconfigure(config: pytest.Config) -> None:
+    """Report each test file of sessions which run several as its own JUnit `testsuite`.
+
+    This allows results to be reported per file for targets which bundle test
+    files, e.g. `py_pytest_test_suite` with `group_size`.
+    """
+    xml_file = getattr(config.option, "xmlpath", None)
+    if (
+        not xml_file
+        or process_plugins.is_xdist_worker(config)
+        or not os.path.exists(xml_file)
+    ):
+        return
+
+    test_files = []
+    for arg in config.args:
+        path = Path(arg.split("::")[0])
+        if path.suffix != ".py":
+            continue
+        try:
+            relative = path.absolute().relative_to(config.rootpath)
+        except ValueError:
+            continue
+        test_files.append(relative.as_posix())
+
+    if len(set(test_files)) > 1:
+        junit.split_junit_testsuites(Path(xml_file), test_files)
+
+
+def _plan_shards(config: pytest.Config, inventory_file: Path) -> None:
+    """Only collect the test files of the current shard.
+
+    pytest-xdist workers plan the same shard from their own arguments and, when
+    the collection is partitioned, only collect the files of their own tests.
+
+    Args:
+        config: The pytest config.
+        inventory_file: The test inventory collected at build time.
+    """
+    partitions = []
+    total_shards = int(os.getenv("TEST_TOTAL_SHARDS", "0"))
+    if total_shards > 1:
+        partitions.append((total_shards, int(os.environ["TEST_SHARD_INDEX"])))
+
+    if process_plugins.is_xdist_worker(config):
+        partition = getattr(config, "workerinput").get(
+            process_plugins.PARTITION_WORKER_INPUT
+        )
+        if partition:
+            partitions.append((int(partition[0]), int(partition[1])))
+    elif (
+        os.getenv(plugin_env.PARTITION_COLLECTION_ENV) == "1"
+        and getattr(config.option, "dist", "no") == "load"
+    ):
+        if process_plugins.PartitionCollection.supported():
+            config.pluginmanager.register(
+                process_plugins.PartitionCollection(), "bazel_partition_collection"
+            )
+        else:
+            config.issue_config_time_warning(
+                pytest.PytestConfigWarning(
+                    "Collection is not partitioned between workers, pytest-xdist "
+                    f"{process_plugins.PARTITION_XDIST_VERSION}.x is required."
+                ),
+                stacklevel=2,
+            )
+
+    if not partitions:
+        return
+
+    timings = config.stash.get(_TIMINGS_KEY, None)
+    files, nodeids = sharding.load_inventory(inventory_file)
+    plans = sharding.plan_partitions(files, nodeids, partitions, timings)
+    config.stash[_SHARD_PLANS_KEY] = plans
+    for plan in plans:
+        config.args[:] = plan.filter_args(config.args, config.rootpath)
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    """Load recorded timings, prepare to record new ones and configure workers."""
+    # pytest-xdist has already expanded `--numprocesses` into gateway specs,
+    # which are only read once the session starts. Workers are started by the
+    # fork server, or by a launcher logging their import times.
+    python = os.getenv(forkserver.FORKSERVER_ENV)
+    import_time_dir = os.getenv(import_time.IMPORT_TIME_DIR_ENV)
+    if import_time_dir:
+        python = import_time.launcher(Path(import_time_dir))
+    if python and not process_plugins.is_xdist_worker(config):
+        specs = getattr(config.option, "tx", None) or []
+        config.option.tx = [
+            f"popen//python={python}" if spec == "popen" else spec for spec in specs
+        ]
+
+    timings_file = os.getenv(plugin_env.TIMINGS_FILE_ENV)
+    if timings_file:
+        config.stash[_TIMINGS_KEY] = sharding.load_timings(Path(timings_file))
+
+    inventory_file = os.getenv(plugin_env.INVENTORY_FILE_ENV)
+    if inventory_file:
+        _plan_shards(config, Path(inventory_file))
+
+    # Durations are only recorded for tests balanced by them, or when requested.
+    # Reports from pytest-xdist workers are forwarded to the controlling process
+    # so only it needs to record durations.
+    output_dir = os.getenv("TEST_UNDECLARED_OUTPUTS_DIR")
+    record_timings = timings_file or os.getenv(plugin_env.RECORD_TIMINGS_ENV) == "1"
+    if record_timings and output_dir and not process_plugins.is_xdist_worker(config):
+        config.pluginmanager.register(
+            process_plugins.DurationRecorder(Path(output_dir) / TIMINGS_OUTPUT),
+            "bazel_duration_recorder",
+        )
+
+    memory_profile = os.getenv(memory.MEMORY_PROFILE_ENV)
+    max_memory_mb = os.getenv(memory.MAX_MEMORY_ENV)
+    if memory_profile or max_memory_mb:
+        if memory_profile == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        config.pluginmanager.register(
+            process_plugins.MemoryRecorder(
+                process_plugins.process_name(config),
+                memory_profile == "tracemalloc",
+                int(max_memory_mb) if max_memory_mb else None,
+                (
+                    Path(output_dir) / memory.MEMORY_OUTPUT
+                    if output_dir and not process_plugins.is_xdist_worker(config)
+                    else None
+                ),
+            ),
+            "bazel_memory_recorder",
+        )
+
+    # Each pytest process, including pytest-xdist workers, writes its own profile.
+    if _PROFILER is not None and output_dir:
+        config.pluginmanager.register(
+            process_plugins.ProfileWriter(
+                _PROFILER,
+                Path(output_dir) / profiler.PROFILE_OUTPUT,
+                process_plugins.process_name(config),
+            ),
+            "bazel_profile_writer",
+        )
+
+    trace_dir = os.getenv(phase_trace.TRACE_DIR_ENV)
+    if trace_dir and output_dir:
+        config.pluginmanager.register(
+            process_plugins.create_phase_tracer(
+                config, Path(trace_dir), Path(output_dir)
+            ),
+            "bazel_phase_tracer",
+        )
+
+    deadline = os.getenv(watchdog.DEADLINE_ENV)
+    if deadline:
+        config.pluginmanager.register(
+            process_plugins.create_timeout_watchdog(config, float(deadline)),
+            "bazel_timeout_watchdog",
+        )
+
+    coverage_file = os.getenv("COVERAGE_FILE")
+    numprocesses = getattr(config.option, "numprocesses", None)
+    if (
+        os.getenv("COVERAGE") == "1"
+        and coverage_file
+        and isinstance(numprocesses, int)
+        and numprocesses > 1
+        and not process_plugins.is_xdist_worker(config)
+    ):
+        config.pluginmanager.register(
+            process_plugins.CoverageCombiner(Path(coverage_file), numprocesses),
+            "bazel_coverage_combiner",
+        )
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: List[pytest.Item]
+) -> None:
+    """Select the items for the current Bazel test shard and order them for pytest-xdist.
+
+    https://bazel.build/reference/test-encyclopedia#test-sharding
+    """
+    timings = config.stash.get(_TIMINGS_KEY, None)
+    durations = None
+    if timings is not None:
+        durations = sharding.estimate_durations(
+            [item.nodeid for item in items], timings
+        )
+
+    selected = list(items)
+
+    plans = config.stash.get(_SHARD_PLANS_KEY, None)
+    total_shards = int(os.getenv("TEST_TOTAL_SHARDS", "0"))
+    if plans is not None:
+        selected = [
+            item for item in items if all(plan.selects(item.nodeid) for plan in plans)
+        ]
+    elif total_shards > 1:
+        shard_index = int(os.environ["TEST_SHARD_INDEX"])
+        selected = sharding.shard_items(
+            items,
+            total_shards,
+            shard_index,
+            (
+                [durations[item.nodeid] for item in items]
+                if durations is not None
+                else None
+            ),
+        )
+
+    if len(selected) != len(items):
+        selected_ids = {id(item) for item in selected}
+        deselected = [item for item in items if id(item) not in selected_ids]
+        config.hook.pytest_deselected(items=deselected)
+
+    # pytest-xdist schedules items to idle workers in collection order. Running
+    # the longest items first approximates a longest-processing-time-first
+    # packing across workers.
+    if durations is not None and process_plugins.is_xdist_worker(config):
+        item_durations = durations
+        selected.sort(key=lambda item: -item_durations[item.nodeid])
+
+    items[:] = selected
@@ -1,20 +1,161 @@
 """Wrapper to run pytest and gather coverage into an LCOV database."""
 
 import argparse
-import configparser
+import contextlib
+import importlib
+import io
+import json
 import os
 import subprocess
 import sys
+import tempfile
+import time
 from pathlib import Path, PurePosixPath
-from typing import Dict, List, Optional, Sequence
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Mapping,
+    NoReturn,
+    Optional,
+    Sequence,
+    TextIO,
+)
+
+from python.pytest.private import plugin_env
+
+if TYPE_CHECKING:
+    from python.pytest.private import phase_trace
+
+
+class RunfilesIndex:
+    """A lookup of runfiles by their canonical `rlocationpath`.
+
+    All paths passed to the process wrapper are generated from `File.short_path`
+    which uses canonical repository names, so unlike `python.runfiles.Runfiles`
+    no repository mapping is applied. In manifest mode the manifest is read once
+    into a dict and every lookup is a hash lookup.
+    """
+
+    def __init__(
+        self,
+        manifest: Optional[Dict[str, str]] = None,
+        runfiles_dir: Optional[str] = None,
+    ) -> None:
+        """Constructor
+
+        Args:
+            manifest: A mapping of runfiles to their real location.
+            runfiles_dir: The runfiles directory, used when there is no manifest.
+        """
+        self.manifest = manifest
+        self.runfiles_dir = runfiles_dir
+
+    @classmethod
+    def create(cls, env: Optional[Mapping[str, str]] = None) -> "RunfilesIndex":
+        """Create an index from the runfiles environment variables.
+
+        Like `python.runfiles.Runfiles.Create`, a runfiles manifest is preferred
+        over a runfiles directory.
+
+        Args:
+            env: The environment to use. Defaults to `os.environ`.
+
+        Returns:
+            A runfiles index.
+        """
+        if env is None:
+            env = os.environ
+
+        manifest = env.get("RUNFILES_MANIFEST_FILE")
+        if manifest:
+            return cls(manifest=cls.load_manifest(Path(manifest)))
+
+        runfiles_dir = env.get("RUNFILES_DIR")
+        if runfiles_dir:
+            return cls(runfiles_dir=runfiles_dir)
+
+        raise EnvironmentError(
+            "RUNFILES_MANIFEST_FILE and RUNFILES_DIR are not set. Is python running"
+            " under Bazel?"
+        )
+
+    @staticmethod
+    def load_manifest(manifest: Path) -> Dict[str, str]:
+        """Parse a runfiles manifest.
+
+        Args:
+            manifest: The path to a runfiles manifest.
+
+        Returns:
+            A mapping of runfiles to their real location.
+        """
+        index = {}
+        for line in manifest.read_bytes().decode("utf-8").split("\n"):
+            if not line:
+                continue
+
+            if line[0] != " ":
+                link, _, target = line.partition(" ")
+            else:
+                # Spaces, newlines and backslashes in the link are escaped as
+                # `\s`, `\n` and `\b` and newlines and backslashes in the target.
+                escaped_link, _, escaped_target = line[1:].partition(" ")
+                link = (
+                    escaped_link.replace(r"\s", " ")
+                    .replace(r"\n", "\n")
+                    .replace(r"\b", "\\")
+                )
+                target = escaped_target.replace(r"\n", "\n").replace(r"\b", "\\")
+
+            index[link] = target or link
+
+        return index
+
+    def rlocation(self, path: str) -> Optional[str]:
+        """Locate a runfile.
+
+        Args:
+            path: The canonical `rlocationpath` of the runfile.
+
+        Returns:
+            The location of the runfile or None if it's not in the manifest.
+        """
+        if os.path.isabs(path):
+            return path
+
+        if self.manifest is None:
+            return os.path.join(str(self.runfiles_dir), path)
+
+        location = self.manifest.get(path)
+        if location:
+            return location
+
+        # Files within directories (tree artifacts) are not listed individually.
+        prefix_end = path.rfind("/")
+        while prefix_end > 0:
+            location = self.manifest.get(path[:prefix_end])
+            if location:
+                return location + path[prefix_end:]
+            prefix_end = path.rfind("/", 0, prefix_end)
+
+        return None
 
-import coverage
-from coverage.cmdline import main as coverage_main
-from python.runfiles import Runfiles
 
 # Initialized in `main`.
-RUNFILES: Optional[Runfiles] = None
+RUNFILES: Optional[RunfilesIndex] = None
 
+PYTEST_PLUGIN = "python.pytest.private.pytest_bazel_plugin"
+"""The pytest plugin which implements the Bazel test protocol in pytest processes."""
+
+PERSISTENT_WORKER_MODULES = ["pytest"]
+"""Modules preloaded by persistent workers in addition to a target's `preload_modules`.
+
+pytest plugins are not preloaded as pytest warns that plugins imported before it
+starts can't have their assertions rewritten.
+"""
 
 CoverageSourceMap = Dict[Path, PurePosixPath]
 """A mapping of an `execpath` to `rootpath` for files to collect coverage for.
@@ -40,13 +181,29 @@ def _bazel_runfile(arg: str) -> Path:
             " under Bazel?"
         )
 
-    rlocation = RUNFILES.Rlocation(arg, source_repo=os.environ["TEST_WORKSPACE"])
+    rlocation = RUNFILES.rlocation(arg)
     if not rlocation:
         raise ValueError(f"Failed to find runfile for `{arg}`")
 
     return Path(rlocation)
 
 
+def _lazy_choice(module: str, choices: str) -> Callable[[str], str]:
+    """An argparse `type` accepting one of `module.choices`, only importing `module` when it's given."""
+
+    def parse(arg: str) -> str:
+        allowed = getattr(
+            importlib.import_module(f"python.pytest.private.{module}"), choices
+        )
+        if arg not in allowed:
+            raise argparse.ArgumentTypeError(
+                f"invalid choice: '{arg}' (choose from {', '.join(allowed)})"
+            )
+        return arg
+
+    return parse
+
+
 def parse_args(args: Optional[Sequence[str]] = None) -> argparse.Namespace:
     """Parse command line arguments
 
@@ -59,9 +216,18 @@ def parse_args(args: Optional[Sequence[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(prog="pytest_process_wrapper", usage=__doc__)
     parser.add_argument(
         "--cov-config",
-        required=True,
         type=_bazel_runfile,
-        help="Path to a coverage.py rc file.",
+        help="Path to the coverage.py rc file generated for coverage runs.",
+    )
+    parser.add_argument(
+        "--coverage-core",
+        choices=["ctrace", "pytrace", "sysmon"],
+        help="The coverage.py measurement core to use.",
+    )
+    parser.add_argument(
+        "--coverage-sources",
+        type=_bazel_runfile,
+        help="Path to a file of newline delimited sources to collect coverage for.",
     )
     parser.add_argument(
         "--pytest-config",
@@ -85,6 +251,80 @@ def parse_args(args: Optional[Sequence[str]] = None) -> argparse.Namespace:
         type=int,
         help="pytest-xdist argument for running tests concurrently.",
     )
+    parser.add_argument(
+        "--preload-module",
+        dest="preload_modules",
+        action="append",
+        default=[],
+        help="A module to import once in a fork server which pytest-xdist workers are forked from.",
+    )
+    parser.add_argument(
+        "--import-time",
+        action="store_true",
+        help="Run pytest with `-X importtime` and report the import times of all pytest processes.",
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Run pytest within the process wrapper instead of a new interpreter.",
+    )
+    parser.add_argument(
+        "--persistent-worker",
+        action="store_true",
+        help="Fork pytest from a persistent server which has already imported it.",
+    )
+    parser.add_argument(
+        "--inventory",
+        type=_bazel_runfile,
+        help="Path to the test inventory collected at build time.",
+    )
+    parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        help="The peak RSS, in megabytes, of all pytest processes above which the test fails.",
+    )
+    parser.add_argument(
+        "--memory-profile",
+        type=_lazy_choice("memory", "MEMORY_PROFILES"),
+        help="Record the peak memory use of each test, writing it to the undeclared outputs of the test.",
+    )
+    parser.add_argument(
+        "--plugins",
+        type=_bazel_runfile,
+        help="Path to a list of the pytest plugins of the test, generated at build time.",
+    )
+    parser.add_argument(
+        "--partition-collection",
+        action="store_true",
+        help="Have each pytest-xdist worker collect its own partition of the inventory.",
+    )
+    parser.add_argument(
+        "--phase-trace",
+        action="store_true",
+        help="Record the timing of each phase of the test as a Chrome trace.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=_lazy_choice("profiler", "PROFILERS"),
+        help="Profile each pytest process, writing the profiles to the undeclared outputs of the test.",
+    )
+    parser.add_argument(
+        "--pycache",
+        type=_bazel_runfile,
+        action="append",
+        default=[],
+        help="A directory of precompiled bytecode mirroring the runfiles of the test.",
+    )
+    parser.add_argument(
+        "--record-timings",
+        action="store_true",
+        help="Record the durations of tests even without `--timings`.",
+    )
+    parser.add_argument(
+        "--timings",
+        type=_bazel_runfile,
+        help="Path to a json file of recorded test durations used to balance shards and workers.",
+    )
     parser.add_argument(
         "pytest_args",
         nargs="*",
@@ -105,9 +345,19 @@ def parse_args(args: Optional[Sequence[str]] = None) -> argparse.Namespace:
         type=int,
         help="pytest-xdist argument for running tests concurrently",
     )
+    pytest_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Rerun the tests affected by every source change until interrupted.",
+    )
     pytest_args, remaining = pytest_parser.parse_known_args(parsed_args.pytest_args)
 
     parsed_args.pytest_args = remaining
+    parsed_args.watch = pytest_args.watch
+
+    # Arguments to `bazel run` are appended to those of the target.
+    if parsed_args.watch and "BUILD_WORKSPACE_DIRECTORY" not in os.environ:
+        parser.error("--watch is only supported by `bazel run`.")
 
     if pytest_args.numprocesses:
         if parsed_args.numprocesses != pytest_args.numprocesses:
@@ -116,6 +366,11 @@ def parse_args(args: Optional[Sequence[str]] = None) -> argparse.Namespace:
                 "Please update the Bazel target to pass `numprocesses`."
             )
 
+    if parsed_args.numprocesses and parsed_args.inventory:
+        parsed_args.numprocesses = plan_workers(
+            parsed_args.inventory, parsed_args.numprocesses
+        )
+
     if parsed_args.numprocesses is not None:
         parsed_args.pytest_args = [
             "-n",
@@ -125,116 +380,169 @@ def parse_args(args: Optional[Sequence[str]] = None) -> argparse.Namespace:
     return parsed_args
 
 
-def collect_coverage_sources(manifest: Path) -> CoverageSourceMap:
+def collect_coverage_sources(sources_file: Path) -> CoverageSourceMap:
     """Generate a map of files to collect coverage for.
 
     Args:
-        manifest: A manifest containing newline delimited source paths.
+        sources_file: A file containing newline delimited execpaths of Python sources.
 
     Returns:
         A map of absolute paths to relative paths for coverage sources.
     """
     if not RUNFILES:
-        raise RuntimeError(
-            "A rules_python.python.runfiles object is needed to locate coverage sources"
-        )
+        raise RuntimeError("A runfiles index is needed to locate coverage sources")
 
     workspace = PurePosixPath(os.environ["TEST_WORKSPACE"])
 
     sources = {}
-    for line in manifest.read_text().splitlines():
+    for line in sources_file.read_text(encoding="utf-8").splitlines():
         line = line.strip()
-        # The coverage manifest may include files such as `.gcno` from other instrumented
-        # runfiles, for python these other coverage outputs are ignored.
-        if line.startswith("bazel-out"):
+        if not line:
             continue
 
-        rlocationpath = str(workspace / line)
-        src = RUNFILES.Rlocation(
-            rlocationpath, source_repo=os.environ["TEST_WORKSPACE"]
-        )
+        path = PurePosixPath(line)
+        if path.parts[0] == "external":
+            rlocationpath = str(PurePosixPath(*path.parts[1:]))
+        else:
+            rlocationpath = str(workspace / path)
+
+        src = RUNFILES.rlocation(rlocationpath)
         if not src:
             raise FileNotFoundError(f"Failed to find runfile {rlocationpath}")
-        sources.update({Path(src): PurePosixPath(line)})
+        sources.update({Path(src): path})
 
     return sources
 
 
-def splice_coverage_config(
-    cov_config_path: Path, coverage_sources: CoverageSourceMap, data_file: Path
-) -> Path:
-    """Modify a coveragerc file to explicitly include or omit source files from a coverage manfiest
+def load_args_file() -> Optional[List[str]]:
+    """Attempt to load an args file from the environment
+
+    Returns:
+        A list of args if a args file was found.
+    """
+    argv = None
+    if "PY_PYTEST_TEST_ARGS_FILE" in os.environ:
+        args_file = _bazel_runfile(os.environ["PY_PYTEST_TEST_ARGS_FILE"])
+        argv = args_file.read_text(encoding="utf-8").splitlines() + sys.argv[1:]
+    return argv
+
+
+def plan_workers(inventory_file: Path, numprocesses: int) -> int:
+    """Limit the number of pytest-xdist workers to the number of tests to run.
+
+    Every worker starts an interpreter and collects tests, which is wasted on
+    workers left without tests. A single test is run without pytest-xdist.
 
     Args:
-        cov_config_path: The path to an existing coveragerc file.
-        coverage_sources: A map of source files to run coverage on.
-        data_file: The path where coverage should be written.
+        inventory_file: The test inventory collected at build time.
+        numprocesses: The number of workers requested by the target.
 
     Returns:
-        A path to a coverage config
+        The number of workers to start.
     """
-    # Write the new includes to an rc file
-    cov_config = configparser.ConfigParser()
-    cov_config.read(str(cov_config_path))
-
-    # Ensure the `run` section exists
-    if "run" not in cov_config.sections():
-        cov_config.add_section("run")
-
-    # Force the data file to be an expected path
-    cov_config.set("run", "data_file", str(data_file))
-
-    # Grab any existing coverage.py include or omit settings
-    includes = cov_config.get("run", "include", fallback="")
-    omits = cov_config.get("run", "omit", fallback="")
-
-    # In cases where a coverage manifest is provided but it's empty, we interpret
-    # that to be a test that has no dependencies from the same workspace and
-    # by extension, no dependencies used for coverage. All sources are then
-    # excluded from collecting coverage. Users who do not expect coverage to be
-    # collected from `deps` targets should annotate their `.coveragerc` file to
-    # collect the correct inputs from the `data` attribute.
-    if coverage_sources:
-        if includes:
-            existing_includes = includes.split(",")
-        else:
-            existing_includes = []
-        existing_includes.extend([str(src) for src in sorted(coverage_sources.keys())])
-        cov_config.set("run", "include", "\n".join(existing_includes))
+    inventory = json.loads(inventory_file.read_text(encoding="utf-8"))
+    tests = len(inventory.get("tests", []))
 
-    elif not includes and not omits:
-        cov_config.set("run", "omit", "*")
+    # Shards split tests evenly, or close to it when balanced by timings.
+    total_shards = int(os.getenv("TEST_TOTAL_SHARDS", "0"))
+    if total_shards > 1:
+        tests = -(-tests // total_shards)
 
-    updated_cov_config = Path(os.environ["TEST_TMPDIR"]) / ".coveragerc"
-    with updated_cov_config.open("w", encoding="utf-8") as fhd:
-        cov_config.write(fhd)
+    if tests <= 1:
+        return 0
 
-    return updated_cov_config
+    return min(numprocesses, tests)
 
 
-def load_args_file() -> Optional[List[str]]:
-    """Attempt to load an args file from the environment
+def acknowledge_sharding() -> None:
+    """Inform Bazel that the test runner supports sharding.
+
+    https://bazel.build/reference/test-encyclopedia#test-sharding
+    """
+    shard_status_file = os.getenv("TEST_SHARD_STATUS_FILE")
+    if shard_status_file:
+        Path(shard_status_file).touch()
+
+
+def run_pytest_in_process(
+    pytest_args: Sequence[str], cwd: Path, env: Dict[str, str]
+) -> int:
+    """Run pytest within the current interpreter.
+
+    This avoids the cost of starting and initializing a second interpreter. The
+    current process is configured to match what a pytest subprocess would observe.
+
+    Args:
+        pytest_args: Arguments for pytest.
+        cwd: The directory in which pytest should run.
+        env: The environment pytest should run with.
 
     Returns:
-        A list of args if a args file was found.
+        The pytest exit code.
     """
-    argv = None
-    if "PY_PYTEST_TEST_ARGS_FILE" in os.environ:
-        args_file = _bazel_runfile(os.environ["PY_PYTEST_TEST_ARGS_FILE"])
-        argv = args_file.read_text(encoding="utf-8").splitlines() + sys.argv[1:]
-    return argv
+    os.environ.clear()
+    os.environ.update(env)
+    os.chdir(cwd)
 
+    # Mirror the `PYTHONPATH` and `python -m` behavior of a subprocess.
+    if sys.path[0] != str(cwd):
+        sys.path.insert(0, str(cwd))
 
-def main() -> None:  # pylint: disable=too-many-branches,too-many-statements
-    """Main execution."""
-    patch_realpaths()
+    # Drop any cached temp directory so the one from `env` is used.
+    tempfile.tempdir = None
 
-    global RUNFILES  # pylint: disable=global-statement
-    RUNFILES = Runfiles.Create()
+    if "PYTHONPYCACHEPREFIX" in env:
+        sys.pycache_prefix = env["PYTHONPYCACHEPREFIX"]
 
-    parsed_args = parse_args(load_args_file())
+    import pytest  # pylint: disable=import-outside-toplevel
 
-    temp_dir = Path(os.environ["TEST_TMPDIR"])
+    return int(pytest.main(list(pytest_args)))
+
+
+def exec_pytest(
+    pytest_args: Sequence[str],
+    cwd: Path,
+    env: Dict[str, str],
+    persistent_modules: Optional[Sequence[str]] = None,
+) -> NoReturn:
+    """Replace the current process with pytest.
+
+    Nothing is left for the process wrapper to do after pytest when coverage is
+    not being collected, so the wrapper hands the process over to pytest instead
+    of idling while a subprocess runs.
+
+    Args:
+        pytest_args: Arguments for pytest.
+        cwd: The directory in which pytest should run.
+        env: The environment pytest should run with.
+        persistent_modules: If set, pytest is forked from a persistent server
+            which has imported these modules, unless no server can be started.
+    """
+    if persistent_modules is not None:
+        # pylint: disable-next=import-outside-toplevel
+        from python.pytest.private import forkserver
+
+        # This only returns if no server could be started.
+        forkserver.run_persistent(
+            persistent_modules, ["-m", "pytest"] + list(pytest_args), cwd=cwd, env=env
+        )
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.chdir(cwd)
+    os.execve(sys.executable, [sys.executable, "-m", "pytest"] + list(pytest_args), env)
+
+
+def child_environment(temp_dir: Path, test_dir: Path) -> Dict[str, str]:
+    """The environment of pytest, isolated within the temporary directory of the test.
+
+    Args:
+        temp_dir: The value of `TEST_TMPDIR`.
+        test_dir: The directory pytest runs in.
+
+    Returns:
+        The environment variables of the pytest process.
+    """
     home = temp_dir / "home"
     home.mkdir(exist_ok=True, parents=True)
     temp = temp_dir / "tmp"
@@ -254,56 +562,180 @@ def main() -> None:  # pylint: disable=too-many-branches,too-many-statements
     if "COLUMNS" not in child_env:
         child_env["COLUMNS"] = "100"
 
-    # Determine the directory in which pytest should run
-    test_dir = Path.cwd()
-
     existing_python_path = os.getenv("PYTHONPATH", "")
     if existing_python_path:
         existing_python_path = os.pathsep + existing_python_path
     child_env["PYTHONPATH"] = str(test_dir) + existing_python_path
 
+    return child_env
+
+
+def forkserver_environment(
+    preload_modules: Sequence[str], cwd: Path, env: Dict[str, str]
+) -> Dict[str, str]:
+    """Start a fork server from which pytest-xdist workers are forked.
+
+    Args:
+        preload_modules: The modules for the fork server to import.
+        cwd: The directory pytest runs in.
+        env: The environment of pytest.
+
+    Returns:
+        The environment variables telling `PYTEST_PLUGIN` to start workers
+        from the fork server.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from python.pytest.private import forkserver
+
+    return {
+        forkserver.FORKSERVER_ENV: forkserver.start(preload_modules, cwd=cwd, env=env)
+    }
+
+
+def run_watch(
+    parsed_args: argparse.Namespace,
+    pytest_args: Sequence[str],
+    cwd: Path,
+    env: Dict[str, str],
+) -> NoReturn:
+    """Run the test files of the test in-process each time their sources change.
+
+    Args:
+        parsed_args: The arguments of the process wrapper.
+        pytest_args: The arguments to pytest, including the test files.
+        cwd: The directory pytest runs in.
+        env: The environment of pytest.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from python.pytest.private import watch
+
+    sources = {str(src) for src in parsed_args.sources}
+    watch_args = [arg for arg in pytest_args if arg not in sources]
+    watch.watch(
+        lambda test_files: run_pytest_in_process(
+            watch_args + test_files, cwd=cwd, env=env
+        ),
+        test_files=parsed_args.sources,
+        source_root=cwd,
+        roots=[cwd / path for path in env["PYTHONPATH"].split(os.pathsep)],
+    )
+    sys.exit(0)
+
+
+def _span(
+    tracer: Optional["phase_trace.Tracer"], name: str, category: str
+) -> ContextManager[None]:
+    """A span of `tracer`, or nothing when phases aren't traced."""
+    if tracer is None:
+        return contextlib.nullcontext()
+    return tracer.span(name, category)
+
+
+def main() -> None:  # pylint: disable=too-many-branches,too-many-statements
+    """Main execution."""
+    # pylint: disable=too-many-locals
+    global RUNFILES  # pylint: disable=global-statement
+    start_time = time.time()
+
+    # The phases before the arguments are parsed are timed either way, as
+    # `phase_trace` is only imported when phases are traced.
+    times = [time.time_ns() // 1000]
+    RUNFILES = RunfilesIndex.create()
+    times.append(time.time_ns() // 1000)
+    argv = load_args_file()
+    times.append(time.time_ns() // 1000)
+    parsed_args = parse_args(argv)
+    times.append(time.time_ns() // 1000)
+
+    temp_dir = Path(os.environ["TEST_TMPDIR"])
+    output_dir = os.getenv("TEST_UNDECLARED_OUTPUTS_DIR")
+
+    # Determine the directory in which pytest should run
+    test_dir = Path.cwd()
+    child_env = child_environment(temp_dir, test_dir)
+
+    # Each process of the test writes the spans of its phases to a shared
+    # directory from which they are merged into a single trace.
+    tracer = None
+    trace_dir = None
+    if parsed_args.phase_trace and output_dir:
+        # pylint: disable-next=import-outside-toplevel
+        from python.pytest.private import phase_trace
+
+        tracer = phase_trace.Tracer("pytest_process_wrapper")
+        for name, start, end in (
+            ("Runfiles.Create", times[0], times[1]),
+            ("parse_args", times[1], times[3]),
+            ("load_args_file", times[1], times[2]),
+        ):
+            tracer.add(phase_trace.Span(name, "wrapper", start, end))
+        trace_dir = temp_dir / "trace"
+        trace_dir.mkdir(exist_ok=True)
+        child_env[phase_trace.TRACE_DIR_ENV] = str(trace_dir)
+
+    if parsed_args.pycache:
+        # pylint: disable-next=import-outside-toplevel
+        from python.pytest.private import pycache
+
+        with _span(tracer, "link_pycache", "wrapper"):
+            child_env.update(
+                pycache.environment(parsed_args.pycache, temp_dir / "pycache")
+            )
+
     # Custom arguments should not be passed to pytest here. This process wrapper
     # is only intended to have what's absolutely necessary to run pytest in a Bazel
     # test or coverage invocation. Custom arguments should be defined in the use of
     # rules which invoke this process wrapper or by providing `--pytest-config`.
     pytest_args = [
-        sys.executable,
-        "-m",
-        "pytest",
+        "-p",
+        PYTEST_PLUGIN,
     ]
 
-    cov_config_path = parsed_args.cov_config
+    # Scanning the metadata of every distribution for plugins is skipped in favor
+    # of those listed at build time, which `PYTEST_PLUGIN` loads. Users who have
+    # disabled autoloading themselves choose their own plugins.
+    if parsed_args.plugins and "PYTEST_DISABLE_PLUGIN_AUTOLOAD" not in child_env:
+        child_env["PYTEST_DISABLE_PLUGIN_AUTOLOAD"] = "1"
+        child_env[plugin_env.PLUGINS_FILE_ENV] = str(parsed_args.plugins)
+
+    child_env.update(plugin_env.environment(parsed_args, start_time))
+
+    # Shards are selected from the collected items by `PYTEST_PLUGIN`.
+    acknowledge_sharding()
+
     coverage_sources = {}
 
     cov_enabled = os.getenv("COVERAGE") == "1"
     if cov_enabled:
-        coverage_file = Path(os.environ["TEST_TMPDIR"], ".coverage")
-        child_env["COVERAGE_FILE"] = str(coverage_file)
-
-        # Attempt to locate a coverage manifest indicating what files should be
-        # included in coverage reports.
-        if "COVERAGE_MANIFEST" in os.environ:
-            coverage_manifest = Path(os.environ["COVERAGE_MANIFEST"])
-            if "ROOT" in os.environ and not coverage_manifest.absolute():
-                coverage_manifest = Path(os.environ["ROOT"]) / coverage_manifest
-
-            coverage_sources = collect_coverage_sources(coverage_manifest)
+        # coverage.py is only imported when coverage is being collected to keep
+        # the startup of regular test runs fast.
+        # pylint: disable-next=import-outside-toplevel
+        from python.pytest.private import coverage_matcher
+
+        with _span(tracer, "patch_coverage", "coverage"):
+            coverage_matcher.patch_coverage()
+
+        child_env["COVERAGE_FILE"] = str(temp_dir / ".coverage")
+        if parsed_args.coverage_core:
+            child_env["COVERAGE_CORE"] = parsed_args.coverage_core
+
+        # The sources to collect coverage for, and the coverage config which
+        # includes them, are generated when the test is built.
+        if parsed_args.coverage_sources:
+            with _span(tracer, "collect_coverage_sources", "coverage"):
+                coverage_sources = collect_coverage_sources(
+                    parsed_args.coverage_sources
+                )
 
         # If no coverage sources are provided, then coverage is disabled.
         if not coverage_sources:
             pytest_args.append("--no-cov")
         else:
-            cov_config_path = splice_coverage_config(
-                cov_config_path=cov_config_path,
-                coverage_sources=coverage_sources,
-                data_file=coverage_file,
-            )
-
             pytest_args.extend(
                 [
                     "--cov",
                     "--cov-config",
-                    str(cov_config_path),
+                    str(parsed_args.cov_config),
                 ]
             )
 
@@ -312,9 +744,19 @@ def main() -> None:  # pylint: disable=too-many-branches,too-many-statements
 
     # Emit JUnit XML if Bazel has specified an output file path.
     # https://bazel.build/reference/test-encyclopedia#initial-conditions
-    xml_output_file = os.environ.get("XML_OUTPUT_FILE")
-    if xml_output_file is not None:
-        pytest_args.extend([f"--junitxml={xml_output_file}"])
+    if "XML_OUTPUT_FILE" in os.environ:
+        pytest_args.append(f"--junitxml={os.environ['XML_OUTPUT_FILE']}")
+
+    # pytest and its workers write import times to stderr which is separated
+    # into a log for each process. This requires pytest to run in a subprocess.
+    import_time_dir = None
+    if parsed_args.import_time and output_dir:
+        # pylint: disable-next=import-outside-toplevel
+        from python.pytest.private import import_time
+
+        import_time_dir = temp_dir / "import_time"
+        import_time_dir.mkdir(exist_ok=True)
+        child_env[import_time.IMPORT_TIME_DIR_ENV] = str(import_time_dir)
 
     # Explicitly tell pytest where the root directory of the test is
     pytest_args.extend(["--rootdir", os.getcwd()])
@@ -322,48 +764,173 @@ def main() -> None:  # pylint: disable=too-many-branches,too-many-statements
     pytest_args.extend([str(src) for src in parsed_args.sources])
     pytest_args.extend(parsed_args.pytest_args)
 
+    if parsed_args.watch:
+        run_watch(parsed_args, pytest_args, cwd=test_dir, env=child_env)
+
+    # The fork server outlives this process when it is replaced by pytest below
+    # and exits along with pytest. Workers forked from it would not import
+    # anything so it's not used when measuring import times.
+    if (
+        parsed_args.preload_modules
+        and parsed_args.numprocesses
+        and not import_time_dir
+        and os.name != "nt"
+    ):
+        with _span(tracer, "forkserver.start", "wrapper"):
+            child_env.update(
+                forkserver_environment(
+                    parsed_args.preload_modules, cwd=test_dir, env=child_env
+                )
+            )
+
+    # The spans of this process are written before pytest starts as it may
+    # replace this process. The startup of pytest is measured from here.
+    launch_time = time.time_ns() // 1000
+    if tracer and trace_dir:
+        tracer.write(trace_dir)
+        child_env[phase_trace.LAUNCH_TIME_ENV] = str(launch_time)
+
+    # `os.exec*` on Windows spawns a new process and exits the current one
+    # which would appear to Bazel as the test having finished.
+    if (
+        not cov_enabled
+        and not parsed_args.in_process
+        and not import_time_dir
+        and os.name != "nt"
+    ):
+        exec_pytest(
+            pytest_args,
+            cwd=test_dir,
+            env=child_env,
+            persistent_modules=(
+                PERSISTENT_WORKER_MODULES + parsed_args.preload_modules
+                if parsed_args.persistent_worker
+                else None
+            ),
+        )
+
     try:
-        result = subprocess.run(pytest_args, cwd=test_dir, env=child_env, check=False)
+        if import_time_dir:
+            exit_code = import_time.run(
+                ["-m", "pytest"] + pytest_args,
+                import_time_dir / "pytest.txt",
+                cwd=test_dir,
+                env=child_env,
+            )
+        elif parsed_args.in_process:
+            exit_code = run_pytest_in_process(pytest_args, cwd=test_dir, env=child_env)
+        else:
+            exit_code = subprocess.run(
+                [sys.executable, "-m", "pytest"] + pytest_args,
+                cwd=test_dir,
+                env=child_env,
+                check=False,
+            ).returncode
+        if tracer:
+            tracer.add(
+                phase_trace.Span("pytest", "wrapper", launch_time, phase_trace.now())
+            )
+
         # Exit code 5 indicates no tests were selected.
-        if result.returncode not in (0, 5):
-            sys.exit(result.returncode)
+        if exit_code not in (0, 5):
+            sys.exit(exit_code)
     finally:
         if cov_enabled:
-            dump_coverage(
-                coverage_file=coverage_file,
-                coverage_config=cov_config_path,
-                coverage_sources=coverage_sources,
-                coverage_output_file=Path(
-                    os.environ["COVERAGE_DIR"], "python_coverage.dat"
-                ),
+            with _span(tracer, "dump_coverage", "coverage"):
+                dump_coverage(
+                    coverage_file=Path(child_env["COVERAGE_FILE"]),
+                    coverage_config=parsed_args.cov_config,
+                    coverage_sources=coverage_sources,
+                    coverage_output_file=Path(
+                        os.environ["COVERAGE_DIR"], "python_coverage.dat"
+                    ),
+                    max_workers=parsed_args.numprocesses or 1,
+                )
+
+        if import_time_dir and output_dir:
+            import_time.write_report(
+                import_time_dir, Path(output_dir) / import_time.IMPORT_TIME_OUTPUT
             )
 
+        if tracer and trace_dir and output_dir:
+            tracer.write(trace_dir)
+            phase_trace.merge(trace_dir, Path(output_dir) / phase_trace.TRACE_OUTPUT)
+
+
+LcovSourceMap = Dict[str, str]
+"""A mapping of absolute source paths, as written to `SF:` records, to relative paths."""
+
 
-def relativize_sf(line: bytes, coverage_sources: Dict[Path, PurePosixPath]) -> bytes:
+def lcov_source_map(coverage_sources: CoverageSourceMap) -> LcovSourceMap:
+    """Precompute a lookup for rewriting `SF:` records of an lcov file.
+
+    Args:
+        coverage_sources: A map of paths to files within the sandbox to collect coverage for
+
+    Returns:
+        A mapping of both the sandboxed and real (`os.path.realpath`) paths of each
+        source to its relative path from the Bazel exec root.
+    """
+    source_map = {}
+    for src, path in coverage_sources.items():
+        # Paths measured within this process (`--in-process`) are not resolved
+        # so the sandboxed path is accounted for as well as the real one.
+        for key in (src, src.resolve()):
+            source_map[os.path.normcase(str(key))] = str(path)
+
+    return source_map
+
+
+def relativize_sf(line: str, source_map: LcovSourceMap) -> str:
     """Parses a line of a lcov coverage file and normalizes source file (SF) paths
 
     Args:
-        line: A line from a lcov coverage file
-        coverage_sources: A mapping of real (`os.path.realpath`) file paths to
-            relative paths to the same source file from the Bazel exec root.
+        line: A line from a lcov coverage file, including any line ending.
+        source_map: A mapping of absolute file paths to relative paths to the
+            same source file from the Bazel exec root. See `lcov_source_map`.
 
     Returns:
-        bytes: The sanitized lcov line.
+        str: The sanitized lcov line.
     """
     # Skip lines that aren't representing source files
-    if not line.startswith(b"SF:"):
+    if not line.startswith("SF:"):
         return line
+
     # Check if the source file has a map to a relative path
-    source = Path(line[3:].decode("utf-8"))
-    if source in coverage_sources:
-        return b"SF:" + str(coverage_sources[source]).encode()
+    source = line.rstrip("\r\n")
+    relative = source_map.get(os.path.normcase(source[3:]))
+    if relative is None:
+        return line
+
+    return "SF:" + relative + line[len(source) :]
+
 
-    return line
+class LcovWriter(io.StringIO):
+    """A text stream which relativizes `SF:` records as an lcov report is written.
 
+    This derives from `io.StringIO` to be a `TextIO`, as coverage.py and
+    `contextlib.redirect_stdout` expect, but nothing is kept in memory. Every
+    write is passed through to the underlying stream.
+    """
+
+    def __init__(self, stream: TextIO, source_map: LcovSourceMap) -> None:
+        """Constructor
+
+        Args:
+            stream: The stream to write the lcov report to.
+            source_map: A mapping of absolute file paths to relative paths. See `lcov_source_map`.
+        """
+        super().__init__()
+        self.stream = stream
+        self.source_map = source_map
+
+    def write(self, s: str) -> int:
+        """Write to the underlying stream. coverage.py writes each `SF:` record with a single call."""
+        return self.stream.write(relativize_sf(s, self.source_map))
 
-def abs_file(filename: str) -> str:
-    """Return the absolute normalized form of `filename`."""
-    return os.path.abspath(filename)
+    def flush(self) -> None:
+        """Flush the underlying stream."""
+        self.stream.flush()
 
 
 def normalize_path(filename: str) -> str:
@@ -371,20 +938,12 @@ def normalize_path(filename: str) -> str:
     return os.path.normcase(os.path.normpath(filename))
 
 
-def patch_realpaths() -> None:
-    """Patch os.path.realpath escapes. Coverage will be loaded even if not being
-    collected, so to be safe patch no matter what.
-    """
-    coverage.files.abs_file = abs_file  # type: ignore
-    coverage.control.abs_file = abs_file  # type: ignore
-    coverage.files.set_relative_directory()
-
-
 def dump_coverage(
     coverage_file: Path,
     coverage_config: Optional[Path],
     coverage_sources: CoverageSourceMap,
     coverage_output_file: Path,
+    max_workers: int = 1,
 ) -> None:
     """Dump coverage to LCOV format and verify coverage minimums are met.
 
@@ -393,30 +952,31 @@ def dump_coverage(
         coverage_config: The path to a coveragerc file
         coverage_sources: A map of paths to files within the sandbox to collect coverage for
         coverage_output_file: The location where the lcov coverage file should be written.
+        max_workers: The maximum number of processes to generate the report with.
     """
+    # pylint: disable-next=import-outside-toplevel
+    import coverage
 
-    cov_args = [
-        "--data-file",
-        str(coverage_file),
-    ]
-
-    if coverage_config:
-        cov_args.extend(["--rcfile", str(coverage_config)])
-
-    # Convert to LCOV and place where Bazel requests.
-    coverage_main(["lcov", "-o", str(coverage_output_file)] + cov_args)
+    # pylint: disable-next=import-outside-toplevel
+    from python.pytest.private import coverage_matcher, coverage_parallel
 
-    # Resolve the sandboxed files to absolute paths on the host's file system
-    real_path_cov_srcs = {src.resolve(): path for src, path in coverage_sources.items()}
+    cov = coverage.Coverage(
+        data_file=str(coverage_file),
+        config_file=str(coverage_config) if coverage_config else True,
+    )
+    cov.load()
 
-    # Fixup the coverage file to ensure any absolute paths are corrected
-    # to be relative paths from the root fo the sandbox
-    if coverage_output_file.exists():
-        cov_output_content = [
-            relativize_sf(line, real_path_cov_srcs)
-            for line in coverage_output_file.read_bytes().splitlines()
-        ]
-        coverage_output_file.write_bytes(b"\n".join(cov_output_content))
+    # Convert to LCOV and place where Bazel requests. Absolute paths are corrected
+    # to be relative paths from the root of the sandbox as the report is written.
+    try:
+        with coverage_output_file.open("w", encoding="utf-8") as fhd:
+            writer = LcovWriter(fhd, lcov_source_map(coverage_sources))
+            coverage_parallel.lcov_report(
+                cov, writer, max_workers, initializer=coverage_matcher.patch_coverage
+            )
+    except coverage.CoverageException as exc:
+        coverage_output_file.unlink()
+        print(exc, file=sys.stderr)
 
 
 if __name__ == "__main__":
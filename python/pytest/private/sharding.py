@@ -0,0 +1,302 @@
+"""Partitioning of the tests of `py_pytest_test` by their recorded durations.
+
+Tests are divided between Bazel test shards, and ordered for pytest-xdist
+workers, using the durations recorded by previous runs (see `TIMINGS_OUTPUT` of
+`pytest_bazel_plugin`). Given a test inventory collected at build time, shards
+are planned before collection so each only collects the files of its own tests.
+"""
+
+import heapq
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_DURATION = 1.0
+"""The duration assumed for items when no timings have been recorded."""
+
+
+def load_timings(timings_file: Path) -> Dict[str, float]:
+    """Load a timings file mapping test node IDs to durations in seconds.
+
+    Args:
+        timings_file: A json file as written to `TIMINGS_OUTPUT`.
+
+    Returns:
+        A map of node IDs to durations.
+    """
+    content = json.loads(timings_file.read_text(encoding="utf-8"))
+    if not isinstance(content, dict):
+        raise ValueError(
+            f"Timings file is expected to be a json object: {timings_file}"
+        )
+
+    return {str(nodeid): float(duration) for nodeid, duration in content.items()}
+
+
+def estimate_durations(
+    nodeids: Sequence[str], timings: Dict[str, float]
+) -> Dict[str, float]:
+    """Estimate the duration of each test.
+
+    Tests missing from `timings` (new tests, or renamed ones) are assumed to
+    take the average of all recorded tests.
+
+    Args:
+        nodeids: The node IDs of the collected items.
+        timings: Recorded durations.
+
+    Returns:
+        A duration for every node ID.
+    """
+    known = [timings[nodeid] for nodeid in nodeids if nodeid in timings]
+    default = sum(known) / len(known) if known else DEFAULT_DURATION
+
+    return {nodeid: timings.get(nodeid, default) for nodeid in nodeids}
+
+
+def balance_items(
+    items: Sequence[T], durations: Sequence[float], bins: int
+) -> List[List[T]]:
+    """Partition items into bins of similar total duration.
+
+    This uses the longest-processing-time-first heuristic: items are assigned,
+    longest first, to the bin with the lowest total. Ties are broken by collection
+    order and bin index so the result is deterministic. Each bin retains the
+    collection order of its items.
+
+    Args:
+        items: The items to partition.
+        durations: The duration of each item in `items`.
+        bins: The number of bins to create.
+
+    Returns:
+        A list of `bins` lists of items.
+    """
+    if len(items) != len(durations):
+        raise ValueError("Every item requires a duration")
+
+    order = sorted(range(len(items)), key=lambda idx: (-durations[idx], idx))
+
+    heap = [(0.0, index) for index in range(bins)]
+    assignments: List[List[int]] = [[] for _ in range(bins)]
+    for idx in order:
+        load, index = heapq.heappop(heap)
+        assignments[index].append(idx)
+        heapq.heappush(heap, (load + durations[idx], index))
+
+    return [[items[idx] for idx in sorted(assigned)] for assigned in assignments]
+
+
+def shard_items(
+    items: Sequence[T],
+    total_shards: int,
+    shard_index: int,
+    durations: Optional[Sequence[float]] = None,
+) -> List[T]:
+    """Select the subset of items belonging to a Bazel test shard.
+
+    Without durations, items are distributed round-robin in collection order.
+    Either way the partition is deterministic for a given set of sources and
+    every item is run by exactly one shard.
+
+    Args:
+        items: The collected test items.
+        total_shards: The value of `TEST_TOTAL_SHARDS`.
+        shard_index: The value of `TEST_SHARD_INDEX`.
+        durations: Optional durations of each item used to balance shards.
+
+    Returns:
+        The items which should be run by the current shard.
+    """
+    if total_shards < 1:
+        raise ValueError(f"Invalid shard count: {total_shards}")
+    if not 0 <= shard_index < total_shards:
+        raise ValueError(
+            f"Invalid shard index `{shard_index}` for `{total_shards}` shards"
+        )
+
+    if durations is not None:
+        return balance_items(items, durations, total_shards)[shard_index]
+
+    return [item for idx, item in enumerate(items) if idx % total_shards == shard_index]
+
+
+def load_inventory(inventory_file: Path) -> Tuple[List[str], List[str]]:
+    """Load a test inventory written by `inventory_generator`.
+
+    Args:
+        inventory_file: The inventory json file.
+
+    Returns:
+        The test files, relative to the root directory, and the node IDs of
+        the collected tests in collection order.
+    """
+    content = json.loads(inventory_file.read_text(encoding="utf-8"))
+    if not isinstance(content, dict):
+        raise ValueError(
+            f"Inventory file is expected to be a json object: {inventory_file}"
+        )
+
+    files = [str(path) for path in content.get("files", [])]
+    nodeids = [str(test["nodeid"]) for test in content.get("tests", [])]
+    return files, nodeids
+
+
+def nodeid_file(nodeid: str) -> str:
+    """The file of a test node ID, relative to the root directory."""
+    return nodeid.split("::", 1)[0]
+
+
+def partition_contiguous(durations: Sequence[float], bins: int) -> List[int]:
+    """Split items, in order, into contiguous bins of similar total duration.
+
+    Unlike `balance_items`, items of the same file stay together so at most
+    `bins - 1` files are split between bins.
+
+    Args:
+        durations: The duration of each item.
+        bins: The number of bins to create.
+
+    Returns:
+        The bin of each item.
+    """
+    total = sum(durations)
+    if total <= 0:
+        durations = [DEFAULT_DURATION] * len(durations)
+        total = sum(durations)
+
+    assignments = []
+    elapsed = 0.0
+    for duration in durations:
+        assignments.append(min(bins - 1, int(elapsed / total * bins)))
+        elapsed += duration
+
+    return assignments
+
+
+class ShardPlan:
+    """The tests and test files of a Bazel test shard, planned from a test inventory.
+
+    Shards are planned from the inventory rather than from collection so each
+    shard only collects the files containing its tests, and are contiguous in
+    collection order so few files are collected by more than one shard. Tests
+    missing from the inventory, such as those parametrized by the environment,
+    are run by the shard which owns their file: the shard of its first test, or
+    one assigned round-robin for files without tests.
+    """
+
+    def __init__(
+        self,
+        files: Sequence[str],
+        nodeids: Sequence[str],
+        partition: Tuple[int, int],
+        durations: Optional[Sequence[float]] = None,
+    ) -> None:
+        """Constructor
+
+        Args:
+            files: The test files of the inventory.
+            nodeids: The node IDs of the inventory in collection order.
+            partition: The total count and index of the shard, i.e. the values
+                of `TEST_TOTAL_SHARDS` and `TEST_SHARD_INDEX`.
+            durations: Optional durations of each test used to balance shards.
+        """
+        total_shards, shard_index = partition
+        self.shard_index = shard_index
+        self.known = set(nodeids)
+
+        if not 0 <= shard_index < total_shards:
+            raise ValueError(
+                f"Invalid shard index `{shard_index}` for `{total_shards}` shards"
+            )
+
+        shard_of = dict(
+            zip(
+                nodeids,
+                partition_contiguous(
+                    durations or [DEFAULT_DURATION] * len(nodeids), total_shards
+                ),
+            )
+        )
+        self.selected = {
+            nodeid for nodeid, index in shard_of.items() if index == shard_index
+        }
+
+        self.owners: Dict[str, int] = {}
+        for nodeid in nodeids:
+            self.owners.setdefault(nodeid_file(nodeid), shard_of[nodeid])
+        for position, path in enumerate(files):
+            self.owners.setdefault(path, position % total_shards)
+
+        self.files = {nodeid_file(nodeid) for nodeid in self.selected} | {
+            path for path, index in self.owners.items() if index == shard_index
+        }
+
+    def selects(self, nodeid: str) -> bool:
+        """Whether a collected test belongs to the shard.
+
+        Tests from files outside of the inventory are run by the first shard.
+        """
+        if nodeid in self.known:
+            return nodeid in self.selected
+        return self.owners.get(nodeid_file(nodeid), 0) == self.shard_index
+
+    def filter_args(self, args: Sequence[str], rootdir: Path) -> List[str]:
+        """Remove test files which belong to other shards from pytest's arguments.
+
+        At least one argument is kept so pytest never falls back to collecting
+        the root directory.
+        """
+        kept = []
+        for arg in args:
+            if "::" not in arg and os.path.isfile(arg):
+                path = Path(os.path.relpath(arg, rootdir)).as_posix()
+                if path in self.owners and path not in self.files:
+                    continue
+            kept.append(arg)
+
+        return kept or list(args[:1])
+
+
+def plan_partitions(
+    files: Sequence[str],
+    nodeids: Sequence[str],
+    partitions: Sequence[Tuple[int, int]],
+    timings: Optional[Dict[str, float]] = None,
+) -> List[ShardPlan]:
+    """Plan nested partitions of an inventory.
+
+    Each partition divides the tests of the one before it, such as a Bazel test
+    shard and then a pytest-xdist worker within the shard.
+
+    Args:
+        files: The test files of the inventory.
+        nodeids: The node IDs of the inventory in collection order.
+        partitions: The total count and index of each partition.
+        timings: Optional recorded durations used to balance partitions.
+
+    Returns:
+        A plan for each partition.
+    """
+    durations = estimate_durations(nodeids, timings) if timings is not None else None
+
+    plans = []
+    for partition in partitions:
+        plan = ShardPlan(
+            files,
+            nodeids,
+            partition,
+            (
+                [durations[nodeid] for nodeid in nodeids]
+                if durations is not None
+                else None
+            ),
+        )
+        plans.append(plan)
+        files = [path for path in files if path in plan.files]
+        nodeids = [nodeid for nodeid in nodeids if nodeid in plan.selected]
+
+    return plans
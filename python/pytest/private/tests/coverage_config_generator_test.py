@@ -0,0 +1,77 @@
+"""Tests for the coverage_config_generator.py script"""
+
+import configparser
+import unittest
+
+import python.pytest.private.coverage_config_generator as generator
+
+
+class TestSpliceCoverageConfig(unittest.TestCase):
+    """Test cases for `coverage_config_generator.splice_coverage_config`"""
+
+    def test_include_sources(self) -> None:
+        """Sources are included relative to the test's workspace"""
+        cov_config = configparser.ConfigParser(interpolation=None)
+        cov_config.read_string("[run]\nbranch = True\n")
+
+        generator.splice_coverage_config(
+            cov_config,
+            [
+                "pkg/b.py",
+                "external/other_repo/c.py",
+                "pkg/a.py",
+            ],
+        )
+
+        self.assertEqual(cov_config.get("run", "branch"), "True")
+        self.assertEqual(cov_config.get("run", "data_file"), "${COVERAGE_FILE}")
+        self.assertListEqual(
+            cov_config.get("run", "include").splitlines(),
+            ["../other_repo/c.py", "pkg/a.py", "pkg/b.py"],
+        )
+        self.assertFalse(cov_config.has_option("run", "omit"))
+
+    def test_existing_includes(self) -> None:
+        """User provided includes are retained"""
+        cov_config = configparser.ConfigParser(interpolation=None)
+        cov_config.read_string("[run]\ninclude = data/*.py\n")
+
+        generator.splice_coverage_config(cov_config, ["pkg/a.py"])
+
+        self.assertListEqual(
+            cov_config.get("run", "include").splitlines(),
+            ["data/*.py", "pkg/a.py"],
+        )
+
+    def test_no_sources(self) -> None:
+        """All sources are omitted when there is nothing to collect coverage for"""
+        cov_config = configparser.ConfigParser(interpolation=None)
+
+        generator.splice_coverage_config(cov_config, [])
+
+        self.assertEqual(cov_config.get("run", "omit"), "*")
+        self.assertFalse(cov_config.has_option("run", "include"))
+
+    def test_no_sources_with_existing_omit(self) -> None:
+        """User provided omits are respected when there are no sources"""
+        cov_config = configparser.ConfigParser(interpolation=None)
+        cov_config.read_string("[run]\nomit = tests/*\n")
+
+        generator.splice_coverage_config(cov_config, [])
+
+        self.assertEqual(cov_config.get("run", "omit"), "tests/*")
+
+    def test_mode(self) -> None:
+        """The measurement mode overrides the user's branch setting"""
+        for mode, branch in [("line", "False"), ("branch", "True"), (None, "True")]:
+            with self.subTest(mode=mode):
+                cov_config = configparser.ConfigParser(interpolation=None)
+                cov_config.read_string("[run]\nbranch = True\n")
+
+                generator.splice_coverage_config(cov_config, ["pkg/a.py"], mode)
+
+                self.assertEqual(cov_config.get("run", "branch"), branch)
+
+
+if __name__ == "__main__":
+    unittest.main()
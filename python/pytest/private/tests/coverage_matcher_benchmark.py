@@ -0,0 +1,72 @@
+"""A benchmark comparing coverage.py's `GlobMatcher` to `coverage_matcher.SourceMatcher`.
+
+Each matcher is given an include set of explicit source paths, as generated for
+`py_pytest_test` coverage runs, and is timed for construction and for matching
+every included file along with an equal number of excluded ones.
+"""
+
+import argparse
+import time
+from typing import Callable, List, Sequence, Union
+
+from coverage.files import GlobMatcher
+
+from python.pytest.private.coverage_matcher import SourceMatcher
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100, 10_000, 100_000],
+        help="The number of sources to include.",
+    )
+
+    return parser.parse_args()
+
+
+def make_sources(count: int) -> List[str]:
+    """Generate source paths spread across packages like a large repository."""
+    return [
+        f"/sandbox/execroot/_main/pkg_{idx // 50}/sub_{idx % 7}/module_{idx}.py"
+        for idx in range(count)
+    ]
+
+
+def benchmark(
+    matcher_type: Callable[[List[str], str], Union[GlobMatcher, SourceMatcher]],
+    patterns: List[str],
+    paths: Sequence[str],
+) -> str:
+    """Time the construction and use of a matcher."""
+    start = time.perf_counter()
+    matcher = matcher_type(patterns, "include")
+    built = time.perf_counter()
+    matched = sum(1 for path in paths if matcher.match(path))
+    finished = time.perf_counter()
+
+    return (
+        f"{getattr(matcher_type, '__name__'):<14} build {built - start:>9.3f}s  "
+        f"match {finished - built:>9.3f}s  ({matched} matched)"
+    )
+
+
+def main() -> None:
+    """The main entrypoint."""
+    args = parse_args()
+
+    for size in args.sizes:
+        sources = make_sources(size)
+        paths = sources + [path.replace(".py", "_other.py") for path in sources]
+
+        print(f"{size} sources, {len(paths)} files")
+        for matcher_type in (GlobMatcher, SourceMatcher):
+            print("  " + benchmark(matcher_type, sources, paths))
+
+
+if __name__ == "__main__":
+    main()
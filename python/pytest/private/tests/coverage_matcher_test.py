@@ -0,0 +1,85 @@
+"""Tests for the coverage_matcher.py module"""
+
+import unittest
+
+from coverage import inorout
+from coverage.files import GlobMatcher
+
+from python.pytest.private import coverage_matcher
+
+PATTERNS = [
+    "/sandbox/pkg/a.py",
+    "/sandbox/pkg/sub\\b.py",
+    "/sandbox/data/*",
+    "/sandbox/gen/**",
+    "/sandbox/*/conftest.py",
+    "/sandbox/glob/mod_?.py",
+    "settings.py",
+    "relative/pkg/c.py",
+]
+
+PATHS = [
+    "/sandbox/pkg/a.py",
+    "/sandbox/pkg/a.pyc",
+    "/sandbox/pkg/sub/b.py",
+    "/sandbox/pkg/sub\\b.py",
+    "/sandbox/pkg/c.py",
+    "/sandbox/data/x.py",
+    "/sandbox/data/deep/y.py",
+    "/sandbox/database.py",
+    "/sandbox/gen/z.py",
+    "/sandbox/tests/conftest.py",
+    "/sandbox/tests/deep/conftest.py",
+    "/sandbox/glob/mod_a.py",
+    "/sandbox/glob/mod_ab.py",
+    "/elsewhere/settings.py",
+    "/elsewhere/relative/pkg/c.py",
+    "relative/pkg/c.py",
+]
+
+
+class TestSourceMatcher(unittest.TestCase):
+    """Test cases for `coverage_matcher.SourceMatcher`"""
+
+    def test_equivalent_to_glob_matcher(self) -> None:
+        """Files are matched exactly like coverage.py's `GlobMatcher`"""
+        expected = GlobMatcher(PATTERNS, "include")
+        matcher = coverage_matcher.SourceMatcher(PATTERNS, "include")
+
+        for path in PATHS:
+            with self.subTest(path=path):
+                self.assertEqual(matcher.match(path), expected.match(path))
+
+    def test_partition(self) -> None:
+        """Only patterns with wildcards are compiled to regular expressions"""
+        literals, prefixes, globs = coverage_matcher.partition_patterns(PATTERNS)
+
+        self.assertSetEqual(
+            set(literals),
+            {"/sandbox/pkg/a.py", "/sandbox/pkg/sub/b.py", "relative/pkg/c.py"},
+        )
+        self.assertSetEqual(set(prefixes), {"/sandbox/data", "/sandbox/gen"})
+        self.assertListEqual(
+            globs,
+            ["/sandbox/*/conftest.py", "/sandbox/glob/mod_?.py", "settings.py"],
+        )
+
+    def test_no_patterns(self) -> None:
+        """Nothing matches an empty set of patterns"""
+        matcher = coverage_matcher.SourceMatcher([], "include")
+
+        self.assertFalse(matcher.match("/sandbox/pkg/a.py"))
+
+    def test_install(self) -> None:
+        """coverage.py uses `SourceMatcher` once installed"""
+        try:
+            coverage_matcher.install()
+            self.assertIs(
+                getattr(inorout, "GlobMatcher"), coverage_matcher.SourceMatcher
+            )
+        finally:
+            setattr(inorout, "GlobMatcher", GlobMatcher)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Tests for the coverage_parallel.py module"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import coverage
+from coverage import CoverageData
+
+from python.pytest.private import coverage_matcher, coverage_parallel
+
+
+class TestChunk(unittest.TestCase):
+    """Test cases for `coverage_parallel.chunk`"""
+
+    def test_chunk(self) -> None:
+        """Items are split into contiguous chunks of similar size"""
+        self.assertListEqual(
+            coverage_parallel.chunk(list(range(7)), 3),
+            [[0, 1, 2], [3, 4], [5, 6]],
+        )
+
+    def test_more_chunks_than_items(self) -> None:
+        """Empty chunks are not created"""
+        self.assertListEqual(coverage_parallel.chunk([0, 1], 4), [[0], [1]])
+
+
+class CoverageTestCase(unittest.TestCase):
+    """A test case with a temporary directory of sources"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="coverage_parallel_test-"))
+        self.sources: List[str] = []
+        for idx in range(70):
+            source = self.tmp_dir / f"module_{idx:02}.py"
+            source.write_text(
+                "def f(x):\n    if x:\n        return 1\n    return 0\n",
+                encoding="utf-8",
+            )
+            self.sources.append(str(source))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def write_data(self, name: str, sources: List[str]) -> str:
+        """Write a data file recording the first lines of `sources` as run."""
+        data_file = str(self.tmp_dir / name)
+        data = CoverageData(basename=data_file)
+        data.add_lines({source: [1, 2, 3] for source in sources})
+        data.write()
+        return data_file
+
+
+class TestCombineDataFiles(CoverageTestCase):
+    """Test cases for `coverage_parallel.combine_data_files`"""
+
+    def test_combine(self) -> None:
+        """All data files are combined into one and deleted"""
+        data_files = [
+            self.write_data(f".coverage.{idx}", self.sources[idx::5])
+            for idx in range(5)
+        ]
+        output = self.tmp_dir / ".coverage.combined"
+
+        coverage_parallel.combine_data_files(data_files, output, max_workers=2)
+
+        data = CoverageData(basename=str(output))
+        data.read()
+        self.assertSetEqual(set(data.measured_files()), set(self.sources))
+        self.assertListEqual(sorted(data.lines(self.sources[0]) or []), [1, 2, 3])
+        for data_file in data_files:
+            self.assertFalse(os.path.exists(data_file))
+
+
+class TestLcovReport(CoverageTestCase):
+    """Test cases for `coverage_parallel.lcov_report`"""
+
+    def report(
+        self, max_workers: int, initializer: Optional[Callable[[], None]] = None
+    ) -> str:
+        """Generate an lcov report."""
+        data_file = self.write_data(".coverage", self.sources)
+        cov = coverage.Coverage(data_file=data_file, config_file=False)
+        cov.load()
+
+        stream = io.StringIO()
+        coverage_parallel.lcov_report(cov, stream, max_workers, initializer)
+        return stream.getvalue()
+
+    def test_parallel_report(self) -> None:
+        """Reports generated across processes match a serial report"""
+        serial = self.report(max_workers=1)
+        parallel = self.report(max_workers=2)
+
+        self.assertEqual(serial.count("end_of_record"), len(self.sources))
+        self.assertEqual(parallel, serial)
+
+    def test_initializer(self) -> None:
+        """Spawned processes are prepared by the initializer of the process wrapper"""
+        serial = self.report(max_workers=1)
+        parallel = self.report(
+            max_workers=2, initializer=coverage_matcher.patch_coverage
+        )
+
+        self.assertEqual(parallel, serial)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,14 @@
+"""Tests for running `py_pytest_test` targets with `preload_modules`"""
+
+import os
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize("value", range(4))
+def test_preloaded(value: int) -> None:
+    """Workers are forked from a server which has imported `preload_modules`"""
+    assert value >= 0
+    assert "email.mime.text" in sys.modules
+    assert os.getenv("PYTEST_XDIST_WORKER")
@@ -0,0 +1,225 @@
+"""Tests for the forkserver.py module"""
+
+import contextlib
+import os
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, List, Set
+from unittest import mock
+
+from python.pytest.private import forkserver
+
+
+@unittest.skipIf(os.name == "nt", "Fork servers are only supported on POSIX")
+class TestForkServer(unittest.TestCase):
+    """Test cases for processes started from a `forkserver` server"""
+
+    tmp_dir: str
+    command: List[str]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp_dir = tempfile.mkdtemp(prefix="forkserver_test-")
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(sys.path)
+        cls.command = shlex.split(
+            forkserver.start(["email.mime.text"], cwd=Path(cls.tmp_dir), env=env)
+        )
+
+    def run_python(
+        self, *args: str, **kwargs: Any
+    ) -> "subprocess.CompletedProcess[str]":
+        """Run a Python program from the fork server."""
+        return subprocess.run(
+            self.command + list(args),
+            capture_output=True,
+            encoding="utf-8",
+            check=False,
+            **kwargs,
+        )
+
+    def test_command(self) -> None:
+        """Programs passed with `-c` have their arguments, stdin and modules"""
+        result = self.run_python(
+            "-c",
+            "import os, sys; print(sys.argv[1:], sys.stdin.read(), os.getcwd(), "
+            "'email.mime.text' in sys.modules, os.environ['VALUE'])",
+            "first",
+            input="stdin",
+            cwd=self.tmp_dir,
+            env=dict(os.environ, VALUE="value"),
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(
+            result.stdout,
+            f"['first'] stdin {os.path.realpath(self.tmp_dir)} True value\n",
+        )
+
+    def test_module(self) -> None:
+        """Modules passed with `-m` are run as `__main__`"""
+        result = self.run_python("-m", "json.tool", input='{"a": 1}')
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout, '{\n    "a": 1\n}\n')
+
+    def test_pycache_prefix(self) -> None:
+        """Each program writes bytecode to the `PYTHONPYCACHEPREFIX` of its client"""
+        for name in ("first", "second"):
+            prefix = os.path.join(self.tmp_dir, name)
+            result = self.run_python(
+                "-c",
+                "import sys; print(sys.pycache_prefix)",
+                env=dict(os.environ, PYTHONPYCACHEPREFIX=prefix),
+            )
+
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(result.stdout, f"{prefix}\n")
+
+    def test_exit_code(self) -> None:
+        """The client exits with the exit code of the forked process"""
+        result = self.run_python("-c", "import sys; sys.exit(3)")
+
+        self.assertEqual(result.returncode, 3)
+
+    def test_signal(self) -> None:
+        """The client exits with the signal which terminated the forked process"""
+        result = self.run_python("-c", "import os, signal; os.kill(os.getpid(), 9)")
+
+        self.assertEqual(result.returncode, -9)
+
+
+@unittest.skipIf(os.name == "nt", "Fork servers are only supported on POSIX")
+class TestPersistentForkServer(unittest.TestCase):
+    """Test cases for `forkserver.run_persistent`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="forkserver_test-"))
+        self.module = self.tmp_dir / "preloaded_module.py"
+        self.module.write_text("VALUE = 1\n", encoding="utf-8")
+        # The temporary directory makes the server unique to this test.
+        self.env = dict(os.environ)
+        self.env["PYTHONPATH"] = os.pathsep.join([str(self.tmp_dir)] + sys.path)
+        self.server_pids: Set[int] = set()
+
+    def tearDown(self) -> None:
+        for pid in self.server_pids:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+        shutil.rmtree(self.tmp_dir)
+
+    def run_persistent(self, code: str) -> "subprocess.Popen[str]":
+        """Start a program which runs `code` from the persistent server."""
+        script = "\n".join(
+            [
+                "import os, sys",
+                "from pathlib import Path",
+                "from python.pytest.private import forkserver",
+                "forkserver.run_persistent(",
+                "    ['preloaded_module'],",
+                f"    ['-c', {code!r}],",
+                "    cwd=Path.cwd(),",
+                "    env=dict(os.environ),",
+                ")",
+                "sys.exit('No fork server was started')",
+            ]
+        )
+        return subprocess.Popen(
+            [sys.executable, "-c", script],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.tmp_dir,
+            env=self.env,
+            encoding="utf-8",
+        )
+
+    def server_pid(self) -> int:
+        """Run a program from the persistent server and return the server's pid."""
+        with self.run_persistent(
+            "import os, sys; print(os.getppid(), *sys.modules)"
+        ) as process:
+            stdout, stderr = process.communicate()
+        self.assertEqual(process.returncode, 0, stderr)
+        pid, *modules = stdout.split()
+        self.assertIn("preloaded_module", modules)
+        self.server_pids.add(int(pid))
+        return int(pid)
+
+    def test_reused(self) -> None:
+        """Later runs are forked from the server started by the first"""
+        self.assertEqual(self.server_pid(), self.server_pid())
+
+    def modify_module(self) -> None:
+        """Advance the modification time of the preloaded module."""
+        stat = self.module.stat()
+        os.utime(self.module, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_modified_module(self) -> None:
+        """A new server is started once a preloaded module is modified"""
+        first = self.server_pid()
+
+        self.modify_module()
+
+        self.assertNotEqual(self.server_pid(), first)
+
+    def test_modified_module_running(self) -> None:
+        """Programs still running when their server is replaced report their exit"""
+        with self.run_persistent(
+            "import os, sys; print(os.getppid(), flush=True); sys.stdin.read()"
+        ) as process:
+            assert process.stdin is not None and process.stdout is not None
+            first = int(process.stdout.readline())
+            self.server_pids.add(first)
+
+            self.modify_module()
+            self.assertNotEqual(self.server_pid(), first)
+
+            _, stderr = process.communicate("")
+        self.assertEqual(process.returncode, 0, stderr)
+
+    def test_address(self) -> None:
+        """Servers are keyed on the import path and preloaded modules"""
+        address = forkserver.persistent_address(["pytest"], self.env)
+
+        self.assertEqual(address, forkserver.persistent_address(["pytest"], self.env))
+        self.assertNotEqual(address, forkserver.persistent_address(["json"], self.env))
+        self.assertNotEqual(address, forkserver.persistent_address(["pytest"], {}))
+
+        runtime_dir = Path(address).parent
+        self.assertEqual(runtime_dir, forkserver.runtime_dir())
+        self.assertEqual(runtime_dir.stat().st_uid, os.getuid())
+        self.assertEqual(runtime_dir.stat().st_mode & 0o777, 0o700)
+
+    def test_shared_runtime_dir(self) -> None:
+        """Sockets are not created in directories accessible to other users"""
+        shared_dir = self.tmp_dir / f"pytest-forkserver-{os.getuid()}"
+        shared_dir.mkdir(mode=0o755)
+        shared_dir.chmod(0o755)
+
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": str(self.tmp_dir)}):
+            with self.assertRaises(PermissionError):
+                forkserver.runtime_dir()
+
+    def test_other_user(self) -> None:
+        """Clients refuse servers which belong to other users"""
+        address = str(self.tmp_dir / "server.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(address)
+            server.listen()
+            with mock.patch.object(
+                forkserver, "_peer_uid", return_value=os.getuid() + 1
+            ):
+                with self.assertRaises(PermissionError):
+                    forkserver.Client(address, ["-c", "pass"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,6 @@
+"""A test file which is grouped with others by `py_pytest_test_suite`"""
+
+
+def test_b() -> None:
+    """Test files in a group are run by the same target"""
+    assert __name__.endswith("b_test")
@@ -0,0 +1,153 @@
+"""Tests for the import_time.py module"""
+
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from python.pytest.private import import_time
+
+LOG = """\
+import time: self [us] | cumulative | imported package
+import time:        10 |         10 |     pkg.inner
+import time:        20 |         30 |   pkg.sub
+import time:         5 |          5 |   other.helper
+import time:       100 |        135 | pkg
+import time:        50 |         50 | other
+"""
+
+
+class TestParseLog(unittest.TestCase):
+    """Test cases for `import_time.parse_log`"""
+
+    def test_tree(self) -> None:
+        """Nested imports are attached to the import which triggered them"""
+        roots = import_time.parse_log(LOG.splitlines())
+
+        self.assertListEqual([root.name for root in roots], ["pkg", "other"])
+        pkg = roots[0]
+        self.assertEqual((pkg.self_us, pkg.cumulative_us), (100, 135))
+        self.assertListEqual(
+            [child.name for child in pkg.children], ["pkg.sub", "other.helper"]
+        )
+        self.assertListEqual(
+            [child.name for child in pkg.children[0].children], ["pkg.inner"]
+        )
+        self.assertListEqual(roots[1].children, [])
+
+    def test_other_output(self) -> None:
+        """Lines which are not import times are ignored"""
+        lines = ["Traceback (most recent call last):"] + LOG.splitlines()
+
+        self.assertEqual(len(import_time.parse_log(lines)), 2)
+        self.assertListEqual(import_time.parse_log([]), [])
+
+
+class TestReport(unittest.TestCase):
+    """Test cases for summarizing import times"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="import_time_test-"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_top_modules(self) -> None:
+        """Self times are summed across processes"""
+        processes = {
+            "pytest": import_time.parse_log(LOG.splitlines()),
+            "worker-1": import_time.parse_log(LOG.splitlines()),
+        }
+
+        self.assertListEqual(
+            import_time.top_modules(processes, count=3),
+            [("pkg", 200, 2), ("other", 100, 2), ("pkg.sub", 40, 2)],
+        )
+
+    def test_top_packages(self) -> None:
+        """Modules are attributed to their top level package"""
+        processes = {"pytest": import_time.parse_log(LOG.splitlines())}
+
+        self.assertListEqual(
+            import_time.top_packages(processes), [("pkg", 130), ("other", 55)]
+        )
+
+    def test_format_tree(self) -> None:
+        """Imports are sorted by cumulative time at each level"""
+        lines = import_time.format_tree(import_time.parse_log(LOG.splitlines()))
+
+        self.assertListEqual(
+            [line.split()[-1] for line in lines],
+            ["pkg", "pkg.sub", "pkg.inner", "other.helper", "other"],
+        )
+        self.assertTrue(lines[2].endswith("    pkg.inner"))
+
+    def test_write_report(self) -> None:
+        """A report is written for the logs of all processes"""
+        log_dir = self.tmp_dir / "import_time"
+        log_dir.mkdir()
+        (log_dir / "pytest.txt").write_text(LOG, encoding="utf-8")
+        (log_dir / "worker-1.txt").write_text(LOG, encoding="utf-8")
+        output = self.tmp_dir / "pytest_import_time.txt"
+
+        import_time.write_report(log_dir, output)
+
+        report = output.read_text(encoding="utf-8")
+        self.assertIn("summed across 2 process(es)", report)
+        self.assertIn("pytest: 5 modules imported in 185us", report)
+        self.assertIn("worker-1: 5 modules imported in 185us", report)
+
+
+class TestRun(unittest.TestCase):
+    """Test cases for running interpreters with `-X importtime`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="import_time_test-"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_split_stderr(self) -> None:
+        """Import times are logged and all other output is forwarded"""
+        stderr = io.BytesIO(
+            b"import time: 1 | 1 | a\nwarning\nimport time: 2 | 3 | b\n"
+        )
+        log = io.BytesIO()
+        output = io.BytesIO()
+
+        import_time.split_stderr(stderr, log, output)
+
+        self.assertEqual(
+            log.getvalue(), b"import time: 1 | 1 | a\nimport time: 2 | 3 | b\n"
+        )
+        self.assertEqual(output.getvalue(), b"warning\n")
+
+    def test_run(self) -> None:
+        """The imports of the process are logged"""
+        log_file = self.tmp_dir / "pytest.txt"
+
+        exit_code = import_time.run(
+            ["-c", "import json, sys; sys.exit(3)"], log_file, cwd=self.tmp_dir
+        )
+
+        self.assertEqual(exit_code, 3)
+        names = {
+            node.name
+            for root in import_time.parse_log(
+                log_file.read_text(encoding="utf-8").splitlines()
+            )
+            for node in root.walk()
+        }
+        self.assertIn("json", names)
+
+    def test_parse_args(self) -> None:
+        """The interpreter arguments of the launcher follow `--`"""
+        args = import_time.parse_args(["--log-dir=/tmp/logs", "--", "-c", "pass"])
+
+        self.assertEqual(args.log_dir, Path("/tmp/logs"))
+        self.assertListEqual(args.args, ["-c", "pass"])
+
+
+if __name__ == "__main__":
+    unittest.main()
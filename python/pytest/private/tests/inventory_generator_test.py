@@ -0,0 +1,91 @@
+"""Tests for the inventory_generator.py script"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path, PurePosixPath
+
+import python.pytest.private.inventory_generator as generator
+
+
+class TestInventoryGenerator(unittest.TestCase):
+    """Test cases for the inventory generator"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="inventory_generator_test-"))
+        self.cwd = os.getcwd()
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_link_runfiles(self) -> None:
+        """Runfiles are linked at their rlocationpaths"""
+        source = self.tmp_dir / "src" / "test_a.py"
+        source.parent.mkdir()
+        source.write_text("", encoding="utf-8")
+
+        generator.link_runfiles(
+            [(source, PurePosixPath("_main/pkg/test_a.py"))], self.tmp_dir / "runfiles"
+        )
+
+        link = self.tmp_dir / "runfiles" / "_main" / "pkg" / "test_a.py"
+        self.assertTrue(link.is_symlink())
+        self.assertEqual(link.resolve(), source.resolve())
+
+    def test_collect(self) -> None:
+        """Node IDs, markers and parametrizations are recorded"""
+        (self.tmp_dir / "pytest.ini").write_text("[pytest]\n", encoding="utf-8")
+        source = self.tmp_dir / "test_a.py"
+        source.write_text(
+            "import pytest\n\n"
+            "def test_plain():\n    pass\n\n"
+            "@pytest.mark.slow\n"
+            "@pytest.mark.parametrize('value', [1, 2])\n"
+            "def test_param(value):\n    pass\n",
+            encoding="utf-8",
+        )
+        os.chdir(self.tmp_dir)
+
+        exit_code, recorder, _ = generator.collect(
+            [source], self.tmp_dir / "pytest.ini", self.tmp_dir
+        )
+
+        self.assertEqual(exit_code, 0)
+        self.assertListEqual(recorder.errors, [])
+        self.assertListEqual(
+            recorder.tests,
+            [
+                {"nodeid": "test_a.py::test_plain", "markers": [], "parametrize": None},
+                {
+                    "nodeid": "test_a.py::test_param[1]",
+                    "markers": ["parametrize", "slow"],
+                    "parametrize": "1",
+                },
+                {
+                    "nodeid": "test_a.py::test_param[2]",
+                    "markers": ["parametrize", "slow"],
+                    "parametrize": "2",
+                },
+            ],
+        )
+
+    def test_collection_errors(self) -> None:
+        """Collection errors are recorded"""
+        (self.tmp_dir / "pytest.ini").write_text("[pytest]\n", encoding="utf-8")
+        source = self.tmp_dir / "test_b.py"
+        source.write_text("import missing_module_for_test\n", encoding="utf-8")
+        os.chdir(self.tmp_dir)
+
+        exit_code, recorder, output = generator.collect(
+            [source], self.tmp_dir / "pytest.ini", self.tmp_dir
+        )
+
+        self.assertNotEqual(exit_code, 0)
+        self.assertEqual(len(recorder.errors), 1)
+        self.assertIn("missing_module_for_test", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Tests for the junit.py module"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from xml.etree import ElementTree
+
+from python.pytest.private import junit
+
+JUNIT_XML = """\
+<?xml version="1.0" encoding="utf-8"?>
+<testsuites name="pytest tests">
+<testsuite name="pytest" errors="1" failures="1" skipped="0" tests="4" time="1.5" hostname="host">
+<properties><property name="key" value="value" /></properties>
+<testcase classname="pkg.a_test" name="test_a" time="0.5"><failure message="x" /></testcase>
+<testcase classname="pkg.b_test.TestB" name="test_b" time="0.25" />
+<testcase classname="pkg.a_test.TestA" name="test_c" time="0.5" />
+<testcase classname="" name="pkg.c_test" time="0.25"><error message="y" /></testcase>
+</testsuite>
+</testsuites>
+"""
+
+
+class TestSplitJunitTestsuites(unittest.TestCase):
+    """Test cases for `junit.split_junit_testsuites`"""
+
+    def setUp(self) -> None:
+        self.temp_dir = Path(tempfile.mkdtemp(dir=os.environ.get("TEST_TMPDIR", None)))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def test_split(self) -> None:
+        """Each test file is reported as its own testsuite"""
+        xml_file = self.temp_dir / "test.xml"
+        xml_file.write_text(JUNIT_XML, encoding="utf-8")
+
+        junit.split_junit_testsuites(
+            xml_file, ["pkg/a_test.py", "pkg/b_test.py", "pkg/c_test.py"]
+        )
+
+        suites = ElementTree.parse(xml_file).getroot().findall("testsuite")
+        self.assertListEqual(
+            [
+                (
+                    suite.get("name"),
+                    suite.get("tests"),
+                    suite.get("failures"),
+                    suite.get("errors"),
+                    suite.get("time"),
+                    suite.get("hostname"),
+                )
+                for suite in suites
+            ],
+            [
+                ("pkg/a_test.py", "2", "1", "0", "1.000", "host"),
+                ("pkg/b_test.py", "1", "0", "0", "0.250", "host"),
+                ("pkg/c_test.py", "1", "0", "1", "0.250", "host"),
+            ],
+        )
+        for suite in suites:
+            self.assertIsNotNone(suite.find("properties/property[@name='key']"))
+
+    def test_unknown_file(self) -> None:
+        """Tests which match no test file keep the original testsuite name"""
+        xml_file = self.temp_dir / "test.xml"
+        xml_file.write_text(JUNIT_XML, encoding="utf-8")
+
+        junit.split_junit_testsuites(xml_file, ["pkg/a_test.py"])
+
+        suites = ElementTree.parse(xml_file).getroot().findall("testsuite")
+        self.assertListEqual(
+            [(suite.get("name"), suite.get("tests")) for suite in suites],
+            [("pkg/a_test.py", "2"), ("pytest", "2")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
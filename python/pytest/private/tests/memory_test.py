@@ -0,0 +1,67 @@
+"""Tests for the memory.py module"""
+
+import tracemalloc
+import unittest
+
+from python.pytest.private import memory
+
+
+def allocate() -> bytearray:
+    """A function to find in allocations."""
+    return bytearray(4 * 1024 * 1024)
+
+
+class TestPeakRss(unittest.TestCase):
+    """Test cases for measuring the peak RSS of the process"""
+
+    def test_peak_rss(self) -> None:
+        """The peak RSS is at least the memory in use"""
+        peak = memory.peak_rss()
+
+        self.assertIsNotNone(peak)
+        assert peak is not None
+        self.assertGreater(peak, 1024 * 1024)
+
+    def test_reset_peak_rss(self) -> None:
+        """The peak RSS is never greater once reset"""
+        before = memory.peak_rss()
+        assert before is not None
+
+        memory.reset_peak_rss()
+
+        after = memory.peak_rss()
+        assert after is not None
+        self.assertLessEqual(after, before)
+
+    def test_megabytes(self) -> None:
+        """Sizes are converted to megabytes to one decimal place"""
+        self.assertEqual(memory.megabytes(0), 0.0)
+        self.assertEqual(memory.megabytes(1536 * 1024), 1.5)
+
+
+class TestTopAllocations(unittest.TestCase):
+    """Test cases for `memory.top_allocations`"""
+
+    def setUp(self) -> None:
+        tracemalloc.start()
+
+    def tearDown(self) -> None:
+        tracemalloc.stop()
+
+    def test_top_allocations(self) -> None:
+        """The largest allocations are reported by source line"""
+        data = allocate()
+
+        allocations = memory.top_allocations(tracemalloc.take_snapshot(), count=1)
+
+        self.assertEqual(len(allocations), 1)
+        self.assertIn(
+            f"memory_test.py:{allocate.__code__.co_firstlineno + 2}",
+            allocations[0]["location"],
+        )
+        self.assertGreaterEqual(allocations[0]["size_kb"], 4096)
+        del data
+
+
+if __name__ == "__main__":
+    unittest.main()
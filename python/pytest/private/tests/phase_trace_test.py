@@ -0,0 +1,108 @@
+"""Tests for the phase_trace.py module"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from python.pytest.private import phase_trace
+
+
+class TestTracer(unittest.TestCase):
+    """Test cases for `phase_trace.Tracer`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="phase_trace_test-"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_span(self) -> None:
+        """Nested spans are recorded as complete events when they end"""
+        tracer = phase_trace.Tracer("wrapper")
+        with tracer.span("outer", "wrapper"):
+            with tracer.span("inner", "wrapper", {"detail": 1}):
+                pass
+
+        self.assertEqual(len(tracer.events), 2)
+        inner, outer = tracer.events  # pylint: disable=unbalanced-tuple-unpacking
+        self.assertEqual(inner["name"], "inner")
+        self.assertEqual(inner["args"], {"detail": 1})
+        self.assertEqual(outer["name"], "outer")
+        self.assertNotIn("args", outer)
+        for event in tracer.events:
+            self.assertEqual(event["ph"], "X")
+            self.assertEqual(event["pid"], os.getpid())
+        self.assertLessEqual(outer["ts"], inner["ts"])
+        self.assertGreaterEqual(outer["ts"] + outer["dur"], inner["ts"] + inner["dur"])
+
+    def test_span_raises(self) -> None:
+        """Spans are recorded for blocks which raise"""
+        tracer = phase_trace.Tracer("wrapper")
+        with self.assertRaises(RuntimeError):
+            with tracer.span("failing", "wrapper"):
+                raise RuntimeError("failed")
+
+        self.assertEqual([event["name"] for event in tracer.events], ["failing"])
+
+    def test_write_replaces(self) -> None:
+        """Writing again replaces the spans of the process"""
+        tracer = phase_trace.Tracer("wrapper")
+        tracer.add(phase_trace.Span("first", "wrapper", 10, 20))
+        path = tracer.write(self.tmp_dir)
+        tracer.add(phase_trace.Span("second", "wrapper", 30, 40))
+        self.assertEqual(tracer.write(self.tmp_dir), path)
+
+        content = json.loads(path.read_text(encoding="utf-8"))
+        self.assertEqual(
+            [event["name"] for event in content["events"]], ["first", "second"]
+        )
+
+    def test_merge(self) -> None:
+        """The spans of all processes are merged in order"""
+        wrapper = phase_trace.Tracer("pytest_process_wrapper")
+        wrapper.add(phase_trace.Span("parse_args", "wrapper", 10, 20))
+        wrapper.write(self.tmp_dir)
+
+        # A pytest-xdist worker.
+        (self.tmp_dir / "99999.pytest-gw0.json").write_text(
+            json.dumps(
+                {
+                    "name": "pytest-gw0",
+                    "pid": 99999,
+                    "events": [
+                        {"name": "call", "ph": "X", "ts": 15, "dur": 1, "pid": 99999}
+                    ],
+                }
+            ),
+            encoding="utf-8",
+        )
+
+        # pytest run by the wrapper's process, which started after it.
+        pytest_tracer = phase_trace.Tracer("pytest")
+        pytest_tracer.add(phase_trace.Span("runtestloop", "pytest", 30, 50))
+        pytest_tracer.add(phase_trace.Span("collection", "pytest", 25, 30))
+        pytest_tracer.write(self.tmp_dir)
+
+        output = self.tmp_dir / "trace.json"
+        phase_trace.merge(self.tmp_dir, output)
+
+        trace = json.loads(output.read_text(encoding="utf-8"))
+        metadata = [event for event in trace["traceEvents"] if event["ph"] == "M"]
+        self.assertDictEqual(
+            {event["pid"]: event["args"]["name"] for event in metadata},
+            {
+                os.getpid(): "pytest_process_wrapper > pytest",
+                99999: "pytest-gw0",
+            },
+        )
+        self.assertListEqual(
+            [event["name"] for event in trace["traceEvents"] if event["ph"] == "X"],
+            ["parse_args", "call", "collection", "runtestloop"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""Tests for the plugin_list_generator.py script"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import python.pytest.private.plugin_list_generator as generator
+
+
+class TestReadPlugins(unittest.TestCase):
+    """Test cases for `plugin_list_generator.read_plugins`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="plugin_list_generator_test-"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def write_entry_points(self, dist: str, content: str) -> Path:
+        """Write the `entry_points.txt` of a distribution."""
+        path = self.tmp_dir / f"{dist}.dist-info" / "entry_points.txt"
+        path.parent.mkdir()
+        path.write_text(content, encoding="utf-8")
+        return path
+
+    def test_read_plugins(self) -> None:
+        """Only `pytest11` entry points are collected, keeping their case"""
+        entry_points = [
+            self.write_entry_points(
+                "pytest_xdist-3.0.0",
+                "[pytest11]\nxdist = xdist.plugin\nxdist.looponfail = xdist.looponfail\n",
+            ),
+            self.write_entry_points(
+                "other-1.0.0",
+                "[console_scripts]\nother = other:main\n\n"
+                "[pytest11]\nOther = other.plugins:Plugin\n",
+            ),
+            self.write_entry_points(
+                "tool-1.0.0", "[console_scripts]\ntool = tool:main\n"
+            ),
+        ]
+
+        self.assertDictEqual(
+            generator.read_plugins(entry_points),
+            {
+                "xdist": "xdist.plugin",
+                "xdist.looponfail": "xdist.looponfail",
+                "Other": "other.plugins:Plugin",
+            },
+        )
+
+    def test_duplicate_names(self) -> None:
+        """The first distribution declaring a plugin name wins"""
+        entry_points = [
+            self.write_entry_points("a-1.0.0", "[pytest11]\nplugin = a.plugin\n"),
+            self.write_entry_points("b-1.0.0", "[pytest11]\nplugin = b.plugin\n"),
+        ]
+
+        self.assertDictEqual(
+            generator.read_plugins(entry_points), {"plugin": "a.plugin"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""Tests for the precompiler.py module"""
+
+import importlib.util
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict
+from unittest import mock
+
+from _pytest.assertion.rewrite import PYTEST_TAG
+
+from python.pytest.private import precompiler, pycache
+from python.pytest.private.pytest_bazel_plugin import read_pyc
+
+SOURCE = b"def test_answer():\n    value = 41\n    assert value == 42\n"
+
+
+class TestPrecompiler(unittest.TestCase):
+    """Test cases for the precompiler"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="precompiler_test-"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pyc_name(self) -> None:
+        """Rewritten bytecode is named as pytest caches it"""
+        rlocationpath = PurePosixPath("_main/pkg/test_a.py")
+        self.assertEqual(
+            precompiler.pyc_name(rlocationpath, rewrite=False),
+            PurePosixPath(f"_main/pkg/test_a.{sys.implementation.cache_tag}.pyc"),
+        )
+        self.assertEqual(
+            precompiler.pyc_name(rlocationpath, rewrite=True),
+            PurePosixPath(f"_main/pkg/test_a.{PYTEST_TAG}.pyc"),
+        )
+
+    def test_pyc_data(self) -> None:
+        """A checked hash based pyc is written"""
+        code = precompiler.compile_source(SOURCE, "test_a.py", rewrite=False)
+        data = precompiler.pyc_data(code, SOURCE)
+
+        self.assertEqual(data[:4], importlib.util.MAGIC_NUMBER)
+        self.assertEqual(int.from_bytes(data[4:8], "little"), 0b11)
+        self.assertEqual(data[8:16], importlib.util.source_hash(SOURCE))
+
+    def test_read_rewritten_pyc(self) -> None:
+        """Rewritten bytecode is loaded with the location of its source"""
+        source = self.tmp_dir / "test_a.py"
+        source.write_bytes(SOURCE)
+        pyc = self.tmp_dir / "test_a.pyc"
+        code = precompiler.compile_source(SOURCE, "_main/test_a.py", rewrite=True)
+        pyc.write_bytes(precompiler.pyc_data(code, SOURCE))
+
+        loaded = read_pyc(source, pyc)
+        assert loaded is not None
+        self.assertEqual(loaded.co_filename, str(source))
+
+        namespace: Dict[str, Any] = {}
+        exec(loaded, namespace)  # pylint: disable=exec-used
+        with self.assertRaises(AssertionError) as error:
+            namespace["test_answer"]()
+        self.assertIn("assert 41 == 42", str(error.exception))
+
+    def test_read_stale_pyc(self) -> None:
+        """Bytecode of a modified source is not loaded"""
+        source = self.tmp_dir / "test_a.py"
+        source.write_bytes(SOURCE)
+        pyc = self.tmp_dir / "test_a.pyc"
+        code = precompiler.compile_source(SOURCE, "test_a.py", rewrite=True)
+        pyc.write_bytes(precompiler.pyc_data(code, SOURCE))
+
+        source.write_bytes(SOURCE.replace(b"41", b"42"))
+        self.assertIsNone(read_pyc(source, pyc))
+
+    def test_interpreter(self) -> None:
+        """Bytecode is only used by the interpreter which precompiled it"""
+        runfiles_dir = self.tmp_dir / "runfiles"
+        (runfiles_dir / "_main").mkdir(parents=True)
+        (runfiles_dir / "_main" / "test_a.py").write_bytes(SOURCE)
+        sources = self.tmp_dir / "sources.txt"
+        sources.write_text(
+            f"{runfiles_dir / '_main' / 'test_a.py'}\t_main/test_a.py\n",
+            encoding="utf-8",
+        )
+        output = self.tmp_dir / "pycache"
+        argv = ["precompiler", f"--sources={sources}", f"--output={output}"]
+        with mock.patch.object(sys, "argv", argv):
+            precompiler.main()
+
+        self.assertTrue(
+            pycache.link_pycache([output], runfiles_dir, self.tmp_dir / "prefix")
+        )
+
+        interpreter_file = output / precompiler.INTERPRETER_FILE
+        other = dict(precompiler.interpreter(), magic_number="00000000")
+        interpreter_file.write_text(json.dumps(other), encoding="utf-8")
+        self.assertFalse(
+            pycache.link_pycache([output], runfiles_dir, self.tmp_dir / "other_prefix")
+        )
+        self.assertFalse((self.tmp_dir / "other_prefix").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
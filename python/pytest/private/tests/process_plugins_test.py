@@ -0,0 +1,388 @@
+"""Tests for the process_plugins.py pytest plugins"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest import mock
+from xml.etree import ElementTree
+
+import pytest
+
+from python.pytest.private import phase_trace, plugin_env, process_plugins
+
+
+class TestPhaseTracer(unittest.TestCase):
+    """Test cases for `pytest_process_plugins.PhaseTracer`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="process_plugins_test-"))
+        self.trace_dir = self.tmp_dir / "trace"
+        self.trace_dir.mkdir()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_trace(self) -> None:
+        """The phases of the session and of each test are recorded and merged"""
+        test_file = self.tmp_dir / "test_traced.py"
+        test_file.write_text("def test_one():\n    pass\n", encoding="utf-8")
+        output = self.tmp_dir / "pytest_trace.json"
+        tracer = process_plugins.PhaseTracer(
+            phase_trace.Tracer("pytest"),
+            self.trace_dir,
+            phase_trace.now(),
+            output,
+        )
+
+        exit_code = pytest.main(
+            [
+                "-q",
+                "-p",
+                "no:cacheprovider",
+                "--rootdir",
+                str(self.tmp_dir),
+                "-c",
+                os.devnull,
+                str(test_file),
+            ],
+            plugins=[tracer],
+        )
+
+        self.assertEqual(exit_code, pytest.ExitCode.OK)
+        trace = json.loads(output.read_text(encoding="utf-8"))
+        self.assertListEqual(
+            [event["name"] for event in trace["traceEvents"] if event["ph"] == "X"],
+            [
+                "startup",
+                "collection",
+                "runtestloop",
+                "test_traced.py::test_one",
+                "setup",
+                "call",
+                "teardown",
+                "sessionfinish",
+            ],
+        )
+
+
+class TestMemoryRecorder(unittest.TestCase):
+    """Test cases for `pytest_process_plugins.MemoryRecorder`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="process_plugins_test-"))
+        self.test_file = self.tmp_dir / "test_memory.py"
+        self.test_file.write_text(
+            "def test_one():\n    assert bytearray(1024 * 1024)\n", encoding="utf-8"
+        )
+        self.output = self.tmp_dir / "pytest_memory.json"
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def run_pytest(self, recorder: process_plugins.MemoryRecorder) -> int:
+        """Run the test file with a memory recorder."""
+        return pytest.main(
+            [
+                "-q",
+                "-p",
+                "no:cacheprovider",
+                "--import-mode=importlib",
+                "--rootdir",
+                str(self.tmp_dir),
+                "-c",
+                os.devnull,
+                str(self.test_file),
+            ],
+            plugins=[recorder],
+        )
+
+    def test_record(self) -> None:
+        """The peak RSS of each test and process is written"""
+        exit_code = self.run_pytest(
+            process_plugins.MemoryRecorder("pytest", False, None, self.output)
+        )
+
+        self.assertEqual(exit_code, pytest.ExitCode.OK)
+        report = json.loads(self.output.read_text(encoding="utf-8"))
+        self.assertIsNone(report["max_memory_mb"])
+        self.assertListEqual(list(report["processes"]), ["pytest"])
+        self.assertEqual(report["peak_rss_mb"], report["processes"]["pytest"])
+        self.assertGreater(
+            report["tests"]["test_memory.py::test_one"]["peak_rss_mb"], 0
+        )
+
+    def test_allocations(self) -> None:
+        """The top allocations of each test are recorded when tracing"""
+        tracemalloc.start()
+        try:
+            exit_code = self.run_pytest(
+                process_plugins.MemoryRecorder("pytest", True, None, self.output)
+            )
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(exit_code, pytest.ExitCode.OK)
+        report = json.loads(self.output.read_text(encoding="utf-8"))
+        allocations = report["tests"]["test_memory.py::test_one"]["top_allocations"]
+        self.assertTrue(allocations)
+        self.assertTrue(
+            all(allocation["location"] for allocation in allocations), allocations
+        )
+
+    def test_budget(self) -> None:
+        """Tests fail when the budget is exceeded"""
+        exit_code = self.run_pytest(
+            process_plugins.MemoryRecorder("pytest", False, 1, self.output)
+        )
+
+        self.assertEqual(exit_code, pytest.ExitCode.TESTS_FAILED)
+        report = json.loads(self.output.read_text(encoding="utf-8"))
+        self.assertEqual(report["max_memory_mb"], 1)
+
+
+class TestTimeoutWatchdog(unittest.TestCase):
+    """Test cases for `pytest_process_plugins.TimeoutWatchdog`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="process_plugins_test-"))
+        self.test_file = self.tmp_dir / "test_watchdog.py"
+        self.test_file.write_text(
+            "import time\n"
+            "import pytest\n"
+            "def test_pass():\n    pass\n"
+            "def test_fail():\n    assert False\n"
+            "@pytest.mark.skip(reason='not today')\n"
+            "def test_skip():\n    pass\n"
+            "def test_slow():\n    time.sleep(2.0)\n",
+            encoding="utf-8",
+        )
+        self.xml_file = self.tmp_dir / "test.xml"
+        self.stacks = self.tmp_dir / "stacks.txt"
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def run_pytest(self, deadline: float) -> int:
+        """Run the test file with a watchdog."""
+        return pytest.main(
+            [
+                "-q",
+                "-p",
+                "no:cacheprovider",
+                "--import-mode=importlib",
+                "--rootdir",
+                str(self.tmp_dir),
+                "-c",
+                os.devnull,
+                str(self.test_file),
+            ],
+            plugins=[
+                process_plugins.TimeoutWatchdog(
+                    deadline,
+                    self.stacks.open("w", encoding="utf-8"),
+                    self.xml_file,
+                )
+            ],
+        )
+
+    def read_testcases(self) -> Dict[str, ElementTree.Element]:
+        """The test cases of the partial JUnit XML report by name."""
+        return {
+            str(testcase.get("name")): testcase
+            for testcase in ElementTree.parse(self.xml_file).iter("testcase")
+        }
+
+    def test_partial_report(self) -> None:
+        """The results of each test are written as they complete"""
+        exit_code = self.run_pytest(time.time() + 300)
+
+        self.assertEqual(exit_code, pytest.ExitCode.TESTS_FAILED)
+        testcases = self.read_testcases()
+        self.assertListEqual(
+            list(testcases), ["test_pass", "test_fail", "test_skip", "test_slow"]
+        )
+        self.assertEqual(testcases["test_pass"].get("classname"), "test_watchdog")
+        self.assertListEqual(list(testcases["test_pass"]), [])
+        failure = testcases["test_fail"].find("failure")
+        assert failure is not None
+        self.assertEqual(failure.get("message"), "assert False")
+        skipped = testcases["test_skip"].find("skipped")
+        assert skipped is not None
+        self.assertEqual(skipped.get("message"), "not today")
+        self.assertEqual(self.stacks.read_text(encoding="utf-8"), "")
+
+    def test_deadline(self) -> None:
+        """Tests still running at the deadline are reported as errors"""
+        self.run_pytest(time.time() + 1.0)
+
+        testcases = self.read_testcases()
+        self.assertListEqual(
+            list(testcases), ["test_pass", "test_fail", "test_skip", "test_slow"]
+        )
+        error = testcases["test_slow"].find("error")
+        assert error is not None
+        self.assertIn("TEST_TIMEOUT", str(error.get("message")))
+
+        stacks = self.stacks.read_text(encoding="utf-8")
+        self.assertIn("test_watchdog.py::test_slow", stacks)
+        self.assertRegex(stacks, r'test_watchdog.py", line \d+ in test_slow')
+
+
+class TestPartitionCollection(unittest.TestCase):
+    """Test cases for `pytest_process_plugins.PartitionCollection`"""
+
+    @staticmethod
+    def node(workerid: str) -> Any:
+        """A pytest-xdist worker of a session with two workers."""
+        return mock.Mock(
+            workerinput={"workerid": workerid, "workercount": 2},
+            gateway=types.SimpleNamespace(id=workerid, spec="popen"),
+        )
+
+    def test_configure_node(self) -> None:
+        """Workers are assigned partitions in order and replacements reuse theirs"""
+        plugin = process_plugins.PartitionCollection()
+        nodes = [self.node(f"gw{index}") for index in range(3)]
+        plugin.pytest_configure_node(nodes[0])
+        plugin.pytest_configure_node(nodes[1])
+        plugin.pytest_testnodedown(nodes[0], None)
+        plugin.pytest_testnodedown(nodes[1], "Not properly terminated")
+        plugin.pytest_configure_node(nodes[2])
+
+        partitions = [
+            node.workerinput[process_plugins.PARTITION_WORKER_INPUT] for node in nodes
+        ]
+        self.assertListEqual(partitions, [[2, 0], [2, 1], [2, 1]])
+
+    def test_scheduling(self) -> None:
+        """Crashed workers are replaced by the worker collecting the same partition"""
+        plugin = process_plugins.PartitionCollection()
+        session = types.SimpleNamespace(testscollected=0)
+        plugin.pytest_sessionstart(session)  # type: ignore[arg-type]
+        config = mock.Mock(getvalue=mock.Mock(return_value=["2*popen"]))
+        scheduler = plugin.pytest_xdist_make_scheduler(config, None)
+
+        nodes = [self.node(f"gw{index}") for index in range(4)]
+        collections: List[List[str]] = [
+            ["test_a.py::test_1", "test_a.py::test_2"],
+            ["test_b.py::test_1", "test_b.py::test_2"],
+        ]
+        for node, collection in zip(nodes, collections):
+            plugin.pytest_configure_node(node)
+            scheduler.add_node(node)
+            scheduler.add_node_collection(node, collection)
+        scheduler.schedule()
+        self.assertEqual(session.testscollected, 4)
+
+        for dead, replacement in zip(nodes, nodes[2:]):
+            plugin.pytest_testnodedown(dead, "Not properly terminated")
+            scheduler.remove_node(dead)
+            plugin.pytest_configure_node(replacement)
+
+        scheduler.add_node(nodes[3])
+        scheduler.add_node_collection(nodes[3], collections[1])
+        self.assertListEqual(scheduler.node2pending[nodes[3]], [1])
+        scheduler.add_node(nodes[2])
+        scheduler.add_node_collection(nodes[2], collections[0])
+        self.assertListEqual(scheduler.node2pending[nodes[2]], [1])
+
+    def test_worker_crash(self) -> None:
+        """The remaining tests of a crashed worker are run by its replacement"""
+        with tempfile.TemporaryDirectory(prefix="process_plugins_test-") as tmp:
+            tmp_dir = Path(tmp)
+            (tmp_dir / "test_a.py").write_text(
+                "def test_1():\n    pass\ndef test_2():\n    pass\n",
+                encoding="utf-8",
+            )
+            # The worker crashes once the other has finished its partition.
+            (tmp_dir / "test_b.py").write_text(
+                "import os\n"
+                "import time\n"
+                "from pathlib import Path\n"
+                "def test_1():\n    pass\n"
+                "def test_2():\n"
+                "    crashed = Path(__file__).with_name('crashed')\n"
+                "    if not crashed.exists():\n"
+                "        crashed.touch()\n"
+                "        time.sleep(1.0)\n"
+                "        os._exit(1)\n"
+                "def test_3():\n    pass\n",
+                encoding="utf-8",
+            )
+            nodeids = [
+                f"test_{name}.py::test_{index}" for name in "ab" for index in (1, 2)
+            ]
+            nodeids.append("test_b.py::test_3")
+            inventory = tmp_dir / "inventory.json"
+            inventory.write_text(
+                json.dumps(
+                    {
+                        "files": ["test_a.py", "test_b.py"],
+                        "tests": [{"nodeid": nodeid} for nodeid in nodeids],
+                    }
+                ),
+                encoding="utf-8",
+            )
+
+            env = {
+                key: value
+                for key, value in os.environ.items()
+                if not key.startswith(("TEST_", "XML_OUTPUT_FILE", "PY_PYTEST_"))
+            }
+            env["PYTHONPATH"] = os.pathsep.join(sys.path)
+            env[plugin_env.INVENTORY_FILE_ENV] = str(inventory)
+            env[plugin_env.PARTITION_COLLECTION_ENV] = "1"
+            result = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "pytest",
+                    "-p",
+                    "python.pytest.private.pytest_bazel_plugin",
+                    "-p",
+                    "no:cacheprovider",
+                    "-c",
+                    os.devnull,
+                    "--rootdir",
+                    str(tmp_dir),
+                    "--numprocesses=2",
+                    "-rA",
+                    "test_a.py",
+                    "test_b.py",
+                ],
+                cwd=tmp_dir,
+                env=env,
+                capture_output=True,
+                encoding="utf-8",
+                check=False,
+            )
+
+        self.assertEqual(result.returncode, pytest.ExitCode.TESTS_FAILED, result.stdout)
+        outcomes = sorted(
+            line.split(" ")[:2]
+            for line in result.stdout.splitlines()
+            if line.startswith(("PASSED ", "FAILED "))
+        )
+        self.assertListEqual(
+            outcomes,
+            [
+                ["FAILED", "test_b.py::test_2"],
+                ["PASSED", "test_a.py::test_1"],
+                ["PASSED", "test_a.py::test_2"],
+                ["PASSED", "test_b.py::test_1"],
+                ["PASSED", "test_b.py::test_3"],
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+"""Tests for the profiler.py module"""
+
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from python.pytest.private import profiler
+
+
+def wait_for(event: threading.Event) -> None:
+    """A function to find in samples."""
+    event.wait()
+
+
+class TestFrameName(unittest.TestCase):
+    """Test cases for `profiler.frame_name`"""
+
+    def test_relative(self) -> None:
+        """Files within the root are relative to it"""
+        root = os.path.dirname(wait_for.__code__.co_filename)
+        self.assertEqual(
+            profiler.frame_name(wait_for.__code__, root),
+            f"wait_for (profiler_test.py:{wait_for.__code__.co_firstlineno})",
+        )
+
+    def test_absolute(self) -> None:
+        """Files outside of the root are kept as is"""
+        code = wait_for.__code__
+        self.assertEqual(
+            profiler.frame_name(code, "/nonexistent"),
+            f"wait_for ({code.co_filename}:{code.co_firstlineno})",
+        )
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    """Test cases for `profiler.SamplingProfiler`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="profiler_test-"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_sample(self) -> None:
+        """The stacks of other threads are recorded from the outermost frame"""
+        event = threading.Event()
+        thread = threading.Thread(target=wait_for, args=(event,), name="waiter")
+        thread.start()
+        try:
+            sampler = profiler.SamplingProfiler()
+            sampler.sample()
+            sampler.sample()
+        finally:
+            event.set()
+            thread.join()
+
+        stacks = [stack for stack in sampler.stacks if stack.startswith("waiter;")]
+        self.assertEqual(len(stacks), 1)
+        self.assertEqual(sampler.stacks[stacks[0]], 2)
+        self.assertIn(";wait_for (", stacks[0])
+
+    def test_dump_stats(self) -> None:
+        """Samples are written as collapsed stacks, most common first"""
+        sampler = profiler.SamplingProfiler()
+        sampler.stacks.update({"MainThread;a;b": 1, "MainThread;a": 3})
+        output = self.tmp_dir / "pytest.collapsed"
+
+        sampler.dump_stats(output)
+
+        self.assertEqual(
+            output.read_text(encoding="utf-8"), "MainThread;a 3\nMainThread;a;b 1\n"
+        )
+
+    def test_enable(self) -> None:
+        """Sampling runs in the background until disabled"""
+        sampler = profiler.SamplingProfiler(interval=0.001)
+        event = threading.Event()
+        sampler.enable()
+        try:
+            event.wait(0.05)
+        finally:
+            sampler.disable()
+
+        self.assertTrue(sampler.stacks)
+
+
+class TestProfiler(unittest.TestCase):
+    """Test cases for `profiler.Profiler`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="profiler_test-"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cprofile(self) -> None:
+        """cProfile profiles are written as pstats files"""
+        event = threading.Event()
+        event.set()
+        process_profiler = profiler.Profiler("cprofile")
+        process_profiler.enable()
+        wait_for(event)
+        process_profiler.disable()
+
+        path = process_profiler.write(self.tmp_dir / "pytest_profile", "pytest-gw0")
+
+        self.assertEqual(path.name, "pytest-gw0.pstats")
+        stats = pstats.Stats(str(path)).stats  # type: ignore[attr-defined]
+        self.assertIn("wait_for", {func for _, _, func in stats})
+
+    def test_sampling(self) -> None:
+        """Sampled profiles are written as collapsed stacks"""
+        process_profiler = profiler.Profiler("sampling")
+
+        path = process_profiler.write(self.tmp_dir, "pytest")
+
+        self.assertEqual(path.name, "pytest.collapsed")
+        self.assertTrue(path.exists())
+
+    def test_unknown(self) -> None:
+        """Unknown profilers are rejected"""
+        with self.assertRaises(ValueError):
+            profiler.Profiler("perf")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Tests for the pytest_bazel_plugin.py pytest plugin"""
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+
+import python.pytest.private.pytest_bazel_plugin as bazel_plugin
+
+
+class TestLoadPlugins(unittest.TestCase):
+    """Test cases for `pytest_bazel_plugin.load_plugins`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="pytest_bazel_plugin_test-"))
+        self.plugins_file = self.tmp_dir / "plugins.txt"
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_plugins(self) -> None:
+        """Modules and attributes are registered under their entry point names"""
+        self.plugins_file.write_text(
+            "json_plugin=json\ndecoder_plugin=json.decoder:JSONDecoder\n",
+            encoding="utf-8",
+        )
+        pluginmanager = pytest.PytestPluginManager()
+
+        bazel_plugin.load_plugins(pluginmanager, self.plugins_file)
+
+        self.assertIs(pluginmanager.get_plugin("json_plugin"), json)
+        self.assertIs(pluginmanager.get_plugin("decoder_plugin"), json.JSONDecoder)
+
+    def test_blocked_plugins(self) -> None:
+        """Plugins disabled with `-p no:<name>` are not loaded"""
+        self.plugins_file.write_text("json_plugin=json\n", encoding="utf-8")
+        pluginmanager = pytest.PytestPluginManager()
+        pluginmanager.consider_pluginarg("no:json_plugin")
+
+        bazel_plugin.load_plugins(pluginmanager, self.plugins_file)
+
+        self.assertIsNone(pluginmanager.get_plugin("json_plugin"))
+
+
+if __name__ == "__main__":
+    unittest.main()
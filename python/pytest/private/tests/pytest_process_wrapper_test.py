@@ -1,14 +1,18 @@
 """Tests for the pytest_process_wrapper.py process wrapper"""
 
+import contextlib
+import io
+import json
 import os
 import shutil
+import subprocess
+import sys
 import tempfile
 import unittest
-from pathlib import Path
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, List
 from unittest import mock
 
-from python.runfiles import runfiles
-
 import python.pytest.private.pytest_process_wrapper as process_wrapper
 
 WORKSPACE_NAME = "rules_pytest"
@@ -52,7 +56,7 @@ class TestRunPytestArgParsing(unittest.TestCase):
             },
             clear=True,
         ):
-            mock_runfiles = runfiles.Create()
+            mock_runfiles = process_wrapper.RunfilesIndex.create()
             with mock.patch(
                 "python.pytest.private.pytest_process_wrapper.RUNFILES",
                 mock_runfiles,
@@ -82,7 +86,7 @@ class TestRunPytestArgParsing(unittest.TestCase):
             },
             clear=True,
         ):
-            mock_runfiles = runfiles.Create()
+            mock_runfiles = process_wrapper.RunfilesIndex.create()
             with mock.patch(
                 "python.pytest.private.pytest_process_wrapper.RUNFILES",
                 mock_runfiles,
@@ -119,7 +123,7 @@ class TestRunPytestArgParsing(unittest.TestCase):
             },
             clear=True,
         ):
-            mock_runfiles = runfiles.Create()
+            mock_runfiles = process_wrapper.RunfilesIndex.create()
             with mock.patch(
                 "python.pytest.private.pytest_process_wrapper.RUNFILES",
                 mock_runfiles,
@@ -151,7 +155,7 @@ class TestRunPytestArgParsing(unittest.TestCase):
             },
             clear=True,
         ):
-            mock_runfiles = runfiles.Create()
+            mock_runfiles = process_wrapper.RunfilesIndex.create()
             with mock.patch(
                 "python.pytest.private.pytest_process_wrapper.RUNFILES",
                 mock_runfiles,
@@ -183,7 +187,7 @@ class TestRunPytestArgParsing(unittest.TestCase):
             },
             clear=True,
         ):
-            mock_runfiles = runfiles.Create()
+            mock_runfiles = process_wrapper.RunfilesIndex.create()
             with mock.patch(
                 "python.pytest.private.pytest_process_wrapper.RUNFILES",
                 mock_runfiles,
@@ -192,5 +196,259 @@ class TestRunPytestArgParsing(unittest.TestCase):
                     process_wrapper.parse_args(args)
 
 
+class TestPlanWorkers(unittest.TestCase):
+    """Test cases for `pytest_process_wrapper.plan_workers`"""
+
+    def setUp(self) -> None:
+        self.temp_dir = Path(tempfile.mkdtemp(dir=os.environ.get("TEST_TMPDIR", None)))
+        self.inventory = self.temp_dir / "inventory.json"
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.temp_dir))
+
+    def write_inventory(self, count: int) -> None:
+        """Write an inventory of `count` tests."""
+        tests = [{"nodeid": f"test_a.py::test_{idx}"} for idx in range(count)]
+        self.inventory.write_text(json.dumps({"tests": tests}), encoding="utf-8")
+
+    def test_fewer_tests_than_workers(self) -> None:
+        """Workers are limited to the number of tests"""
+        self.write_inventory(3)
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(process_wrapper.plan_workers(self.inventory, 8), 3)
+            self.assertEqual(process_wrapper.plan_workers(self.inventory, 2), 2)
+
+    def test_sharded(self) -> None:
+        """Tests are divided between shards"""
+        self.write_inventory(7)
+        with mock.patch.dict(os.environ, {"TEST_TOTAL_SHARDS": "2"}, clear=True):
+            self.assertEqual(process_wrapper.plan_workers(self.inventory, 8), 4)
+
+    def test_single_test(self) -> None:
+        """A single test is run without pytest-xdist"""
+        self.write_inventory(1)
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(process_wrapper.plan_workers(self.inventory, 8), 0)
+
+
+class TestRunfilesIndex(unittest.TestCase):
+    """Test cases for `pytest_process_wrapper.RunfilesIndex`"""
+
+    def setUp(self) -> None:
+        self.temp_dir = Path(tempfile.mkdtemp(dir=os.environ.get("TEST_TMPDIR", None)))
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.temp_dir))
+        return super().tearDown()
+
+    def test_manifest(self) -> None:
+        """Runfiles are located using the manifest"""
+        manifest = self.temp_dir / "MANIFEST"
+        manifest.write_bytes(
+            b"\n".join(
+                [
+                    b"_main/pkg/a.py /execroot/pkg/a.py",
+                    b"_main/pkg/__init__.py ",
+                    b"_main/tree /execroot/bazel-out/bin/tree",
+                    b" _main/with\\sspace\\bslash.py /execroot/with space\\bslash.py",
+                    b"",
+                ]
+            )
+        )
+
+        index = process_wrapper.RunfilesIndex.create(
+            {"RUNFILES_MANIFEST_FILE": str(manifest), "RUNFILES_DIR": "/unused"}
+        )
+
+        self.assertEqual(index.rlocation("_main/pkg/a.py"), "/execroot/pkg/a.py")
+        self.assertEqual(
+            index.rlocation("_main/pkg/__init__.py"), "_main/pkg/__init__.py"
+        )
+        self.assertEqual(
+            index.rlocation("_main/tree/sub/b.py"),
+            "/execroot/bazel-out/bin/tree/sub/b.py",
+        )
+        self.assertEqual(
+            index.rlocation("_main/with space\\slash.py"),
+            "/execroot/with space\\slash.py",
+        )
+        self.assertIsNone(index.rlocation("_main/pkg/missing.py"))
+
+    def test_directory(self) -> None:
+        """Runfiles are located within the runfiles directory without a manifest"""
+        index = process_wrapper.RunfilesIndex.create(
+            {"RUNFILES_DIR": str(self.temp_dir)}
+        )
+
+        self.assertEqual(
+            index.rlocation("_main/pkg/a.py"),
+            os.path.join(str(self.temp_dir), "_main/pkg/a.py"),
+        )
+
+    def test_not_under_bazel(self) -> None:
+        """An error is raised when there are no runfiles"""
+        with self.assertRaises(EnvironmentError):
+            process_wrapper.RunfilesIndex.create({})
+
+
+class TestRunPytestInProcess(unittest.TestCase):
+    """Test cases for `pytest_process_wrapper.run_pytest_in_process`"""
+
+    def setUp(self) -> None:
+        self.temp_dir = Path(tempfile.mkdtemp(dir=os.environ.get("TEST_TMPDIR", None)))
+        self.cwd = Path.cwd()
+        self.sys_path = list(sys.path)
+
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        sys.path[:] = self.sys_path
+        tempfile.tempdir = None
+        shutil.rmtree(str(self.temp_dir))
+        return super().tearDown()
+
+    def test_environment(self) -> None:
+        """pytest observes the same environment a subprocess would"""
+        observed: Dict[str, Any] = {}
+
+        def _main(args: List[str]) -> int:
+            observed["args"] = args
+            observed["cwd"] = Path.cwd()
+            observed["env"] = dict(os.environ)
+            observed["sys_path"] = sys.path[0]
+            observed["tempdir"] = tempfile.gettempdir()
+            return 1
+
+        temp = self.temp_dir / "tmp"
+        temp.mkdir()
+
+        with mock.patch.dict(os.environ, {"HOME": "/home"}, clear=True):
+            with mock.patch("pytest.main", _main):
+                exit_code = process_wrapper.run_pytest_in_process(
+                    ["-v", "test.py"],
+                    cwd=self.temp_dir,
+                    env={"TMPDIR": str(temp), "MY_VAR": "1"},
+                )
+
+        self.assertEqual(exit_code, 1)
+        self.assertListEqual(observed["args"], ["-v", "test.py"])
+        self.assertEqual(observed["cwd"].resolve(), self.temp_dir.resolve())
+        self.assertDictEqual(observed["env"], {"TMPDIR": str(temp), "MY_VAR": "1"})
+        self.assertEqual(observed["sys_path"], str(self.temp_dir))
+        self.assertEqual(observed["tempdir"], str(temp))
+
+
+class TestExecPytest(unittest.TestCase):
+    """Test cases for `pytest_process_wrapper.exec_pytest`"""
+
+    def setUp(self) -> None:
+        self.temp_dir = Path(tempfile.mkdtemp(dir=os.environ.get("TEST_TMPDIR", None)))
+        self.cwd = Path.cwd()
+
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        shutil.rmtree(str(self.temp_dir))
+        return super().tearDown()
+
+    def test_exec(self) -> None:
+        """The process is replaced by `python -m pytest`"""
+        with mock.patch("os.execve") as mock_execve:
+            process_wrapper.exec_pytest(
+                ["-v", "test.py"], cwd=self.temp_dir, env={"MY_VAR": "1"}
+            )
+
+        mock_execve.assert_called_once_with(
+            sys.executable,
+            [sys.executable, "-m", "pytest", "-v", "test.py"],
+            {"MY_VAR": "1"},
+        )
+        self.assertEqual(Path.cwd().resolve(), self.temp_dir.resolve())
+
+    def test_lazy_coverage_import(self) -> None:
+        """coverage.py is not imported unless coverage is collected"""
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; import python.pytest.private.pytest_process_wrapper; "
+                "print('coverage' in sys.modules)",
+            ],
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+
+        self.assertEqual(result.stdout.decode("utf-8").strip(), "False")
+
+
+class TestRelativizeLcov(unittest.TestCase):
+    """Test cases for rewriting source file paths in lcov reports"""
+
+    def setUp(self) -> None:
+        self.temp_dir = Path(tempfile.mkdtemp(dir=os.environ.get("TEST_TMPDIR", None)))
+
+        self.real_src = self.temp_dir / "execroot" / "lib" / "mod.py"
+        self.real_src.parent.mkdir(parents=True)
+        self.real_src.write_text("", encoding="utf-8")
+
+        self.sandbox_src = self.temp_dir / "runfiles" / "lib" / "mod.py"
+        self.sandbox_src.parent.mkdir(parents=True)
+        try:
+            self.sandbox_src.symlink_to(self.real_src)
+        except OSError:
+            self.skipTest("Symlinks are not supported")
+
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.temp_dir))
+        return super().tearDown()
+
+    def test_relativize_sf(self) -> None:
+        """Both sandboxed and real paths are made relative"""
+        source_map = process_wrapper.lcov_source_map(
+            {self.sandbox_src: PurePosixPath("lib/mod.py")}
+        )
+
+        for src in (self.sandbox_src, self.real_src.resolve()):
+            self.assertEqual(
+                process_wrapper.relativize_sf(f"SF:{src}\n", source_map),
+                "SF:lib/mod.py\n",
+            )
+
+    def test_relativize_sf_unknown(self) -> None:
+        """Lines for unknown sources and other records are unchanged"""
+        source_map = process_wrapper.lcov_source_map(
+            {self.sandbox_src: PurePosixPath("lib/mod.py")}
+        )
+
+        for line in ("SF:/unknown/mod.py\n", "DA:1,1\n", "end_of_record"):
+            self.assertEqual(process_wrapper.relativize_sf(line, source_map), line)
+
+    def test_lcov_writer(self) -> None:
+        """Lcov reports are relativized as they're written"""
+        stream = io.StringIO()
+        writer = process_wrapper.LcovWriter(
+            stream,
+            process_wrapper.lcov_source_map(
+                {self.sandbox_src: PurePosixPath("lib/mod.py")}
+            ),
+        )
+
+        with contextlib.redirect_stdout(writer):
+            print("TN:")
+            print(f"SF:{self.real_src.resolve()}")
+            print("DA:1,1")
+            print("end_of_record")
+
+        self.assertEqual(
+            stream.getvalue(), "TN:\nSF:lib/mod.py\nDA:1,1\nend_of_record\n"
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,21 @@
+"""Tests for running `py_pytest_test` targets with `shard_count`"""
+
+import os
+from pathlib import Path
+
+import pytest
+
+
+@pytest.mark.parametrize("value", range(8))
+def test_sharded(value: int) -> None:
+    """Parameterized tests which are distributed across all shards"""
+    assert value >= 0
+
+
+def test_shard_status_file() -> None:
+    """Test that the process wrapper acknowledged the sharding protocol"""
+    if "TEST_TOTAL_SHARDS" not in os.environ:
+        pytest.skip("The test is not sharded")
+
+    assert int(os.environ["TEST_TOTAL_SHARDS"]) == 3
+    assert Path(os.environ["TEST_SHARD_STATUS_FILE"]).exists()
@@ -0,0 +1,221 @@
+"""Tests for the sharding.py module"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from python.pytest.private import sharding
+
+
+class TestShardItems(unittest.TestCase):
+    """Test cases for `pytest_sharding.shard_items`"""
+
+    def test_partition(self) -> None:
+        """Every item is assigned to exactly one shard"""
+        items = [f"test_{i}" for i in range(10)]
+
+        shards = [sharding.shard_items(items, 3, index) for index in range(3)]
+
+        self.assertListEqual(shards[0], ["test_0", "test_3", "test_6", "test_9"])
+        self.assertListEqual(shards[1], ["test_1", "test_4", "test_7"])
+        self.assertListEqual(shards[2], ["test_2", "test_5", "test_8"])
+        self.assertListEqual(sorted(sum(shards, [])), sorted(items))
+
+    def test_more_shards_than_items(self) -> None:
+        """Shards with no items are allowed"""
+        self.assertListEqual(sharding.shard_items(["test_0"], 4, 3), [])
+
+    def test_invalid_index(self) -> None:
+        """Shard indices must be within the shard count"""
+        with self.assertRaises(ValueError):
+            sharding.shard_items(["test_0"], 2, 2)
+
+    def test_durations(self) -> None:
+        """Durations balance shards instead of distributing items round-robin"""
+        items = ["slow", "fast_0", "fast_1", "fast_2"]
+        durations = [3.0, 1.0, 1.0, 1.0]
+
+        self.assertListEqual(sharding.shard_items(items, 2, 0, durations), ["slow"])
+        self.assertListEqual(
+            sharding.shard_items(items, 2, 1, durations),
+            ["fast_0", "fast_1", "fast_2"],
+        )
+
+
+class TestBalanceItems(unittest.TestCase):
+    """Test cases for `pytest_sharding.balance_items`"""
+
+    def test_longest_first(self) -> None:
+        """Items are packed longest first into the least loaded bin"""
+        items = ["a", "b", "c", "d", "e", "f"]
+        durations = [2.0, 7.0, 4.0, 5.0, 3.0, 3.0]
+
+        bins = sharding.balance_items(items, durations, 3)
+
+        self.assertListEqual(bins, [["a", "b"], ["d", "f"], ["c", "e"]])
+
+    def test_collection_order(self) -> None:
+        """Items within a bin retain their collection order"""
+        bins = sharding.balance_items(["a", "b", "c"], [1.0, 2.0, 3.0], 1)
+
+        self.assertListEqual(bins, [["a", "b", "c"]])
+
+    def test_empty_bins(self) -> None:
+        """More bins than items produces empty bins at the end"""
+        bins = sharding.balance_items(["a", "b"], [1.0, 2.0], 4)
+
+        self.assertListEqual(bins, [["b"], ["a"], [], []])
+
+
+class TestPartitionContiguous(unittest.TestCase):
+    """Test cases for `pytest_sharding.partition_contiguous`"""
+
+    def test_equal_durations(self) -> None:
+        """Items are split into contiguous bins of similar size"""
+        self.assertListEqual(
+            sharding.partition_contiguous([1.0] * 5, 2), [0, 0, 0, 1, 1]
+        )
+
+    def test_durations(self) -> None:
+        """Bins are balanced by duration"""
+        self.assertListEqual(
+            sharding.partition_contiguous([3.0, 1.0, 1.0, 1.0], 2), [0, 1, 1, 1]
+        )
+
+
+class TestShardPlan(unittest.TestCase):
+    """Test cases for `pytest_sharding.ShardPlan`"""
+
+    files = ["test_a.py", "test_b.py", "test_c.py", "test_empty.py"]
+    nodeids = [
+        "test_a.py::test_0",
+        "test_b.py::test_0",
+        "test_c.py::test_0[1]",
+        "test_c.py::test_0[2]",
+    ]
+
+    def test_partition(self) -> None:
+        """Every test of the inventory is selected by exactly one shard"""
+        plans = [
+            sharding.ShardPlan(self.files, self.nodeids, (2, index))
+            for index in range(2)
+        ]
+
+        self.assertSetEqual(plans[0].selected, set(self.nodeids[:2]))
+        self.assertSetEqual(plans[1].selected, set(self.nodeids[2:]))
+        self.assertSetEqual(plans[0].files, {"test_a.py", "test_b.py"})
+        self.assertSetEqual(plans[1].files, {"test_c.py", "test_empty.py"})
+
+    def test_unknown_tests(self) -> None:
+        """Tests missing from the inventory are run by the shard owning their file"""
+        plans = [
+            sharding.ShardPlan(self.files, self.nodeids, (2, index))
+            for index in range(2)
+        ]
+
+        for nodeid, owner in [
+            ("test_c.py::test_0[3]", 1),
+            ("test_empty.py::test_0", 1),
+            ("test_other.py::test_0", 0),
+        ]:
+            self.assertListEqual(
+                [plan.selects(nodeid) for plan in plans],
+                [index == owner for index in range(2)],
+            )
+
+    def test_filter_args(self) -> None:
+        """Test files of other shards are not collected"""
+        tmp_dir = Path(tempfile.mkdtemp(prefix="sharding_test-"))
+        try:
+            for name in self.files:
+                (tmp_dir / name).write_text("", encoding="utf-8")
+            args = [str(tmp_dir / name) for name in self.files] + [
+                f"{tmp_dir / 'test_a.py'}::test_0",
+                "-v",
+            ]
+
+            plan = sharding.ShardPlan(self.files, self.nodeids, (2, 1))
+            self.assertListEqual(
+                plan.filter_args(args, tmp_dir), [args[2], args[3], args[4], "-v"]
+            )
+
+            # A shard without tests still collects a file, rather than the
+            # root directory, to deselect its tests.
+            plan = sharding.ShardPlan(self.files, self.nodeids[1:2], (2, 1))
+            self.assertListEqual(plan.filter_args(args[:1], tmp_dir), args[:1])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class TestPlanPartitions(unittest.TestCase):
+    """Test cases for `pytest_sharding.plan_partitions`"""
+
+    def test_nested(self) -> None:
+        """Workers divide the tests of their shard"""
+        files = [f"test_{idx}.py" for idx in range(4)]
+        nodeids = [f"test_{idx}.py::test_0" for idx in range(4)]
+
+        selected = [
+            sharding.plan_partitions(files, nodeids, [(2, shard), (2, worker)])[
+                -1
+            ].selected
+            for shard in range(2)
+            for worker in range(2)
+        ]
+
+        self.assertListEqual(selected, [{nodeid} for nodeid in nodeids])
+
+
+class TestTimings(unittest.TestCase):
+    """Test cases for loading and estimating test durations"""
+
+    def setUp(self) -> None:
+        self.temp_dir = Path(tempfile.mkdtemp(dir=os.environ.get("TEST_TMPDIR", None)))
+
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.temp_dir))
+        return super().tearDown()
+
+    def test_load_timings(self) -> None:
+        """Timings files are json maps of node IDs to seconds"""
+        timings_file = self.temp_dir / "timings.json"
+        timings_file.write_text(
+            json.dumps({"tests/a_test.py::test_a": 1, "tests/a_test.py::test_b": 0.5}),
+            encoding="utf-8",
+        )
+
+        self.assertDictEqual(
+            sharding.load_timings(timings_file),
+            {"tests/a_test.py::test_a": 1.0, "tests/a_test.py::test_b": 0.5},
+        )
+
+    def test_load_invalid_timings(self) -> None:
+        """Timings must be a json object"""
+        timings_file = self.temp_dir / "timings.json"
+        timings_file.write_text("[]", encoding="utf-8")
+
+        with self.assertRaises(ValueError):
+            sharding.load_timings(timings_file)
+
+    def test_estimate_unknown(self) -> None:
+        """Unrecorded tests are assumed to take the average duration"""
+        durations = sharding.estimate_durations(
+            ["test_a", "test_b", "test_new"], {"test_a": 1.0, "test_b": 3.0}
+        )
+
+        self.assertDictEqual(durations, {"test_a": 1.0, "test_b": 3.0, "test_new": 2.0})
+
+    def test_estimate_no_timings(self) -> None:
+        """A default duration is used when no tests were recorded"""
+        durations = sharding.estimate_durations(["test_a"], {})
+
+        self.assertDictEqual(durations, {"test_a": sharding.DEFAULT_DURATION})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,11 @@
+"""A conftest passed to `py_pytest_test_suite` as `data`"""
+
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def data_file() -> Path:
+    """The data file of the suite, next to this conftest"""
+    return Path(__file__).parent / "data.txt"
@@ -0,0 +1,8 @@
+"""A test of a `py_pytest_test_suite` which reads the suite's `data`"""
+
+from pathlib import Path
+
+
+def test_data(data_file: Path) -> None:
+    """The conftest and data file of the suite are in the runfiles of its tests"""
+    assert data_file.read_text(encoding="utf-8") == "La-Li-Lu-Le-Lo\n"
@@ -0,0 +1,122 @@
+"""Tests for the watch.py module"""
+
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+from pathlib import Path
+
+from python.pytest.private import watch
+
+
+class TestImportedModules(unittest.TestCase):
+    """Test cases for `watch.imported_modules`"""
+
+    def test_imports(self) -> None:
+        """Absolute imports include every enclosing package"""
+        modules = watch.imported_modules(
+            b"import a.b.c\nfrom d.e import f, g\n", "pkg.mod", False
+        )
+
+        self.assertSetEqual(
+            modules, {"a", "a.b", "a.b.c", "d", "d.e", "d.e.f", "d.e.g"}
+        )
+
+    def test_relative_imports(self) -> None:
+        """Relative imports are resolved against the module's package"""
+        source = b"from . import sibling\nfrom ..other import thing\n"
+
+        self.assertSetEqual(
+            watch.imported_modules(source, "pkg.sub.mod", False),
+            {"pkg", "pkg.sub", "pkg.sub.sibling", "pkg.other", "pkg.other.thing"},
+        )
+        self.assertSetEqual(
+            watch.imported_modules(source, "pkg.sub", True),
+            {"pkg", "pkg.sub", "pkg.sub.sibling", "pkg.other", "pkg.other.thing"},
+        )
+
+
+class TestModuleGraph(unittest.TestCase):
+    """Test cases for `watch.ModuleGraph`"""
+
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp(prefix="watch_test-")).resolve()
+        self.files = {
+            "pkg/__init__.py": "",
+            "pkg/base.py": "",
+            "pkg/util.py": "from pkg import base\n",
+            "pkg/conftest.py": "",
+            "pkg/util_test.py": "from .util import helper\n",
+            "pkg/base_test.py": "import pkg.base\n",
+            "pkg/other_test.py": "import json\n",
+        }
+        for name, content in self.files.items():
+            (self.root / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / name).write_text(content, encoding="utf-8")
+
+        self.graph = watch.ModuleGraph(
+            [self.root / name for name in self.files], [self.root]
+        )
+        self.tests = [self.root / name for name in self.files if "_test" in name]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def test_transitive(self) -> None:
+        """Tests importing a changed module through others are affected"""
+        affected = self.graph.affected([self.root / "pkg/base.py"])
+
+        self.assertListEqual(
+            watch.select_tests(self.tests, affected),
+            [self.root / "pkg/util_test.py", self.root / "pkg/base_test.py"],
+        )
+
+    def test_unaffected(self) -> None:
+        """Tests which don't import a changed module are not affected"""
+        affected = self.graph.affected([self.root / "pkg/util.py"])
+
+        self.assertListEqual(
+            watch.select_tests(self.tests, affected),
+            [self.root / "pkg/util_test.py"],
+        )
+
+    def test_conftest(self) -> None:
+        """A changed `conftest.py` affects every test beneath it"""
+        affected = self.graph.affected([self.root / "pkg/conftest.py"])
+
+        self.assertListEqual(watch.select_tests(self.tests, affected), self.tests)
+
+    def test_update(self) -> None:
+        """Imports are parsed again for changed files"""
+        (self.root / "pkg/other_test.py").write_text("import pkg.util\n")
+        self.graph.update(self.root / "pkg/other_test.py")
+
+        affected = self.graph.affected([self.root / "pkg/util.py"])
+
+        self.assertIn(self.root / "pkg/other_test.py", affected)
+
+
+class TestUnloadModules(unittest.TestCase):
+    """Test cases for `watch.unload_modules`"""
+
+    def test_unload(self) -> None:
+        """Modules are removed from `sys.modules` and their package"""
+        package_name, module_name = "watch_test_pkg", "watch_test_pkg.mod"
+        package = types.ModuleType(package_name)
+        module = types.ModuleType(module_name)
+        module.__file__ = str(Path(__file__).resolve())
+        setattr(package, "mod", module)
+        sys.modules.update({package_name: package, module_name: module})
+        try:
+            watch.unload_modules({Path(__file__).resolve()})
+
+            self.assertNotIn(module_name, sys.modules)
+            self.assertFalse(hasattr(package, "mod"))
+        finally:
+            sys.modules.pop(package_name, None)
+            sys.modules.pop(module_name, None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests for the watchdog.py module"""
+
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from xml.etree import ElementTree
+
+from python.pytest.private import watchdog
+
+
+class TestDeadline(unittest.TestCase):
+    """Test cases for `watchdog.deadline`"""
+
+    def test_short_timeout(self) -> None:
+        """Short timeouts fire a tenth of the timeout early"""
+        self.assertEqual(watchdog.deadline(60, start=1000.0), 1054.0)
+
+    def test_long_timeout(self) -> None:
+        """Long timeouts fire the grace period early"""
+        self.assertEqual(
+            watchdog.deadline(300, start=1000.0), 1300.0 - watchdog.GRACE_PERIOD
+        )
+
+
+class TestArm(unittest.TestCase):
+    """Test cases for `watchdog.arm`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="watchdog_test-"))
+
+    def tearDown(self) -> None:
+        watchdog.disarm()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_dump(self) -> None:
+        """The stacks of all threads are dumped at the deadline"""
+        with (self.tmp_dir / "stacks.txt").open("w", encoding="utf-8") as stream:
+            self.assertTrue(watchdog.arm(time.time() + 0.05, stream))
+            time.sleep(0.5)
+
+        stacks = (self.tmp_dir / "stacks.txt").read_text(encoding="utf-8")
+        self.assertIn("most recent call first", stacks)
+        self.assertIn("test_dump", stacks)
+
+    def test_expired(self) -> None:
+        """Deadlines in the past are not armed"""
+        with (self.tmp_dir / "stacks.txt").open("w", encoding="utf-8") as stream:
+            self.assertFalse(watchdog.arm(time.time() - 1, stream))
+
+
+class TestPartialJunitXml(unittest.TestCase):
+    """Test cases for `watchdog.PartialJunitXml`"""
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix="watchdog_test-"))
+        self.xml_file = self.tmp_dir / "test.xml"
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_incremental(self) -> None:
+        """The report is valid after every test case"""
+        report = watchdog.PartialJunitXml(self.xml_file)
+        try:
+            self.assertListEqual(
+                list(ElementTree.parse(self.xml_file).iter("testcase")), []
+            )
+
+            for name in ("test_one", "test_two"):
+                report.add(ElementTree.Element("testcase", {"name": name}))
+                self.assertEqual(
+                    len(list(ElementTree.parse(self.xml_file).iter("testcase"))),
+                    1 if name == "test_one" else 2,
+                )
+        finally:
+            report.close()
+
+        root = ElementTree.parse(self.xml_file).getroot()
+        self.assertEqual(root.tag, "testsuites")
+        self.assertListEqual(
+            [case.get("name") for case in root.iter("testcase")],
+            ["test_one", "test_two"],
+        )
+        self.assertTrue(report.closed)
+
+    def test_xml_text(self) -> None:
+        """Characters which can't be represented in XML are replaced"""
+        self.assertEqual(watchdog.xml_text("a\x1b[31mbé"), "a#x1B[31mbé")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,274 @@
+"""Rerun the tests affected by source changes within a single interpreter.
+
+`bazel run` of a `py_pytest_test` with `--watch` keeps the process wrapper alive
+after the first pytest session. The first-party Python sources in the runfiles
+of the test are polled for modifications, and an import graph of those sources
+determines which test files depend, directly or transitively, on the modified
+ones. Only those test files are rerun, in the same interpreter, after the
+modified modules and their importers are unloaded so that they're imported
+again. Everything else, such as third-party dependencies, stays imported.
+
+Runfiles link to the sources in the workspace so edits are seen without
+rebuilding. Added files and changes to `BUILD` files require the target to be
+run again.
+"""
+
+import ast
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+POLL_INTERVAL = 0.5
+"""The number of seconds between checks for modified sources."""
+
+
+def module_names(path: Path, roots: Sequence[Path]) -> List[str]:
+    """The names a source file may be imported as from any of the import roots.
+
+    Args:
+        path: A Python source file.
+        roots: The directories on the import path.
+
+    Returns:
+        A list of dotted module names.
+    """
+    names = []
+    for root in roots:
+        try:
+            parts = list(path.relative_to(root).with_suffix("").parts)
+        except ValueError:
+            continue
+        if parts and parts[-1] == "__init__":
+            parts.pop()
+        if parts and all(part.isidentifier() for part in parts):
+            names.append(".".join(parts))
+
+    return names
+
+
+def _prefixes(name: str) -> List[str]:
+    parts = name.split(".")
+    return [".".join(parts[: idx + 1]) for idx in range(len(parts))]
+
+
+def imported_modules(source: bytes, name: str, is_package: bool) -> Set[str]:
+    """Find the modules a source file may import.
+
+    Importing `a.b.c` also imports the packages `a` and `a.b`, and `from a import b`
+    may import either the module `a.b` or a name defined in `a`, so all of these
+    are included.
+
+    Args:
+        source: The content of a Python source file.
+        name: The name of the module.
+        is_package: Whether the module is a package (`__init__.py`).
+
+    Returns:
+        A set of dotted module names.
+
+    Raises:
+        SyntaxError: If the source can't be parsed.
+    """
+    package = name if is_package else name.rpartition(".")[0]
+
+    modules: Set[str] = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                modules.update(_prefixes(alias.name))
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                parts = package.split(".") if package else []
+                if node.level - 1 > len(parts):
+                    continue
+                parts = parts[: len(parts) - (node.level - 1)]
+                if node.module:
+                    parts.append(node.module)
+                base = ".".join(parts)
+            else:
+                base = node.module or ""
+            if not base:
+                continue
+            modules.update(_prefixes(base))
+            modules.update(f"{base}.{alias.name}" for alias in node.names)
+
+    return modules
+
+
+class ModuleGraph:
+    """The imports between a set of Python source files."""
+
+    def __init__(self, files: Iterable[Path], roots: Sequence[Path]) -> None:
+        """Constructor
+
+        Args:
+            files: The source files to include in the graph. Files are keyed by
+                their resolved path.
+            roots: The directories on the import path.
+        """
+        self.names: Dict[Path, List[str]] = {}
+        self.modules: Dict[str, Path] = {}
+        for path in files:
+            real_path = Path(os.path.realpath(path))
+            names = module_names(path, roots)
+            self.names[real_path] = names
+            for name in names:
+                self.modules.setdefault(name, real_path)
+
+        self.imports: Dict[Path, Set[Path]] = {}
+        for path in self.names:
+            self.update(path)
+
+    def update(self, path: Path) -> None:
+        """Parse the imports of a source file again.
+
+        Files which can't be read or parsed keep the imports last seen, as they
+        are most likely being edited.
+        """
+        imports: Set[Path] = set()
+        for name in self.names.get(path, []):
+            try:
+                modules = imported_modules(
+                    path.read_bytes(), name, path.name == "__init__.py"
+                )
+            except (OSError, SyntaxError, ValueError):
+                return
+            imports.update(
+                self.modules[module] for module in modules if module in self.modules
+            )
+        imports.discard(path)
+        self.imports[path] = imports
+
+    def affected(self, changed: Iterable[Path]) -> Set[Path]:
+        """Find the files which import any changed file, directly or transitively.
+
+        Args:
+            changed: The resolved paths of changed files.
+
+        Returns:
+            The changed files and all files depending on them.
+        """
+        importers: Dict[Path, Set[Path]] = {}
+        for path, imports in self.imports.items():
+            for imported in imports:
+                importers.setdefault(imported, set()).add(path)
+
+        affected = set(changed)
+        pending = list(affected)
+        while pending:
+            for importer in importers.get(pending.pop(), ()):
+                if importer not in affected:
+                    affected.add(importer)
+                    pending.append(importer)
+
+        return affected
+
+
+def select_tests(test_files: Sequence[Path], affected: Set[Path]) -> List[Path]:
+    """Select the test files to rerun for a set of affected files.
+
+    A `conftest.py` applies to every test file beneath it, whether it's imported
+    or not.
+
+    Args:
+        test_files: The resolved paths of all test files.
+        affected: The resolved paths of affected files.
+
+    Returns:
+        The test files to rerun, in their original order.
+    """
+    conftest_dirs = [path.parent for path in affected if path.name == "conftest.py"]
+    return [
+        path
+        for path in test_files
+        if path in affected
+        or any(directory in path.parents for directory in conftest_dirs)
+    ]
+
+
+def unload_modules(files: Set[Path]) -> None:
+    """Remove modules loaded from the given files so they're imported again."""
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, "__file__", None)
+        if not module_file or Path(os.path.realpath(module_file)) not in files:
+            continue
+        del sys.modules[name]
+
+        # `from package import module` would otherwise find the stale module
+        # as an attribute of its package.
+        parent_name, _, attr = name.rpartition(".")
+        parent = sys.modules.get(parent_name)
+        if parent is not None and getattr(parent, attr, None) is module:
+            delattr(parent, attr)
+
+
+def _mtimes(files: Iterable[Path]) -> Dict[Path, Optional[int]]:
+    mtimes: Dict[Path, Optional[int]] = {}
+    for path in files:
+        try:
+            mtimes[path] = path.stat().st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+def watch(
+    run: Callable[[List[str]], int],
+    test_files: Sequence[Path],
+    source_root: Path,
+    roots: Sequence[Path],
+    poll_interval: float = POLL_INTERVAL,
+) -> None:
+    """Run tests, then rerun the ones affected by every change until interrupted.
+
+    Args:
+        run: A function which runs pytest on a list of test files.
+        test_files: All test files of the target.
+        source_root: The directory containing first-party sources to watch.
+        roots: The directories on the import path.
+        poll_interval: The number of seconds between checks for modified sources.
+    """
+    graph = ModuleGraph(sorted(source_root.rglob("*.py")), roots)
+    tests = {Path(os.path.realpath(path)): path for path in test_files}
+
+    mtimes = _mtimes(graph.names)
+    run([str(path) for path in test_files])
+
+    try:
+        _watch_changes(run, graph, tests, mtimes, poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def _watch_changes(
+    run: Callable[[List[str]], int],
+    graph: ModuleGraph,
+    tests: Dict[Path, Path],
+    mtimes: Dict[Path, Optional[int]],
+    poll_interval: float,
+) -> None:
+    watched = list(mtimes)
+    while True:
+        print("\nWatching for changes. Press Ctrl+C to exit.", file=sys.stderr)
+        changed: List[Path] = []
+        while not changed:
+            time.sleep(poll_interval)
+            current = _mtimes(watched)
+            changed = [path for path in watched if current[path] != mtimes[path]]
+        mtimes = current
+
+        for path in changed:
+            graph.update(path)
+        affected = graph.affected(changed)
+        selected = select_tests(list(tests), affected)
+
+        names = ", ".join(str(path) for path in changed)
+        print(f"\nChanged: {names}", file=sys.stderr)
+        if not selected:
+            print("No tests are affected.", file=sys.stderr)
+            continue
+
+        unload_modules(affected)
+        run([str(tests[path]) for path in selected])
@@ -0,0 +1,138 @@
+"""A watchdog for `py_pytest_test` runs which are about to exceed `TEST_TIMEOUT`.
+
+Bazel kills tests which exceed their timeout, leaving no record of which test
+hung or what it was doing. The process wrapper derives a deadline shortly
+before the timeout from which every pytest process, including pytest-xdist
+workers, dumps the stacks of all of its threads with `faulthandler`. This is
+done by a thread of the interpreter itself so it works even if a test is stuck
+holding the GIL.
+
+The results of completed tests are written to `XML_OUTPUT_FILE` as they are
+reported, in a JUnit XML report which is valid after every test, so that they
+survive the test being killed. pytest replaces it with its own report if the
+session completes.
+"""
+
+import faulthandler
+import re
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, TextIO
+
+# The process wrapper only needs `deadline`, so the XML modules are only imported
+# by the report (`xml.sax.saxutils` alone imports `urllib.request`).
+if TYPE_CHECKING:
+    from xml.etree import ElementTree
+
+DEADLINE_ENV = "PY_PYTEST_DEADLINE"
+"""The environment variable containing the time, in seconds since the epoch, of the watchdog deadline."""
+
+GRACE_PERIOD = 10.0
+"""The maximum number of seconds before `TEST_TIMEOUT` at which the watchdog fires."""
+
+# Characters which may not appear in XML 1.0 documents, even escaped.
+_INVALID_XML = re.compile(
+    "[^\u0009\u000a\u000d\u0020-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]"
+)
+
+_FOOTER = b"</testsuite>\n</testsuites>\n"
+
+
+def deadline(timeout: float, start: float) -> float:
+    """Determine when the watchdog of a test fires.
+
+    Bazel starts its timer before the test, and the process wrapper, start.
+    The watchdog therefore fires a tenth of the timeout, up to `GRACE_PERIOD`,
+    before the timeout would expire had it started with the wrapper.
+
+    Args:
+        timeout: The value of `TEST_TIMEOUT` in seconds.
+        start: The time, in seconds since the epoch, the process wrapper started.
+
+    Returns:
+        The deadline in seconds since the epoch.
+    """
+    return start + timeout - min(GRACE_PERIOD, timeout / 10)
+
+
+def arm(when: float, stream: TextIO) -> bool:
+    """Dump the stacks of all threads of the current process at the deadline.
+
+    This replaces any other `faulthandler.dump_traceback_later` timer.
+
+    Args:
+        when: The deadline in seconds since the epoch.
+        stream: The stream to write stacks to. It must have a file descriptor
+            which remains open until the timer is cancelled.
+
+    Returns:
+        Whether or not the watchdog was armed, i.e. the deadline is in the future.
+    """
+    remaining = when - time.time()
+    if remaining <= 0:
+        return False
+    faulthandler.dump_traceback_later(remaining, file=stream)
+    return True
+
+
+def disarm() -> None:
+    """Cancel the stack dump of the current process."""
+    faulthandler.cancel_dump_traceback_later()
+
+
+def xml_text(text: str) -> str:
+    """Replace characters which can't be represented in XML, as pytest's `junitxml` does."""
+    return _INVALID_XML.sub(lambda match: f"#x{ord(match.group()):02X}", text)
+
+
+class PartialJunitXml:
+    """A JUnit XML report which is written incrementally and valid after every test.
+
+    The closing tags of the report are overwritten by each test case added.
+    """
+
+    def __init__(self, path: Path, name: str = "pytest") -> None:
+        """Constructor
+
+        Args:
+            path: The location of the report.
+            name: The name of the `testsuite` of the report.
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from xml.sax.saxutils import quoteattr
+
+        self._file = path.open("wb")
+        self._file.write(
+            b'<?xml version="1.0" encoding="utf-8"?>\n<testsuites>\n'
+            + f"<testsuite name={quoteattr(xml_text(name))}>\n".encode()
+        )
+        self._end = self._file.tell()
+        self._file.write(_FOOTER)
+        self._file.flush()
+
+    @property
+    def closed(self) -> bool:
+        """Whether or not the report has been closed."""
+        return self._file.closed
+
+    def add(self, testcase: "ElementTree.Element") -> None:
+        """Append a `testcase` to the report.
+
+        Args:
+            testcase: The test case. The text of its elements must already be
+                valid XML text (see `xml_text`).
+        """
+        # pylint: disable-next=import-outside-toplevel
+        from xml.etree import ElementTree
+
+        self._file.seek(self._end)
+        self._file.write(ElementTree.tostring(testcase, encoding="unicode").encode())
+        self._file.write(b"\n")
+        self._end = self._file.tell()
+        self._file.write(_FOOTER)
+        self._file.truncate()
+        self._file.flush()
+
+    def close(self) -> None:
+        """Close the report."""
+        self._file.close()